@@ -0,0 +1,242 @@
+"""
+Group-by and totals over an item_store.ItemStore, for view_subs and stats.
+
+Everything works on columns (one value per item, see ItemStore.column) and
+indexes ({key: positions}) instead of going through the items one at a time.
+Once the store has built those, grouping doesn't look at a single item:
+
+    >>> import item_store
+    >>> store = item_store.ItemStore(
+    ...     [('aww', 10), ('pics', 5), ('aww', 1)],
+    ...     {'subreddit': lambda i: i[0], 'score': lambda i: i[1]})
+    >>> aggregate(store, 'sub', 'sum', 'score')
+    {'aww': 11.0, 'pics': 5.0}
+
+If numpy is installed, the totals are worked out with it, which makes a big
+difference on lists with hundreds of thousands of items. It's optional.
+Without it, the same thing is done in plain Python.
+"""
+import re
+import time
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# What you can group by, and the praw_tools.ITEM_INDEXERS name behind it.
+GROUPS = {
+    'sub':       'subreddit',
+    'subreddit': 'subreddit',
+    'author':    'author',
+    'kind':      'kind',
+    'nsfw':      'over_18',
+    'over_18':   'over_18',
+    'self':      'is_self',
+    'is_self':   'is_self',
+}
+
+# These group by when an item was posted (in UTC), so they're worked out from
+# the created_utc column.
+TIME_GROUPS = ['hour', 'weekday', 'day']
+
+# What you can add up, and the ITEM_INDEXERS name behind it.
+VALUES = {
+    'score':       'score',
+    'created':     'created_utc',
+    'created_utc': 'created_utc',
+}
+
+METRICS = ['count', 'sum', 'mean', 'min', 'max']
+
+_METRIC = re.compile(r'^(\w+)(?:\((\w+)\))?$')
+
+
+def parse_metric(s):
+    ''' Turn something like 'sum(score)' into ('sum', 'score'). count
+    doesn't need a field, so 'count' gives ('count', None).
+
+    Raises ValueError if it's not something aggregate() can do.
+    '''
+    match = _METRIC.match(s.strip().lower())
+
+    if match is None:
+        raise ValueError('Expected something like sum(score), not: ' + s)
+
+    metric, field = match.groups()
+    metric = 'mean' if metric == 'avg' else metric
+
+    if metric not in METRICS:
+        raise ValueError('Unknown metric: {} (try one of: {})'.format(
+            metric, ', '.join(METRICS)))
+
+    if metric == 'count':
+        return metric, None
+
+    if field not in VALUES:
+        raise ValueError('{}() needs one of: {}'.format(
+            metric, ', '.join(sorted(VALUES))))
+
+    return metric, field
+
+
+def check_group(by):
+    if by not in GROUPS and by not in TIME_GROUPS:
+        raise ValueError("Can't group by {} (try one of: {})".format(
+            by, ', '.join(sorted(list(GROUPS) + TIME_GROUPS))))
+
+
+# Grouping. {{{1
+def _time_bucket(by, timestamp):
+    ''' A number for which hour/weekday/day timestamp falls into. Works on
+    plain numbers and on numpy arrays.
+    '''
+    if by == 'hour':
+        return timestamp // 3600 % 24
+
+    day = timestamp // 86400
+
+    # 1970-01-01 was a Thursday, which is day 4 when Sunday is 0.
+    return (day + 4) % 7 if by == 'weekday' else day
+
+
+def _time_label(by, bucket):
+    if by == 'hour':
+        return bucket
+    elif by == 'weekday':
+        return '{} {}'.format(bucket, WEEKDAYS[bucket])
+
+    return time.strftime('%Y-%m-%d', time.gmtime(bucket * 86400))
+
+
+WEEKDAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+
+
+def _time_groups(store, by):
+    ''' Group store by hour, weekday or day. Returns {key: positions}. '''
+    created = store.column('created_utc')
+
+    if numpy is not None:
+        timestamps = _to_array(created)
+        known = numpy.flatnonzero(~numpy.isnan(timestamps))
+        buckets = _time_bucket(by, timestamps[known]).astype(int)
+
+        # Sort the positions by bucket, then cut them up wherever the bucket
+        # changes.
+        order = numpy.argsort(buckets, kind='stable')
+        buckets, positions = buckets[order], known[order]
+        starts = numpy.flatnonzero(numpy.diff(buckets)) + 1
+
+        return {_time_label(by, int(i[0])): j for i, j in zip(
+            numpy.split(buckets, starts), numpy.split(positions, starts))
+            if len(i)}
+
+    groups = {}
+
+    for position, timestamp in enumerate(created):
+        if timestamp is None:
+            continue
+
+        key = _time_label(by, int(_time_bucket(by, timestamp)))
+
+        try:
+            groups[key].append(position)
+        except KeyError:
+            groups[key] = [position]
+
+    return groups
+
+
+def groups(store, by):
+    ''' Get {key: positions} for one of GROUPS or TIME_GROUPS. '''
+    check_group(by)
+
+    if by in TIME_GROUPS:
+        return _time_groups(store, by)
+
+    # Items that don't have this (like comments for nsfw) are filed under
+    # None. Leave them out.
+    return {key: positions
+            for key, positions in store.index(GROUPS[by]).items()
+            if key is not None}
+
+
+# Totals. {{{1
+def _to_array(column):
+    ''' A float numpy array with NaN wherever column has None. '''
+    return numpy.array(column, dtype=float)
+
+
+def _numpy_totals(groups, column, metric):
+    keys = list(groups)
+    lengths = [len(i) for i in groups.values()]
+
+    # Line every group's positions up end to end, with a matching array
+    # saying which group each one came from.
+    positions = numpy.fromiter(
+        itertools.chain.from_iterable(groups.values()), dtype=numpy.intp,
+        count=sum(lengths))
+    codes = numpy.repeat(numpy.arange(len(keys)), lengths)
+
+    values = _to_array(column)[positions]
+    known = ~numpy.isnan(values)
+    codes, values = codes[known], values[known]
+    counts = numpy.bincount(codes, minlength=len(keys))
+
+    if metric in ['sum', 'mean']:
+        results = numpy.bincount(codes, weights=values, minlength=len(keys))
+
+        if metric == 'mean':
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                results = results / counts
+    else:
+        fill = numpy.inf if metric == 'min' else -numpy.inf
+        results = numpy.full(len(keys), fill)
+        ufunc = numpy.minimum if metric == 'min' else numpy.maximum
+        ufunc.at(results, codes, values)
+
+    return {key: float(result) for key, result, count
+            in zip(keys, results, counts) if count}
+
+
+def _python_totals(groups, column, metric):
+    totals = {}
+
+    for key, positions in groups.items():
+        values = [column[i] for i in positions if column[i] is not None]
+
+        if not values:
+            continue
+        elif metric == 'sum':
+            totals[key] = float(sum(values))
+        elif metric == 'mean':
+            totals[key] = sum(values) / len(values)
+        elif metric == 'min':
+            totals[key] = float(min(values))
+        elif metric == 'max':
+            totals[key] = float(max(values))
+
+    return totals
+
+
+def aggregate(store, by, metric='count', field=None):
+    ''' Group the items in store by [by] and total up each group.
+
+    by is one of GROUPS or TIME_GROUPS, metric is one of METRICS, and field
+    is one of VALUES (for anything but count). Returns {key: total}. Items
+    that don't have a value for field (like comments for nsfw, or anything
+    without a score) are left out.
+    '''
+    group_positions = groups(store, by)
+
+    if metric == 'count':
+        return {key: len(positions)
+                for key, positions in group_positions.items()}
+
+    column = store.column(VALUES[field])
+
+    if numpy is not None:
+        return _numpy_totals(group_positions, column, metric)
+
+    return _python_totals(group_positions, column, metric)
@@ -0,0 +1,264 @@
+"""
+Timings for PRAWToys commands, at a realistic scale. Run it like this:
+
+    python benchmarks.py [--size 100000] [--latency 0.0] [--only network|local]
+                         [--baseline benchmarks.json] [--save-baseline]
+
+Nothing here touches the real reddit. Commands that would normally go to
+reddit (get_from, user, thread and upvote) talk to a fake_reddit.FakeReddit
+running on localhost instead, with --latency seconds added to every
+response. get_from, thread and upvote are timed through praw and again
+through praw_tools.AsyncReddit (see the async command). Everything else runs
+on --size items made up by synthetic.py, which look a lot more like reddit
+than the fake server's corpus does.
+
+Each result is compared with the one in the --baseline file, if there is one
+for the same --size, and anything more than --tolerance times slower is
+reported as a regression (and makes the exit status 1). --save-baseline
+writes this run's results into the baseline file instead. Baselines only mean
+something on the machine they were made on, so make your own before changing
+anything.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import praw
+
+import praw_tools
+import prawtoys
+import session_file
+import fake_reddit
+import synthetic
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmarks.json')
+
+# Commands that get run on a fresh copy of the whole corpus, one at a time.
+FILTERS = [
+    'sub aww pics', 'nsub aww pics', 'sfw', 'nsfw', 'self', 'nself',
+    'submission', 'comment', 'title -i cat', 'ntitle -i cat',
+    'body -i -any dog café', 'nbody -i -any dog café',
+    'where sub in (aww, pics) and score > 3', 'nodupes', 'uniq -both',
+    'search cat dog', 'rm 0 1 2',
+]
+
+
+def timed(f, *args, **kwargs):
+    ''' Returns (seconds taken, f's return value) '''
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class Benchmarks(object):
+    def __init__(self, server, corpus, repeat=3):
+        self.server = server
+        self.corpus = corpus
+        self.repeat = repeat
+        self.results = {}
+
+        self.prawtoys = prawtoys.PRAWToys(stdout=io.StringIO())
+        self.prawtoys.use_pager = False
+
+        # A rate limiter that never gets in the way, so we're timing
+        # PRAWToys and not the rate limit.
+        limiter = praw_tools.RateLimiter(rate=10000, burst=10000)
+        self.prawtoys.reddit_session = praw.Reddit(
+            'PRAWToys benchmarks', disable_update_check=True,
+            handler=fake_reddit.LocalHandler(server.url, limiter))
+
+    def run(self, name, f, repeat=None):
+        ''' Time f, keeping the best of [repeat] runs. '''
+        best = None
+
+        for _ in range(repeat or self.repeat):
+            self.prawtoys.stdout.seek(0)
+            self.prawtoys.stdout.truncate(0)
+
+            seconds, _ = timed(f)
+            best = seconds if best is None else min(best, seconds)
+
+        self.results[name] = best
+        return best
+
+    def command(self, line):
+        return lambda: self.prawtoys.onecmd(line)
+
+    # The benchmarks. {{{1
+    def network(self):
+        ''' Commands that talk to (fake) reddit. These only run once, since
+        the second time could come from the item cache.
+        '''
+        corpus = self.corpus
+        per_sub = corpus.submissions // len(corpus.subreddits)
+
+        def fresh(line):
+            def f():
+                self.prawtoys.items = []
+                self.prawtoys.onecmd(line)
+            return f
+
+        self.run('get_from', fresh('get_from aww {}'.format(per_sub)), 1)
+        self.run('user', fresh('user user1 user2 all'), 1)
+        self.run('thread', fresh('thread 0 all'), 1)
+
+        self.prawtoys.reddit_session.login(
+            'benchmark', 'benchmark', disable_warning=True)
+        self.prawtoys.items = self.prawtoys.items[:1000]
+        self.run('upvote', lambda: self.prawtoys.vote_items('upvote'), 1)
+
+        # The same again, through praw_tools.AsyncReddit.
+        self.prawtoys.async_network = True
+        self.prawtoys.async_reddit = praw_tools.AsyncReddit(
+            self.prawtoys.reddit_session, base_url=self.server.url)
+        self.prawtoys.event_loop = praw_tools.EventLoopThread()
+
+        self.run('get_from (async)',
+                 fresh('get_from aww {}'.format(per_sub)), 1)
+        self.run('thread (async)', fresh('thread 0 all'), 1)
+
+        self.prawtoys.items = self.prawtoys.items[:1000]
+        self.run('upvote (async)',
+                 lambda: self.prawtoys.vote_items('upvote'), 1)
+
+        self.prawtoys.async_network = False
+        self.prawtoys.event_loop.stop()
+
+    def local(self):
+        ''' Commands that only work on items that are already loaded. '''
+        pt = self.prawtoys
+        items = list(synthetic.praw_items(
+            pt.reddit_session, len(self.corpus), self.corpus.seed))
+
+        def fresh(line, start=items):
+            def f():
+                pt.items = list(start)
+                pt.onecmd(line)
+            return f
+
+        for line in FILTERS:
+            self.run(line.split()[0] + ' (' + line + ')', fresh(line))
+
+        pt.items = list(items)
+        self.run('view_subs', self.command('view_subs'))
+        self.run('stats by=author', self.command('stats by=author'))
+        self.run('ls', self.command('ls'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'session')
+
+            self.run('save_to_file', self.command('save_to_file ' + name))
+            self.run('load_from_file', fresh('load_from_file ' + name, []))
+            self.run('load_from_file --mmap',
+                     fresh('load_from_file {} --mmap'.format(name), []))
+
+            def write_session():
+                synthetic.write_session(name + '-synthetic' +
+                                        session_file.EXTENSION,
+                                        len(self.corpus), self.corpus.seed)
+
+            self.run('synthetic.write_session', write_session)
+
+        self.run('generate', fresh(
+            'generate {} {}'.format(len(self.corpus), self.corpus.seed), []))
+
+
+# Baselines. {{{1
+def load_baseline(filename, size):
+    try:
+        with open(filename, encoding='utf-8') as file_:
+            baseline = json.load(file_)
+    except FileNotFoundError:
+        return {}
+
+    return baseline.get(str(size), {})
+
+
+def save_baseline(filename, size, results):
+    try:
+        with open(filename, encoding='utf-8') as file_:
+            baseline = json.load(file_)
+    except FileNotFoundError:
+        baseline = {}
+
+    baseline[str(size)] = results
+
+    with open(filename, 'w', encoding='utf-8') as file_:
+        json.dump(baseline, file_, indent=4, sort_keys=True)
+
+
+def report(results, baseline, tolerance):
+    ''' Print results next to the baseline. Returns the names of everything
+    that got slower by more than tolerance times.
+    '''
+    regressions = []
+    width = max(len(i) for i in results)
+
+    for name, seconds in results.items():
+        line = '{:<{}}  {:9.4f}s'.format(name, width, seconds)
+
+        if name in baseline:
+            ratio = seconds / max(baseline[name], 1e-9)
+            line += '  (baseline {:.4f}s, {:.2f}x)'.format(
+                baseline[name], ratio)
+
+            if ratio > tolerance:
+                line += '  REGRESSION'
+                regressions.append(name)
+
+        print(line)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time PRAWToys commands against a fake reddit.')
+    parser.add_argument('--size', type=int, default=100000,
+                        help='how many items in the corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every fake reddit response')
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='requests allowed per 10 minutes')
+    parser.add_argument('--only', nargs='*', choices=['network', 'local'],
+                        default=['network', 'local'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='how many times slower counts as a regression')
+    args = parser.parse_args(argv)
+
+    corpus = fake_reddit.Corpus(args.size, args.seed)
+    server = fake_reddit.FakeReddit(corpus, args.latency, args.rate_limit)
+
+    with server:
+        benchmarks = Benchmarks(server, corpus, args.repeat)
+
+        for group in args.only:
+            getattr(benchmarks, group)()
+
+    print('{} items, {} requests to fake reddit, {} votes.'.format(
+        args.size, server.requests, len(server.votes)))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, args.size, benchmarks.results)
+        report(benchmarks.results, {}, args.tolerance)
+        print('Saved to', args.baseline)
+        return 0
+
+    regressions = report(benchmarks.results,
+                         load_baseline(args.baseline, args.size),
+                         args.tolerance)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
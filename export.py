@@ -0,0 +1,248 @@
+"""
+Writing the item list out to HTML, CSV, JSON or Markdown, for get_links and
+export.
+
+Every exporter works off the same pass over the items, rows(), which pulls
+out everything an export needs (the line ls would show, the URL, the
+subreddit and so on) using only what's already stored on each item. Nothing
+here makes network requests, so exporting a couple hundred thousand items
+only takes as long as rendering them.
+
+Output is streamed, so the whole export is never in memory at once. HTML is
+split up into pages of PAGE_SIZE items, plus an index page linking to all of
+them, since browsers don't cope well with one page holding 200,000 links.
+"""
+import re
+import csv
+import json
+import html
+import itertools
+import collections
+
+import praw_tools
+
+# How many items go on each HTML page.
+PAGE_SIZE = 5000
+
+# How big of a buffer to write files through.
+BUFFER_SIZE = 1 << 20
+
+# Everything rows() pulls out of an item. CSV columns and JSON keys are in
+# this order.
+FIELDS = ['kind', 'id', 'subreddit', 'author', 'score', 'created_utc',
+          'title', 'body', 'text', 'url']
+
+Row = collections.namedtuple('Row', FIELDS)
+
+
+def rows(items):
+    ''' Turn each item into a Row. text is what ls would show for it. '''
+    for item in items:
+        author = getattr(item, 'author', None)
+
+        yield Row(
+            kind=praw_tools.kind(item),
+            id=getattr(item, 'id', None),
+            subreddit=item.subreddit.display_name,
+            author=None if author is None else author.name,
+            score=getattr(item, 'score', None),
+            created_utc=getattr(item, 'created_utc', None),
+            title=praw_tools.item_title(item),
+            body=praw_tools.item_body(item),
+            text=praw_tools.praw_object_to_string(item),
+            url=praw_tools.praw_object_url(item))
+
+
+def _open(filename):
+    return open(filename, 'w', encoding='utf-8', newline='',
+                buffering=BUFFER_SIZE)
+
+
+# HTML. {{{1
+HTML_HEADER = (
+    '<!DOCTYPE html>\n'
+    '<html>\n'
+    '    <head>\n'
+    '        <meta charset="utf-8">\n'
+    '        <title>{title}</title>\n'
+    '    </head><body>\n')
+
+HTML_FOOTER = '</body></html>\n'
+
+
+def page_filename(filename, page):
+    ''' page_filename('urls.html', 3) == 'urls-3.html' '''
+    root, dot, extension = filename.rpartition('.')
+
+    if not dot:
+        return '{}-{}'.format(filename, page)
+
+    return '{}-{}.{}'.format(root, page, extension)
+
+
+def _html_link(url, text):
+    return '<a href="{}">{}</a><br>\n'.format(
+        html.escape(url), html.escape(text, quote=False))
+
+
+def _html_page(filename, title, page_rows, nav=''):
+    with _open(filename) as file_:
+        file_.write(HTML_HEADER.format(title=html.escape(title)))
+        file_.write(nav)
+        file_.writelines(_html_link(i.url, i.text) for i in page_rows)
+        file_.write(nav)
+        file_.write(HTML_FOOTER)
+
+
+def _basename(filename):
+    return filename.replace('\\', '/').rpartition('/')[2]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _nav(filename, number, has_next):
+    links = ['<a href="{}">index</a>'.format(
+        html.escape(_basename(filename)))]
+
+    if number > 1:
+        links.append('<a href="{}">previous</a>'.format(html.escape(
+            _basename(page_filename(filename, number - 1)))))
+
+    if has_next:
+        links.append('<a href="{}">next</a>'.format(html.escape(
+            _basename(page_filename(filename, number + 1)))))
+
+    return '<p>' + ' | '.join(links) + '</p>\n'
+
+
+def export_html(items, filename, page_size=None):
+    ''' Write items to filename as a page of links. If there are more than
+    page_size (default PAGE_SIZE) of them, filename is an index page instead,
+    and the links go into filename-1, filename-2 and so on.
+
+    Returns how many items were written.
+    '''
+    pages = _chunks(rows(items), page_size or PAGE_SIZE)
+    page = next(pages, [])
+    next_page = next(pages, None)
+
+    if next_page is None:
+        _html_page(filename, 'PRAWToys links', page)
+        return len(page)
+
+    lengths = []
+
+    # We only find out if there's a next page by reading it, so always stay
+    # one page ahead.
+    while page is not None:
+        lengths.append(len(page))
+        number = len(lengths)
+
+        _html_page(page_filename(filename, number),
+                   'PRAWToys links, page {}'.format(number), page,
+                   _nav(filename, number, next_page is not None))
+
+        page, next_page = next_page, next(pages, None)
+
+    with _open(filename) as file_:
+        file_.write(HTML_HEADER.format(title='PRAWToys links'))
+        start = 0
+
+        for number, length in enumerate(lengths, 1):
+            file_.write('<a href="{}">Page {}</a>: items {}-{}<br>\n'.format(
+                html.escape(_basename(page_filename(filename, number))),
+                number, start, start + length - 1))
+            start += length
+
+        file_.write(HTML_FOOTER)
+
+    return sum(lengths)
+
+
+# CSV, JSON and Markdown. {{{1
+def export_csv(items, filename):
+    count = 0
+
+    with _open(filename) as file_:
+        writer = csv.writer(file_)
+        writer.writerow(FIELDS)
+
+        for row in rows(items):
+            writer.writerow(['' if i is None else i for i in row])
+            count += 1
+
+    return count
+
+
+def export_json(items, filename):
+    ''' Write a JSON list of objects, one item per line. '''
+    count = 0
+
+    with _open(filename) as file_:
+        file_.write('[')
+
+        for row in rows(items):
+            file_.write(',\n' if count else '\n')
+            file_.write(json.dumps(row._asdict(), ensure_ascii=False))
+            count += 1
+
+        file_.write('\n]\n')
+
+    return count
+
+
+_MARKDOWN_SPECIAL = re.compile(r'([\\`*_{}\[\]()<>#|!])')
+
+
+def markdown_escape(text):
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', text)
+
+
+def export_markdown(items, filename):
+    ''' Write a Markdown list of links. '''
+    count = 0
+
+    with _open(filename) as file_:
+        for row in rows(items):
+            # Parentheses and spaces would end the link early.
+            url = row.url.replace('(', '%28').replace(')', '%29')
+            url = url.replace(' ', '%20')
+
+            file_.write('- [{}]({})\n'.format(markdown_escape(row.text), url))
+            count += 1
+
+    return count
+
+
+# Format name -> function(items, filename) that returns how many items it
+# wrote.
+EXPORTERS = {
+    'html':     export_html,
+    'csv':      export_csv,
+    'json':     export_json,
+    'md':       export_markdown,
+    'markdown': export_markdown,
+}
+
+
+def export(items, format_, filename):
+    ''' Write items to filename in format_, one of EXPORTERS. Returns how
+    many items were written. Raises ValueError for an unknown format.
+    '''
+    try:
+        exporter = EXPORTERS[format_.lower()]
+    except KeyError:
+        raise ValueError('Unknown format: {} (try one of: {})'.format(
+            format_, ', '.join(sorted(EXPORTERS))))
+
+    return exporter(items, filename)
@@ -0,0 +1,511 @@
+"""
+A local stand-in for reddit's API, for benchmarks.py.
+
+FakeReddit is a small HTTP server that answers the requests PRAWToys makes
+through praw: subreddit searches, user listings, threads, /api/info,
+/api/morechildren and /api/vote, plus just enough of logging in to make praw
+happy. Everything it serves comes from a Corpus, which works out each item
+from its number instead of storing it, so a million-item corpus costs
+nothing until something asks for it.
+
+    with FakeReddit(Corpus(100000), latency=0.05) as server:
+        session = praw.Reddit('benchmarks',
+                              handler=LocalHandler(server.url))
+        ...
+
+LocalHandler sends every request praw makes to the server, whatever domain
+praw thinks it's talking to. Responses come back after [latency] seconds,
+with the same X-Ratelimit-* headers reddit sends, if there's a rate limit. Go
+over it and you get a 429, just like the real thing.
+"""
+import json
+import time
+import random
+import threading
+import urllib.parse
+import http.server
+
+import praw_tools
+
+SUBREDDITS = ['aww', 'pics', 'gifs', 'askreddit', 'funny', 'todayilearned',
+              'science', 'worldnews', 'videos', 'music']
+
+WORDS = ('the a of cat dog reddit today learned science music video picture '
+         'funny cute huge tiny old new first last best worst why how what '
+         'when über café ☃').split()
+
+# How many comments fit in one page of a thread, like reddit's default.
+THREAD_PAGE_SIZE = 200
+
+
+to_base36 = praw_tools.to_base36
+
+
+def from_base36(s):
+    return int(s, 36)
+
+
+class Corpus(object):
+    ''' A made-up set of submissions and comments. Item n is always the same
+    for a given seed, and nothing is kept in memory.
+
+    Submission n is in SUBREDDITS[n % len(subreddits)] and comment or
+    submission n is by 'user' + str(n % users), so listings never have to
+    look through items that aren't in them.
+
+    The first thread_size comments are all in submission 0, which makes one
+    big thread for the thread command to chew on. Comments are nested four
+    replies to a parent, with a tenth of them at the top level. Every other
+    comment is a top-level reply to submission n % submissions.
+    '''
+    def __init__(self, size=100000, seed=0, subreddits=SUBREDDITS,
+                 users=1000, comment_ratio=0.5, thread_size=10000):
+        self.seed = seed
+        self.subreddits = subreddits
+        self.users = users
+
+        self.comments = int(size * comment_ratio)
+        self.submissions = max(size - self.comments, 1)
+        self.thread_size = min(thread_size, self.comments)
+        self.top_level = max(self.thread_size // 10, 1)
+
+    def __len__(self):
+        return self.submissions + self.comments
+
+    def _random(self, kind, n):
+        return random.Random('{}:{}:{}'.format(self.seed, kind, n))
+
+    def _words(self, rng, count):
+        return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    # Single items. {{{1
+    def submission(self, n):
+        ''' reddit's JSON for submission n. '''
+        rng = self._random('t3', n)
+        id_ = to_base36(n)
+        subreddit = self.subreddits[n % len(self.subreddits)]
+        is_self = rng.random() < 0.3
+
+        return {'kind': 't3', 'data': {
+            'id': id_,
+            'name': 't3_' + id_,
+            'subreddit': subreddit,
+            'author': 'user' + str(n % self.users),
+            'title': self._words(rng, rng.randrange(3, 15)).capitalize(),
+            'selftext': self._words(rng, rng.randrange(50)) if is_self else '',
+            'is_self': is_self,
+            'over_18': rng.random() < 0.1,
+            'score': int(rng.paretovariate(1.2)) - 1,
+            'created_utc': 1400000000.0 + n * 60,
+            'num_comments': 0,
+            'url': 'http://example.com/' + id_,
+            'permalink': '/r/{}/comments/{}/_/'.format(subreddit, id_),
+            'domain': 'example.com',
+        }}
+
+    def link(self, n):
+        ''' Which submission comment n is in. '''
+        if n < self.thread_size:
+            return 0
+
+        return n % self.submissions
+
+    def parent(self, n):
+        ''' The fullname of comment n's parent. '''
+        if n < self.top_level or n >= self.thread_size:
+            return 't3_' + to_base36(self.link(n))
+
+        return 't1_' + to_base36((n - self.top_level) // 4)
+
+    def children(self, n):
+        ''' The numbers of comment n's replies. '''
+        if n >= self.thread_size:
+            return range(0)
+
+        first = self.top_level + 4 * n
+        return range(min(first, self.thread_size),
+                     min(first + 4, self.thread_size))
+
+    def comment(self, n):
+        ''' reddit's JSON for comment n, without any replies. '''
+        rng = self._random('t1', n)
+        id_ = to_base36(n)
+        link = self.link(n)
+        lines = [self._words(rng, rng.randrange(1, 30))
+                 for _ in range(rng.randrange(1, 4))]
+
+        return {'kind': 't1', 'data': {
+            'id': id_,
+            'name': 't1_' + id_,
+            'subreddit': self.subreddits[link % len(self.subreddits)],
+            'author': 'user' + str(n % self.users),
+            'body': '\n\n'.join(lines),
+            'score': int(rng.paretovariate(1.5)) - 1,
+            'created_utc': 1400000000.0 + n * 30,
+            'link_id': 't3_' + to_base36(link),
+            'parent_id': self.parent(n),
+            'replies': '',
+        }}
+
+    def thing(self, fullname):
+        ''' JSON for a fullname like t3_5f, or None if there's no such
+        thing.
+        '''
+        prefix, _, id_ = fullname.partition('_')
+
+        try:
+            n = from_base36(id_)
+        except ValueError:
+            return None
+
+        if prefix == 't3' and n < self.submissions:
+            return self.submission(n)
+        elif prefix == 't1' and n < self.comments:
+            return self.comment(n)
+
+    # Listings. {{{1
+    # A listing is a list of (prefix, range) parts, like [('t3', range(0, 10,
+    # 2))], so that a page can be found without making every item before it.
+    def subreddit_listing(self, subreddit):
+        try:
+            k = self.subreddits.index(subreddit.lower())
+        except ValueError:
+            return []
+
+        return [('t3', range(k, self.submissions, len(self.subreddits)))]
+
+    def user_listing(self, user, where=''):
+        try:
+            k = int(user.lower().replace('user', '', 1))
+        except ValueError:
+            return []
+
+        submissions = ('t3', range(k, self.submissions, self.users))
+        comments = ('t1', range(k, self.comments, self.users))
+
+        if where == 'submitted':
+            return [submissions]
+        elif where == 'comments':
+            return [comments]
+        elif where in ['saved', 'upvoted']:
+            return [('t3', range(0, self.submissions, 10)),
+                    ('t1', range(0, self.comments, 10))]
+
+        return [submissions, comments]
+
+    def page(self, listing, after=None, limit=25):
+        ''' Up to [limit] items from a listing, starting after the fullname
+        [after]. Returns (things, fullname of the last one or None).
+        '''
+        things = []
+        skip_to = None
+
+        if after:
+            prefix, _, id_ = after.partition('_')
+            skip_to = (prefix, from_base36(id_))
+
+        for prefix, numbers in listing:
+            start = 0
+
+            if skip_to is not None:
+                if skip_to[0] != prefix or skip_to[1] not in numbers:
+                    continue
+
+                start = numbers.index(skip_to[1]) + 1
+                skip_to = None
+
+            for n in numbers[start:start + limit - len(things)]:
+                things.append(self.thing(prefix + '_' + to_base36(n)))
+
+            if len(things) >= limit:
+                return things, things[-1]['data']['name']
+
+        return things, None
+
+    def thread(self, n):
+        ''' What /comments/<id> gives you for submission n: the submission
+        and the first THREAD_PAGE_SIZE top-level comments, with "load more
+        comments" for everything else.
+        '''
+        if n == 0 and self.thread_size:
+            top = list(range(self.top_level))
+        else:
+            first = n + self.submissions * -(-max(
+                self.thread_size - n, 0) // self.submissions)
+            top = list(range(first, self.comments, self.submissions))
+
+        comments = [self.with_more(i) for i in top[:THREAD_PAGE_SIZE]]
+
+        if len(top) > THREAD_PAGE_SIZE:
+            comments.append(self.more(
+                't3_' + to_base36(n), top[THREAD_PAGE_SIZE:]))
+
+        return [
+            listing_json([self.submission(n)]),
+            listing_json(comments),
+        ]
+
+    def more(self, parent_id, numbers):
+        children = [to_base36(i) for i in numbers]
+        return {'kind': 'more', 'data': {
+            'id': children[0], 'name': 't1_' + children[0],
+            'parent_id': parent_id, 'count': len(children),
+            'children': children}}
+
+    def with_more(self, n):
+        ''' Comment n, with a "load more comments" for its replies. '''
+        comment = self.comment(n)
+        children = self.children(n)
+
+        if children:
+            comment['data']['replies'] = listing_json(
+                [self.more(comment['data']['name'], children)])
+
+        return comment
+
+    def morechildren(self, ids):
+        ''' What /api/morechildren gives you for a list of comment ids: each
+        comment, followed by a "load more comments" for its replies.
+        '''
+        things = []
+
+        for id_ in ids:
+            n = from_base36(id_)
+
+            if n >= self.comments:
+                continue
+
+            things.append(self.comment(n))
+            children = self.children(n)
+
+            if children:
+                things.append(self.more('t1_' + id_, children))
+
+        return things
+
+
+def listing_json(things, after=None):
+    return {'kind': 'Listing', 'data': {
+        'children': things, 'after': after, 'before': None}}
+
+
+# The server. {{{1
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # The headers and the body go out in separate writes. With Nagle's
+    # algorithm on, the body waits for the client to ACK the headers, which
+    # it puts off for up to 40ms, so every request would take that long.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        server = self.server.fake_reddit
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+
+        length = int(self.headers.get('Content-Length') or 0)
+
+        if length:
+            params.update(urllib.parse.parse_qs(
+                self.rfile.read(length).decode('utf-8')))
+
+        params = {k: v[-1] for k, v in params.items()}
+
+        path = url.path.strip('/')
+
+        if path.endswith('.json'):
+            path = path[:-len('.json')]
+
+        status, body = server.handle(path.split('/'), params)
+        data = json.dumps(body).encode('utf-8')
+
+        time.sleep(server.latency)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+
+        if 'location' in body:
+            self.send_header('Location', body['location'])
+        self.send_header('Content-Length', str(len(data)))
+
+        for name, value in server.rate_limit_headers().items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeReddit(object):
+    def __init__(self, corpus=None, latency=0.0, rate_limit=None,
+                 window=600):
+        ''' latency is how many seconds every response takes. rate_limit is
+        how many requests are allowed per [window] seconds, or None for no
+        limit, in which case no rate limit headers are sent either. Making up a
+        limit to put in them would only get praw_tools.RateLimiter to slow
+        down for nothing.
+        '''
+        self.corpus = corpus if corpus is not None else Corpus()
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+
+        # fullname -> the last direction it was voted in.
+        self.votes = {}
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._used = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.fake_reddit = self
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Rate limiting. {{{2
+    def _count_request(self):
+        ''' Returns False if this request is over the rate limit. '''
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+
+            if now - self._window_start >= self.window:
+                self._window_start = now
+                self._used = 0
+
+            self._used += 1
+
+            return self.rate_limit is None or self._used <= self.rate_limit
+
+    def rate_limit_headers(self):
+        if self.rate_limit is None:
+            return {}
+
+        with self._lock:
+            reset = self.window - (time.monotonic() - self._window_start)
+
+            return {
+                'X-Ratelimit-Used': str(self._used),
+                'X-Ratelimit-Remaining': str(
+                    max(self.rate_limit - self._used, 0)),
+                'X-Ratelimit-Reset': str(max(int(reset), 0)),
+            }
+
+    # Endpoints. {{{2
+    def handle(self, path, params):
+        ''' Returns (HTTP status, JSON body) for a request. path is the URL
+        path split on slashes, without .json, like ['r', 'aww', 'search'].
+        '''
+        if not self._count_request():
+            return 429, {'message': 'Too Many Requests', 'error': 429}
+
+        corpus = self.corpus
+        limit = min(int(params.get('limit', 25)), 100)
+        after = params.get('after')
+
+        if path[:2] == ['r', 'random']:
+            # Like reddit, send them off to some subreddit.
+            subreddit = random.choice(corpus.subreddits)
+            return 302, {'location': '/r/{}/.json'.format(subreddit)}
+        elif path[0] == 'r' and len(path) > 1:
+            if path[2:3] == ['about']:
+                return 200, {'kind': 't5', 'data': {
+                    'display_name': path[1], 'name': 't5_' + path[1]}}
+
+            return self.listing(corpus.subreddit_listing(path[1]), after,
+                                limit)
+        elif path[0] in ['user', 'u'] and len(path) > 1:
+            where = path[2] if len(path) > 2 else ''
+
+            if where == 'about':
+                return 200, self.account(path[1])
+
+            return self.listing(corpus.user_listing(path[1], where), after,
+                                limit)
+        elif path[0] == 'comments' and len(path) > 1:
+            n = from_base36(path[1])
+
+            if n >= corpus.submissions:
+                return 404, {'error': 404}
+
+            return 200, corpus.thread(n)
+        elif path[:2] == ['api', 'info']:
+            things = [corpus.thing(i) for i in params.get('id', '').split(',')
+                      if i]
+            return 200, listing_json([i for i in things if i is not None])
+        elif path[:2] == ['api', 'morechildren']:
+            ids = [i for i in params.get('children', '').split(',') if i]
+            return 200, {'json': {'errors': [], 'data': {
+                'things': corpus.morechildren(ids)}}}
+        elif path[:2] == ['api', 'vote']:
+            with self._lock:
+                self.votes[params.get('id')] = int(params.get('dir', 0))
+
+            return 200, {}
+        elif path[:2] == ['api', 'login']:
+            return 200, {'json': {'errors': [], 'data': {
+                'modhash': 'fakemodhash', 'cookie': 'fakecookie'}}}
+        elif path[:2] in [['api', 'me'], ['api', 'v1']]:
+            return 200, self.account('benchmark')
+
+        return 404, {'error': 404}
+
+    def listing(self, listing, after, limit):
+        things, last = self.corpus.page(listing, after, limit)
+        return 200, listing_json(things, last)
+
+    def account(self, name):
+        return {'kind': 't2', 'data': {
+            'name': name, 'id': to_base36(abs(hash(name)) % 10**9),
+            'link_karma': 1, 'comment_karma': 1, 'created_utc': 1400000000.0,
+            'has_mail': False, 'has_mod_mail': False, 'is_mod': False}}
+
+
+class LocalHandler(praw_tools.ConcurrentHandler):
+    ''' A praw handler that sends everything to base_url (like a FakeReddit's
+    url) instead of reddit.
+    '''
+    def __init__(self, base_url, limiter=None):
+        super(LocalHandler, self).__init__(limiter)
+        self.base_url = urllib.parse.urlsplit(base_url)
+
+    def request(self, request, proxies, timeout, verify, **kwargs):
+        url = urllib.parse.urlsplit(request.url)
+        request.url = urllib.parse.urlunsplit(
+            (self.base_url.scheme, self.base_url.netloc) + url[2:])
+
+        return super(LocalHandler, self).request(
+            request, proxies, timeout, verify, **kwargs)
@@ -0,0 +1,180 @@
+"""
+Undo/redo history for URLToysClone.
+
+Instead of copying the whole item list every time something changes, each
+Change only remembers what's different: which positions were removed (and
+what was in them) and how many items were appended to the end. That's enough
+to rebuild the list in either direction, and a filter that throws out 10
+items out of 200,000 only costs 10 items' worth of memory.
+"""
+import array
+
+# How many removed items the history is allowed to hold on to, in total. Once
+# it goes over, the oldest changes are forgotten.
+LIMIT = 1000000
+
+
+def complement(positions, length):
+    ''' Every position in range(length) that isn't in positions.
+
+    positions has to be sorted.
+
+    >>> list(complement([1, 2, 4], 6))
+    [0, 3, 5]
+    '''
+    previous = 0
+
+    for position in positions:
+        yield from range(previous, position)
+        previous = position + 1
+
+    yield from range(previous, length)
+
+
+class Change(object):
+    def __init__(self, removed_positions=(), removed_items=(), added=0):
+        ''' removed_positions are the (sorted) positions that were taken out
+        of the old list, and removed_items is what was in them.
+
+        added is how many items were appended to the end afterwards.
+        removed_items can be any sequence, so if you're throwing a whole list
+        away, you can just pass in the list itself instead of copying it.
+        '''
+        self.removed_positions = removed_positions
+        self.removed_items     = removed_items
+        self.added             = added
+
+        # Filled in by undo, so that redo knows what to put back.
+        self.added_items = []
+
+    @property
+    def cost(self):
+        ''' How many items this change is keeping alive by itself. '''
+        return len(self.removed_items) + len(self.added_items)
+
+    def undo(self, items):
+        ''' Given the list after this change, return the list before it. '''
+        kept_length = len(items) - self.added
+        self.added_items = items[kept_length:]
+
+        old_items = []
+        kept_index = 0
+
+        # Walk through the removed positions, filling in the gaps between
+        # them with whatever was kept.
+        for position, item in zip(self.removed_positions, self.removed_items):
+            gap = position - len(old_items)
+            old_items += items[kept_index:kept_index + gap]
+            kept_index += gap
+
+            old_items.append(item)
+
+        old_items += items[kept_index:kept_length]
+        return old_items
+
+    def redo(self, items):
+        ''' Given the list before this change, return the list after it. '''
+        new_items = []
+        previous = 0
+
+        for position in self.removed_positions:
+            new_items += items[previous:position]
+            previous = position + 1
+
+        new_items += items[previous:]
+        new_items += self.added_items
+
+        self.added_items = []
+        return new_items
+
+
+class SnapshotChange(object):
+    ''' A change that just remembers the whole list from before it. It has
+    the same interface as Change.
+
+    This is for when the list gets replaced with something else entirely. If
+    the old list is cheap to keep around, like an ItemStore on top of a
+    session_file.SessionView (with its indexes thrown away), which is only an
+    array of positions, cost can be 0. Otherwise it should be how many items
+    the old list holds, so the history can be trimmed.
+    '''
+    def __init__(self, old_items, cost=0):
+        self.old_items = old_items
+        self.new_items = None
+        self.cost = cost
+
+    def undo(self, items):
+        self.new_items = items
+        return self.old_items
+
+    def redo(self, items):
+        new_items, self.new_items = self.new_items, None
+        return new_items
+
+
+def filter_change(items, kept_positions):
+    ''' Make a Change for keeping only kept_positions (sorted) of items. '''
+    removed = array.array('L', complement(kept_positions, len(items)))
+    return Change(removed, [items[i] for i in removed])
+
+
+class History(object):
+    def __init__(self, limit=None):
+        ''' limit defaults to history.LIMIT. See its comment. '''
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def push(self, change):
+        ''' Record a change that just happened. This clears the redo stack. '''
+        self.undo_stack.append(change)
+        self.redo_stack = []
+        self.trim()
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+
+    @property
+    def cost(self):
+        return sum(i.cost for i in self.undo_stack + self.redo_stack)
+
+    def trim(self):
+        ''' Forget the oldest changes until we're under our limit. '''
+        limit = LIMIT if self.limit is None else self.limit
+        cost = self.cost
+
+        # The redo stack goes first, since it'd get thrown away by the next
+        # change anyway. Always keep the most recent undo step.
+        while cost > limit and self.redo_stack:
+            cost -= self.redo_stack.pop(0).cost
+
+        while cost > limit and len(self.undo_stack) > 1:
+            cost -= self.undo_stack.pop(0).cost
+
+    def undo(self, items, n=1):
+        ''' Undo up to n changes. Returns (new items, how many were undone).
+        '''
+        done = 0
+
+        while done < n and self.undo_stack:
+            change = self.undo_stack.pop()
+            items = change.undo(items)
+            self.redo_stack.append(change)
+            done += 1
+
+        self.trim()
+        return items, done
+
+    def redo(self, items, n=1):
+        ''' Redo up to n changes. Returns (new items, how many were redone).
+        '''
+        done = 0
+
+        while done < n and self.redo_stack:
+            change = self.redo_stack.pop()
+            items = change.redo(items)
+            self.undo_stack.append(change)
+            done += 1
+
+        return items, done
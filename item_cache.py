@@ -0,0 +1,250 @@
+"""
+An on-disk cache of comments and submissions, so that running the same
+get_from or user command twice doesn't mean downloading everything twice.
+
+Everything lives in one SQLite file. Items are stored once each, by fullname,
+as praw_tools.CompactItem dicts. Each listing we've fetched (like "the newest
+submissions in /r/aww") is stored as an ordered list of fullnames, along with
+when we fetched it and whether we got all of it.
+
+Listings sorted by 'new' are fetched incrementally: we only download items
+until we reach the newest one we already have, and the rest comes from disk.
+Anything else is served from disk until it's older than TTL seconds.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import praw_tools
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.prawtoys_cache.sqlite')
+
+# How many seconds a cached listing is good for.
+TTL = 24 * 60 * 60
+
+# How many items the cache can hold before it starts forgetting the oldest
+# listings.
+MAX_ITEMS = 1000000
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS items (
+        fullname TEXT PRIMARY KEY,
+        data     TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS listings (
+        source   TEXT PRIMARY KEY,
+        fetched  REAL NOT NULL,
+        complete INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS listing_items (
+        source   TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        fullname TEXT NOT NULL,
+        PRIMARY KEY (source, position)
+    );
+
+    -- evict looks items up by fullname after every store_listing. Without
+    -- this, that's a scan of every listing for every item.
+    CREATE INDEX IF NOT EXISTS listing_items_fullname
+        ON listing_items (fullname);
+'''
+
+
+class ItemCache(object):
+    def __init__(self, path=DEFAULT_PATH, ttl=None, max_items=None):
+        ''' ttl and max_items default to item_cache.TTL and MAX_ITEMS. '''
+        self.path      = path
+        self.ttl       = TTL if ttl is None else ttl
+        self.max_items = MAX_ITEMS if max_items is None else max_items
+
+        # praw_tools.fetch_all runs sources on worker threads, so the
+        # connection gets shared between threads and guarded by a lock.
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+        self.hits   = 0
+        self.misses = 0
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def get_listing(self, source):
+        ''' Get (items, fetched, complete) for a cached listing.
+
+        Returns None if we don't have it or it's older than our TTL. items is
+        a list of CompactItems.
+        '''
+        with self.lock:
+            row = self.db.execute(
+                'SELECT fetched, complete FROM listings WHERE source = ?',
+                (source,)).fetchone()
+
+            if row is None or time.time() - row[0] > self.ttl:
+                return None
+
+            data = self.db.execute(
+                'SELECT items.data FROM listing_items JOIN items'
+                ' ON listing_items.fullname = items.fullname'
+                ' WHERE listing_items.source = ?'
+                ' ORDER BY listing_items.position', (source,)).fetchall()
+
+        items = [praw_tools.CompactItem.from_dict(json.loads(i))
+                 for i, in data]
+
+        return items, row[0], bool(row[1])
+
+    def store_listing(self, source, items, complete):
+        ''' Replace the cached copy of a listing with items.
+
+        complete is whether items is the whole listing, as opposed to the
+        first [limit] items of it.
+        '''
+        items = [praw_tools.compact(i) for i in items]
+
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO items VALUES (?, ?)',
+                ((i.fullname, json.dumps(i.to_dict())) for i in items))
+
+            self.db.execute(
+                'DELETE FROM listing_items WHERE source = ?', (source,))
+            self.db.executemany(
+                'INSERT INTO listing_items VALUES (?, ?, ?)',
+                ((source, position, i.fullname)
+                 for position, i in enumerate(items)))
+
+            self.db.execute(
+                'INSERT OR REPLACE INTO listings VALUES (?, ?, ?)',
+                (source, time.time(), int(complete)))
+
+        self.evict()
+
+    def fetch(self, source, get_items, limit=None, incremental=False):
+        ''' Yield up to [limit] items from a listing, using the cache.
+
+        source is a string that names the listing, like 'r/aww search new'.
+        get_items is a function that takes a limit and returns a praw listing
+        generator, for when we have to hit the network.
+
+        If incremental is True, the listing has to be sorted newest first.
+        We'll fetch new items until we hit one we've seen before and get the
+        rest from disk.
+        '''
+        cached = self.get_listing(source)
+
+        # The cache can't help us if it doesn't have as many items as we
+        # want, unless it's got the entire listing.
+        if cached is not None:
+            items, fetched, complete = cached
+
+            if not complete and (limit is None or len(items) < limit):
+                cached = None
+
+        if cached is None:
+            self.misses += 1
+            yield from self._fetch_live(source, get_items, limit)
+        elif incremental:
+            self.hits += 1
+            yield from self._fetch_new(source, get_items, limit, *cached)
+        else:
+            self.hits += 1
+            yield from cached[0][:limit]
+
+    def _fetch_live(self, source, get_items, limit):
+        fetched = []
+
+        for item in get_items(limit):
+            fetched.append(item)
+            yield item
+
+        # We only get here if nobody stopped iterating early, so this really
+        # is the whole listing (or the first [limit] items of it).
+        complete = limit is None or len(fetched) < limit
+        self.store_listing(source, fetched, complete)
+
+    def _fetch_new(self, source, get_items, limit, items, fetched, complete):
+        seen = {i.fullname for i in items}
+        new_items = []
+
+        for item in get_items(limit):
+            if praw_tools.compact(item).fullname in seen:
+                break
+
+            new_items.append(item)
+            yield item
+        else:
+            # We never caught up with the cache, so there could be a gap
+            # between what we just fetched and what we had. Start over with
+            # what we just fetched.
+            complete = limit is None or len(new_items) < limit
+            self.store_listing(source, new_items, complete)
+            return
+
+        remaining = None if limit is None else limit - len(new_items)
+        yield from items[:remaining]
+
+        self.store_listing(source, new_items + items, complete)
+
+    def evict(self):
+        ''' Forget expired listings, then the oldest ones until there are no
+        more than max_items items left.
+        '''
+        with self.lock, self.db:
+            self.db.execute(
+                'DELETE FROM listings WHERE fetched < ?',
+                (time.time() - self.ttl,))
+
+            sources = self.db.execute(
+                'SELECT listings.source, COUNT(*) FROM listings'
+                ' JOIN listing_items'
+                ' ON listings.source = listing_items.source'
+                ' GROUP BY listings.source'
+                ' ORDER BY listings.fetched DESC').fetchall()
+
+            # Keep the newest listings that fit. Items shared between
+            # listings get counted twice, so this errs on the small side.
+            total = 0
+            for source, count in sources:
+                total += count
+
+                if total > self.max_items:
+                    self.db.execute(
+                        'DELETE FROM listings WHERE source = ?', (source,))
+
+            self.db.execute(
+                'DELETE FROM listing_items WHERE source NOT IN'
+                ' (SELECT source FROM listings)')
+            self.db.execute(
+                'DELETE FROM items WHERE fullname NOT IN'
+                ' (SELECT fullname FROM listing_items)')
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM listing_items')
+            self.db.execute('DELETE FROM listings')
+            self.db.execute('DELETE FROM items')
+
+        with self.lock:
+            self.db.execute('VACUUM')
+
+    def stats(self):
+        ''' Get a dict of numbers about the cache. '''
+        with self.lock:
+            listings, = self.db.execute(
+                'SELECT COUNT(*) FROM listings').fetchone()
+            items, = self.db.execute('SELECT COUNT(*) FROM items').fetchone()
+
+        return {
+            'path': self.path,
+            'listings': listings,
+            'items': items,
+            'bytes': os.path.getsize(self.path),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,466 @@
+"""
+The little expression language behind PRAWToys' where command. For example:
+
+    kind==submission and sub in (aww, pics) and not self and title~/foo/i
+
+An expression is compiled once, by parse(), into a tree of tests. Running it
+over an item_store.ItemStore gives you the positions of every item that
+matches, so the whole thing is one filter (and one undo step) no matter how
+many conditions it has.
+
+Tests on indexed fields (kind, sub, author, nsfw, self) never look at the
+items themselves. They check each distinct key of the index once and then
+look up the matching positions. Everything else has to check items one at a
+time, so inside an "and" or an "or", the cheap tests run first and the
+expensive ones (regexes) only see whatever's left over.
+
+The grammar, roughly:
+
+    expression := and_expr ('or' and_expr)*
+    and_expr   := not_expr ('and' not_expr)*
+    not_expr   := 'not' not_expr | '(' expression ')' | test
+    test       := field op value | field ['not'] 'in' '(' value, ... ')'
+                | field
+
+A field on its own means field==true, so "self" and "nsfw" work like you'd
+expect. "comment" and "submission" on their own mean kind==comment and
+kind==submission. Values with spaces or slashes in them need quotes, and
+regexes go between slashes with optional i, m and s flags after them.
+"""
+import re
+import operator
+import functools
+
+import praw_tools
+
+# Roughly how expensive each kind of test is, per item. Only the order
+# matters.
+INDEX_COST   = 1
+COMPARE_COST = 10
+REGEX_COST   = 100
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<regex>  /(?:[^/\\]|\\.)*/[a-z]*           )
+      | (?P<string> "(?:[^"\\]|\\.)*" | '(?:[^'\\]|\\.)*' )
+      | (?P<op>     ==|!=|<=|>=|!~|[<>~=(),]           )
+      | (?P<word>   [^\s=!<>~(),/"']+                  )
+    )''', re.VERBOSE)
+
+_REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL}
+
+_COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne,
+    '<':  operator.lt, '<=': operator.le,
+    '>':  operator.gt, '>=': operator.ge,
+}
+
+
+# Fields. {{{1
+class Field(object):
+    def __init__(self, type_, index=None, getter=None):
+        ''' type_ is one of:
+
+        'lower'  - case-insensitive text, like subreddit names
+        'text'   - case-sensitive text
+        'bool'   - true/false
+        'number' - anything float() can handle
+
+        If index is given, it's the name of one of praw_tools.ITEM_INDEXERS,
+        and getter defaults to that indexer.
+        '''
+        self.type = type_
+        self.index = index
+        self.getter = getter or praw_tools.ITEM_INDEXERS[index]
+
+    def value(self, word):
+        ''' Turn a word from the expression into something to compare with.
+        '''
+        if self.type == 'lower':
+            return word.lower()
+        elif self.type == 'bool':
+            if word.lower() in ['true', 'yes', '1']:
+                return True
+            elif word.lower() in ['false', 'no', '0']:
+                return False
+
+            raise ValueError('Expected true or false, not: ' + word)
+        elif self.type == 'number':
+            try:
+                return float(word)
+            except ValueError:
+                raise ValueError('Expected a number, not: ' + word)
+
+        return word
+
+
+FIELDS = {
+    'kind':    Field('lower', 'kind'),
+    'sub':     Field('lower', 'subreddit'),
+    'author':  Field('lower', 'author'),
+    'nsfw':    Field('bool', 'over_18'),
+    'self':    Field('bool', 'is_self'),
+    'title':   Field('text', getter=praw_tools.item_title),
+    'body':    Field('text', getter=praw_tools.item_body),
+    'url':     Field('text', getter=praw_tools.praw_object_url),
+    'id':      Field('text', getter=lambda i: getattr(i, 'id', None)),
+    'score':   Field('number', getter=lambda i: getattr(i, 'score', None)),
+    'created': Field('number',
+                     getter=lambda i: getattr(i, 'created_utc', None)),
+}
+
+FIELDS['subreddit'] = FIELDS['sub']
+FIELDS['over_18']   = FIELDS['nsfw']
+FIELDS['is_self']   = FIELDS['self']
+FIELDS['text']      = FIELDS['body']
+
+
+# The compiled tree. {{{1
+# Every node has a cost and a select(store, candidates) method. candidates is
+# a sorted sequence of positions, and select returns the sorted list of the
+# ones that match.
+class IndexTest(object):
+    ''' Test every distinct key in one of the store's indexes, instead of
+    every item.
+    '''
+    cost = INDEX_COST
+
+    def __init__(self, name, getter, test):
+        self.name = name
+        self.getter = getter
+        self.test = test
+
+    def select(self, store, candidates):
+        if self.name not in getattr(store, 'indexers', {}):
+            # No index to use, so do it the slow way.
+            return ItemTest(self.getter, self.test, 0).select(
+                store, candidates)
+
+        keys = [i for i in store.index(self.name) if self.test(i)]
+        matches = store.positions(self.name, *keys)
+
+        if len(candidates) == len(store):
+            return matches
+
+        matches = set(matches)
+        return [i for i in candidates if i in matches]
+
+
+class ItemTest(object):
+    def __init__(self, getter, test, cost):
+        self.getter = getter
+        self.test = test
+        self.cost = cost
+
+    def select(self, store, candidates):
+        getter, test = self.getter, self.test
+        return [i for i in candidates if test(getter(store[i]))]
+
+
+class Not(object):
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+
+    def select(self, store, candidates):
+        unwanted = set(self.child.select(store, candidates))
+        return [i for i in candidates if i not in unwanted]
+
+
+class And(object):
+    def __init__(self, children):
+        # Cheapest first, so the expensive tests see as few items as
+        # possible.
+        self.children = sorted(children, key=lambda i: i.cost)
+        self.cost = sum(i.cost for i in children)
+
+    def select(self, store, candidates):
+        for child in self.children:
+            if not candidates:
+                break
+
+            candidates = child.select(store, candidates)
+
+        return list(candidates)
+
+
+class Or(object):
+    def __init__(self, children):
+        self.children = sorted(children, key=lambda i: i.cost)
+        self.cost = sum(i.cost for i in children)
+
+    def select(self, store, candidates):
+        matches = []
+
+        # Anything that's already matched doesn't need checking again.
+        for child in self.children:
+            if not candidates:
+                break
+
+            matched = child.select(store, candidates)
+            matches += matched
+
+            matched = set(matched)
+            candidates = [i for i in candidates if i not in matched]
+
+        return sorted(matches)
+
+
+class Filter(object):
+    ''' What parse() gives you. '''
+    def __init__(self, expression, root):
+        self.expression = expression
+        self.root = root
+
+    def positions(self, store):
+        ''' The sorted positions of every item in store that matches. '''
+        return self.root.select(store, range(len(store)))
+
+
+# Text patterns. {{{1
+@functools.lru_cache(maxsize=64)
+def compile_patterns(patterns, ignore_case=False, literal=False):
+    ''' Compile a tuple of patterns into one regex that matches wherever any
+    of them do.
+
+    Several patterns become a single alternation, so searching for all of
+    them only takes one pass over the text. literal=True means the patterns
+    are plain text, not regexes. Compiled patterns are cached, so running the
+    same filter again doesn't compile anything.
+
+    Raises ValueError if one of them isn't a valid regex.
+    '''
+    if literal:
+        patterns = [re.escape(i) for i in patterns]
+
+    if len(patterns) == 1:
+        source = patterns[0]
+    else:
+        source = '|'.join('(?:' + i + ')' for i in patterns)
+
+    try:
+        return re.compile(source, re.IGNORECASE if ignore_case else 0)
+    except re.error as error:
+        raise ValueError('Bad regex {!r}: {}'.format(source, error))
+
+
+# Parsing. {{{1
+def tokenize(expression):
+    ''' Split an expression into (kind, text) tuples. kind is 'regex',
+    'string', 'op' or 'word'.
+    '''
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+
+        if match is None or match.end() == position:
+            raise ValueError(
+                "Couldn't understand: " + expression[position:].strip())
+
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+
+    return tokens
+
+
+def _unquote(string):
+    return re.sub(r'\\(.)', r'\1', string[1:-1])
+
+
+def _make_test(op, value):
+    ''' Get a function that takes a field's value and returns True or False.
+    None (a field the item doesn't have) only ever matches != and !~.
+    '''
+    if op == 'in':
+        values = set(value)
+        return lambda i: i in values
+    elif op in ['~', '!~']:
+        matches = lambda i: i is not None and value.search(i) is not None
+        return matches if op == '~' else (lambda i: not matches(i))
+    elif op in ['==', '!=']:
+        return lambda i, compare=_COMPARISONS[op]: compare(i, value)
+
+    compare = _COMPARISONS[op]
+    return lambda i: i is not None and compare(i, value)
+
+
+class _Parser(object):
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def peek(self):
+        try:
+            return self.tokens[self.position]
+        except IndexError:
+            return (None, None)
+
+    def next(self):
+        token = self.peek()
+
+        if token == (None, None):
+            raise ValueError('Unexpected end of expression.')
+
+        self.position += 1
+        return token
+
+    def peek_word(self, *words):
+        ''' Is the next token one of these keywords? '''
+        kind, text = self.peek()
+        return kind == 'word' and text.lower() in words
+
+    def expect(self, text):
+        kind, found = self.next()
+
+        if found != text:
+            raise ValueError('Expected {!r}, not {!r}'.format(text, found))
+
+    def parse(self):
+        node = self.expression()
+
+        if self.position < len(self.tokens):
+            raise ValueError('Unexpected: ' + self.peek()[1])
+
+        return node
+
+    def expression(self):
+        children = [self.and_expr()]
+
+        while self.peek_word('or'):
+            self.next()
+            children.append(self.and_expr())
+
+        return children[0] if len(children) == 1 else Or(children)
+
+    def and_expr(self):
+        children = [self.not_expr()]
+
+        while self.peek_word('and'):
+            self.next()
+            children.append(self.not_expr())
+
+        return children[0] if len(children) == 1 else And(children)
+
+    def not_expr(self):
+        if self.peek_word('not'):
+            self.next()
+            return Not(self.not_expr())
+        elif self.peek() == ('op', '('):
+            self.next()
+            node = self.expression()
+            self.expect(')')
+            return node
+
+        return self.test()
+
+    def value(self, field):
+        kind, text = self.next()
+
+        if kind == 'string':
+            text = _unquote(text)
+        elif kind != 'word':
+            raise ValueError('Expected a value, not: ' + text)
+
+        return field.value(text)
+
+    def regex(self, field):
+        kind, text = self.next()
+
+        if kind != 'regex':
+            # Let people leave off the slashes if it's all one word.
+            if kind not in ['word', 'string']:
+                raise ValueError('Expected a /regex/, not: ' + text)
+
+            text = '/' + (_unquote(text) if kind == 'string' else text) + '/'
+
+        pattern, flag_letters = text[1:].rsplit('/', 1)
+        flags = re.IGNORECASE if field.type == 'lower' else 0
+
+        for letter in flag_letters:
+            try:
+                flags |= _REGEX_FLAGS[letter]
+            except KeyError:
+                raise ValueError('Unknown regex flag: ' + letter)
+
+        try:
+            return re.compile(pattern, flags)
+        except re.error as error:
+            raise ValueError('Bad regex {!r}: {}'.format(pattern, error))
+
+    def test(self):
+        kind, name = self.next()
+
+        if kind != 'word':
+            raise ValueError('Expected a field name, not: ' + name)
+
+        if name.lower() in ['comment', 'submission']:
+            return self.leaf(FIELDS['kind'], '==', name.lower())
+
+        try:
+            field = FIELDS[name.lower()]
+        except KeyError:
+            raise ValueError('Unknown field: {} (try one of: {})'.format(
+                name, ', '.join(sorted(FIELDS))))
+
+        invert = False
+        if self.peek_word('not'):
+            self.next()
+            invert = True
+
+            if not self.peek_word('in'):
+                raise ValueError("Expected 'in' after {} not".format(name))
+
+        if self.peek_word('in'):
+            self.next()
+            self.expect('(')
+            values = [self.value(field)]
+
+            while self.peek() == ('op', ','):
+                self.next()
+                values.append(self.value(field))
+
+            self.expect(')')
+            node = self.leaf(field, 'in', values)
+            return Not(node) if invert else node
+
+        kind, op = self.peek()
+
+        if kind != 'op' or op in ['(', ')', ',']:
+            # A field on its own, like "self".
+            return self.leaf(field, '==', field.value('true'))
+
+        self.next()
+        op = '==' if op == '=' else op
+
+        if op in ['~', '!~']:
+            if field.type not in ['lower', 'text']:
+                raise ValueError("{} can't be used with {}".format(op, name))
+
+            return self.leaf(field, op, self.regex(field))
+
+        if op not in ['==', '!='] and field.type not in ['number', 'text']:
+            raise ValueError("{} can't be used with {}".format(op, name))
+
+        return self.leaf(field, op, self.value(field))
+
+    def leaf(self, field, op, value):
+        test = _make_test(op, value)
+
+        if field.index is not None:
+            return IndexTest(field.index, field.getter, test)
+
+        cost = REGEX_COST if op in ['~', '!~'] else COMPARE_COST
+        return ItemTest(field.getter, test, cost)
+
+
+def parse(expression):
+    ''' Compile an expression into a Filter. Raises ValueError if there's
+    anything wrong with it.
+    '''
+    if not expression.strip():
+        raise ValueError('Empty expression.')
+
+    return Filter(expression, _Parser(expression).parse())
@@ -0,0 +1,301 @@
+"""
+Used by URLToysClone to hold its items. An ItemStore acts like a list, but it
+also keeps indexes on the side, so questions like "which items are from
+/r/aww?" don't have to look at every single item to get answered.
+
+Which indexes you get depends on the indexers you pass in. For example:
+
+    >>> store = ItemStore(['foo', 'bar', 'baz'], {'first': lambda i: i[0]})
+    >>> store.positions('first', 'b')
+    [1, 2]
+    >>> store.counts('first')
+    {'f': 1, 'b': 2}
+
+Indexes are only built the first time you ask for them, and after that
+they're kept up-to-date as you append items. Anything else that changes the
+list (like setting or deleting items) just throws them away to be rebuilt
+later.
+
+If you give it a text function (item -> string), it'll also keep a
+text_index.TextIndex of every item's text for full-text search. That works
+the same way as the other indexes.
+
+An ItemStore can also sit on top of a lazy, read-only sequence instead of a
+list, like session_file.SessionView. Anything with a take(positions) method
+counts. The store will use that instead of copying items around, and if it
+has a column(name) method, that'll be tried before looking at any items. The
+first time you change a lazy store, it's loaded into a normal list.
+
+share() uses that to copy a store without copying anything: the copy sits on
+top of a read-only view of the original's list, and only gets a list of its
+own once it's changed.
+"""
+import heapq
+import itertools
+import collections.abc
+
+import text_index
+
+
+class ItemStore(collections.abc.MutableSequence):
+    def __init__(self, items=(), indexers=None, text=None):
+        ''' indexers is a dict like {name: key_function}. Each key_function
+        takes an item and returns something hashable to index it under.
+
+        text is a function that takes an item and returns its text, for
+        text_index. Without one, there's no full-text search.
+        '''
+        if hasattr(items, 'take') and not isinstance(items, ItemStore):
+            self._items = items
+        else:
+            self._items = list(items)
+
+        self.indexers = indexers or {}
+        self.text = text
+
+        # name -> [key, key, ...], one key per item and in the same order.
+        self._columns = {}
+
+        # name -> {key: [position, position, ...]}. The positions are always
+        # sorted.
+        self._indexes = {}
+
+        # A text_index.TextIndex, once someone asks for it.
+        self._text_index = None
+
+        # Has share() handed out a view of self._items? Appending is still
+        # fine, since a view can't see past its length, but nothing else is.
+        self._shared = False
+
+    @property
+    def lazy(self):
+        ''' Are we on top of a lazy sequence instead of a list? '''
+        return hasattr(self._items, 'take')
+
+    def _materialize(self, appending=False):
+        if self.lazy or (self._shared and not appending):
+            self._items = list(self._items)
+            self._shared = False
+
+        # Columns from share() are views too, and append needs real lists.
+        for name, column in self._columns.items():
+            if isinstance(column, _Prefix):
+                self._columns[name] = list(column)
+
+    # The list interface. {{{1
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        # Slices give you a plain list. That's what undo history wants.
+        return self._items[index]
+
+    def __setitem__(self, index, item):
+        self._materialize()
+        self._items[index] = item
+        self.forget_indexes()
+
+    def __delitem__(self, index):
+        self._materialize()
+        del self._items[index]
+        self.forget_indexes()
+
+    def insert(self, index, item):
+        self._materialize()
+        self._items.insert(index, item)
+        self.forget_indexes()
+
+    def append(self, item):
+        self._materialize(appending=True)
+        position = len(self._items)
+        self._items.append(item)
+
+        # Keep whatever we've already built up-to-date. That's cheap, since
+        # it's just one key per index.
+        for name, column in self._columns.items():
+            key = self.indexers[name](item)
+            column.append(key)
+
+            if name in self._indexes:
+                self._indexes[name].setdefault(key, []).append(position)
+
+        if self._text_index is not None:
+            self._text_index.add(self.text(item))
+
+    def __eq__(self, other):
+        if isinstance(other, ItemStore):
+            other = other._items
+
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+
+        return list(self._items) == list(other)
+
+    # Mutable containers shouldn't be hashable.
+    __hash__ = None
+
+    def __repr__(self):
+        return 'ItemStore(' + repr(list(self._items)) + ')'
+
+    # Indexes. {{{1
+    def forget_indexes(self):
+        ''' Throw away every column and index, to be rebuilt when needed. '''
+        self._columns.clear()
+        self._indexes.clear()
+        self._text_index = None
+
+    def column(self, name):
+        ''' Get the key of every item for indexer [name], in order. '''
+        if name not in self._columns:
+            column = None
+
+            if hasattr(self._items, 'column'):
+                column = self._items.column(name)
+
+            if column is None:
+                key_function = self.indexers[name]
+                column = [key_function(i) for i in self._items]
+
+            self._columns[name] = column
+
+        return self._columns[name]
+
+    def index(self, name):
+        ''' Get a dict of {key: [position, ...]} for indexer [name].
+
+        Don't modify what you get back! It's the real index.
+        '''
+        if name not in self._indexes:
+            index = {}
+
+            for position, key in enumerate(self.column(name)):
+                try:
+                    index[key].append(position)
+                except KeyError:
+                    index[key] = [position]
+
+            self._indexes[name] = index
+
+        return self._indexes[name]
+
+    def positions(self, name, *keys):
+        ''' Get the sorted positions of every item with one of these keys. '''
+        index = self.index(name)
+        matches = [index[key] for key in set(keys) if key in index]
+
+        if len(matches) == 1:
+            return matches[0][:]
+
+        return list(heapq.merge(*matches))
+
+    def counts(self, name):
+        ''' Get a dict of {key: how many items have that key}. '''
+        return {key: len(positions)
+                for key, positions in self.index(name).items()}
+
+    def text_index(self):
+        ''' Get a text_index.TextIndex of every item's text. Raises
+        ValueError if this store doesn't have a text function.
+        '''
+        if self._text_index is None:
+            if self.text is None:
+                raise ValueError("This list doesn't support text search.")
+
+            self._text_index = text_index.TextIndex.build(
+                self.text(i) for i in self._items)
+
+        return self._text_index
+
+    def set_text_index(self, index):
+        ''' Use an index that was built somewhere else, like one loaded from
+        a file. It has to have exactly one entry per item.
+        '''
+        if len(index) != len(self._items):
+            raise ValueError('That index is for {} items, not {}.'.format(
+                len(index), len(self._items)))
+
+        self._text_index = index
+
+    # Making new stores. {{{1
+    def take(self, positions):
+        ''' Get a new ItemStore with only the items at these positions.
+
+        Any columns we've already built get carried over, so the new store
+        doesn't need to look at the items again to index them. The text index
+        doesn't, since carrying it over means going through every posting of
+        every word, which would make every filter as slow as building a new
+        one. It gets built again if someone searches the new store.
+        '''
+        positions = list(positions)
+        items = self._items
+
+        if self.lazy:
+            new_store = ItemStore(
+                items.take(positions), self.indexers, self.text)
+        else:
+            new_store = ItemStore(
+                [items[i] for i in positions], self.indexers, self.text)
+
+        for name, column in self._columns.items():
+            new_store._columns[name] = [column[i] for i in positions]
+
+        return new_store
+
+    def without(self, positions):
+        ''' The opposite of take. Get everything but these positions. '''
+        unwanted = set(positions)
+
+        return self.take(
+            i for i in range(len(self._items)) if i not in unwanted)
+
+    def share(self):
+        ''' Get a new ItemStore with the same items, without copying them.
+
+        The new store only sees the items that are here right now, and gets
+        a list of its own the first time it's changed. This one can keep
+        appending while the new one is in use (even from another thread),
+        but anything else that changes it copies its list first. Built
+        columns get shared the same way.
+        '''
+        items = self._items
+
+        if not self.lazy:
+            items = _Prefix(items, len(items))
+            self._shared = True
+
+        new_store = ItemStore(items, self.indexers, self.text)
+
+        for name, column in self._columns.items():
+            new_store._columns[name] = _Prefix(column, len(column))
+
+        return new_store
+
+
+class _Prefix(collections.abc.Sequence):
+    ''' The first [length] things in a list, read-only. ItemStore.share puts
+    one of these under the new store.
+    '''
+    def __init__(self, items, length):
+        self.items = items
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return itertools.islice(self.items, self.length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.items[i] for i in range(*index.indices(self.length))]
+
+        if not -self.length <= index < self.length:
+            raise IndexError('_Prefix index out of range')
+
+        return self.items[index % self.length]
+
+    def take(self, positions):
+        return [self.items[i] for i in positions]
@@ -0,0 +1,133 @@
+"""
+Background jobs, for running something like "get_from aww all &" while you
+keep filtering and looking at the list.
+
+A job runs its command on its own thread, on its own copy of the shell (see
+URLToysClone.start_job). The copy has its own copy of the item list, its own
+undo history and its own output, so nothing the job does touches the list
+you're working on. Once it's finished, everything it added gets merged into
+the real list in one go, between two commands, so you never see half of it.
+
+Python can't kill threads, so killing a job just asks it to stop. Adding
+items and voting check for that after every item, and whatever was added
+before it stopped still gets merged.
+"""
+import io
+import threading
+import traceback
+import collections
+
+
+class Job(object):
+    def __init__(self, number, line):
+        self.number   = number
+        self.line     = line
+        self.output   = io.StringIO()
+        self.stop     = threading.Event()
+        self.finished = threading.Event()
+
+        # Everything the job's add_items added, in order. This is what gets
+        # merged into the real list.
+        self.added = []
+
+        # Something like '120/500 votes', for commands that aren't adding
+        # items. See status().
+        self.progress = None
+
+        self.error  = None
+        self.thread = None
+
+    def start(self, shell):
+        ''' Run self.line on shell, which should be a copy of the real shell
+        made for this job, in a new thread.
+        '''
+        def run():
+            try:
+                shell.onecmd(self.line)
+            except KeyboardInterrupt:
+                # add_items raises this when the job is killed.
+                pass
+            except Exception:
+                self.error = traceback.format_exc()
+            finally:
+                self.finished.set()
+
+        # Daemon threads, so exiting doesn't hang on a 10-minute fetch.
+        self.thread = threading.Thread(target=run, daemon=True,
+                                       name='job {}'.format(self.number))
+        self.thread.start()
+
+    def kill(self):
+        self.stop.set()
+
+    def wait(self, timeout=None):
+        ''' Wait for the job to finish. Returns whether it has. '''
+        return self.finished.wait(timeout)
+
+    @property
+    def state(self):
+        if not self.finished.is_set():
+            return 'Stopping' if self.stop.is_set() else 'Running'
+        elif self.error is not None:
+            return 'Failed'
+        elif self.stop.is_set():
+            return 'Killed'
+
+        return 'Done'
+
+    def status(self):
+        ''' A line for the jobs command, like:
+
+        [2] Running   get_from aww all  (+1200 items)
+        '''
+        progress = self.progress
+
+        if self.added or progress is None:
+            progress = '+{} items'.format(len(self.added))
+
+        return '[{}] {:<9} {}  ({})'.format(
+            self.number, self.state, self.line, progress)
+
+
+class Jobs(object):
+    ''' All the jobs that haven't been merged yet, by number. '''
+    def __init__(self):
+        self._jobs = collections.OrderedDict()
+        self._last_number = 0
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs.values()))
+
+    def new(self, line):
+        self._last_number += 1
+        job = Job(self._last_number, line)
+        self._jobs[job.number] = job
+
+        return job
+
+    def get(self, number=None):
+        ''' The job called [number], or the newest one if number is None.
+        Raises ValueError if there's no such job.
+        '''
+        if number is None:
+            if not self._jobs:
+                raise ValueError('There are no jobs.')
+
+            return next(reversed(self._jobs.values()))
+
+        try:
+            return self._jobs[int(number)]
+        except (KeyError, ValueError):
+            raise ValueError('No such job: {}'.format(number))
+
+    def pop_finished(self):
+        ''' Take every finished job out of the list, oldest first. '''
+        finished = [i for i in self._jobs.values() if i.finished.is_set()]
+
+        for job in finished:
+            del self._jobs[job.number]
+
+        return finished
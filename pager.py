@@ -0,0 +1,154 @@
+"""
+A pager for long listings, like less but built into PRAWToys.
+
+A Pager never holds the whole listing. It gets a length and a function that
+renders line number n, and only ever asks for the lines it's about to show.
+Showing a page of ls on a list with a million items costs the same as showing
+one on a list with a hundred.
+
+While paging, you can type:
+
+    <enter>, n   next page
+    p, b         previous page
+    g <n>        jump to item <n> (or line <n>, if there are no item numbers)
+    /<regex>     find the next line matching <regex>, ignoring case. Just /
+                 repeats the last search.
+    q            stop paging
+"""
+import re
+import bisect
+
+HELP = '<enter>/n: next, p: prev, g <n>: jump, /<regex>: find, q: quit'
+
+
+class Pager(object):
+    def __init__(self, length, get_line, rows, labels=None):
+        ''' length is how many lines there are, and get_line(n) renders line n.
+        rows is how many lines fit on a page.
+
+        labels, if given, is a sorted sequence of the number shown at the
+        start of each line (like the indicies printed by ls), so that "g 500"
+        can jump to item 500 instead of line 500.
+        '''
+        self.length = length
+        self.get_line = get_line
+        self.rows = max(rows, 1)
+        self.labels = labels
+        self.top = 0
+        self.last_search = None
+
+    def page(self):
+        ''' The lines that are on screen right now. '''
+        end = min(self.top + self.rows, self.length)
+        return [self.get_line(i) for i in range(self.top, end)]
+
+    def status(self):
+        end = min(self.top + self.rows, self.length)
+        return '-- lines {}-{} of {} ({}) -- '.format(
+            self.top + 1, end, self.length, HELP)
+
+    def at_end(self):
+        return self.top + self.rows >= self.length
+
+    # Navigation. {{{1
+    def go(self, line):
+        ''' Put line at the top of the screen, as far as that's possible. '''
+        last_page = max(self.length - self.rows, 0)
+        self.top = min(max(line, 0), last_page)
+
+    def next(self):
+        self.go(self.top + self.rows)
+
+    def prev(self):
+        self.go(self.top - self.rows)
+
+    def jump(self, label):
+        if self.labels is None:
+            self.go(label)
+        else:
+            self.go(bisect.bisect_left(self.labels, label))
+
+    def find(self, pattern=None):
+        ''' Move to the next line after the top one that matches pattern.
+        Returns False if nothing below matches, in which case nothing moves.
+
+        Lines are rendered one at a time while looking, so this only costs as
+        much as the distance to the match.
+        '''
+        if pattern:
+            self.last_search = re.compile(pattern, re.IGNORECASE)
+        elif self.last_search is None:
+            raise ValueError('Nothing to search for.')
+
+        for i in range(self.top + 1, self.length):
+            if self.last_search.search(self.get_line(i)):
+                # Don't use go here, or a match on the last page would end
+                # up somewhere in the middle of the screen.
+                self.top = i
+                return True
+
+        return False
+
+    def command(self, line):
+        ''' Do what the user typed. Returns False if they want to stop paging,
+        and otherwise a message to show them, or None.
+
+        Raises ValueError if it's not something we understand.
+        '''
+        line = line.strip()
+
+        if line in ['', 'n', ' ']:
+            if self.at_end():
+                return False
+
+            self.next()
+        elif line in ['p', 'b']:
+            self.prev()
+        elif line == 'q':
+            return False
+        elif line.startswith('g'):
+            try:
+                self.jump(int(line[1:]))
+            except ValueError:
+                raise ValueError('Expected g <number>, not: ' + line)
+        elif line.startswith('/'):
+            try:
+                found = self.find(line[1:])
+            except re.error as error:
+                raise ValueError('Bad regex: ' + str(error))
+
+            if not found:
+                return 'Pattern not found.'
+        else:
+            raise ValueError('Unknown pager command: ' + line)
+
+    def run(self, write, read):
+        ''' Page through the listing until the user quits or goes past the end.
+
+        write(lines) shows a list of lines, and read(prompt) gets what the
+        user typed, or None when there's no more input.
+        '''
+        message = None
+
+        while True:
+            write(self.page())
+
+            if message:
+                write([message])
+
+            if self.at_end() and self.top == 0:
+                # It all fit on one page, so there's nothing to page through.
+                return
+
+            line = read(self.status())
+
+            if line is None:
+                return
+
+            try:
+                message = self.command(line)
+            except ValueError as error:
+                message = str(error)
+
+            if message is False:
+                return
@@ -1,10 +1,28 @@
+import heapq
+import asyncio
+import json
+import queue
+import zlib
+import urllib.parse
+import collections
+import itertools
+import threading
+import time
+import concurrent.futures
+
 import praw
+import praw.handlers
 import ahto_lib
 
 # When displaying comments/submissions, how many characters should we show?
 # I.E. how many characters wide should we assume the user's terminal window is?
 ASSUMED_CONSOLE_WIDTH = 80
 
+# How many requests should we have in flight at once? Reddit doesn't care how
+# many connections we open, only how many requests we make per minute, and
+# RateLimiter takes care of that part.
+WORKERS = 4
+
 
 def check_praw_version(min_version):
     ''' Checks if the current praw version is at least min_version.
@@ -36,11 +54,80 @@ def check_praw_version(min_version):
 
 
 def is_comment(submission):
-    return isinstance(submission, praw.objects.Comment)
+    return (isinstance(submission, praw.objects.Comment)
+            or (isinstance(submission, CompactItem)
+                and submission.kind == 'comment'))
 
 
 def is_submission(submission):
-    return isinstance(submission, praw.objects.Submission)
+    return (isinstance(submission, praw.objects.Submission)
+            or (isinstance(submission, CompactItem)
+                and submission.kind == 'submission'))
+
+
+def kind(item):
+    ''' 'submission', 'comment' or None if item is neither '''
+    if is_submission(item):
+        return 'submission'
+    elif is_comment(item):
+        return 'comment'
+
+
+def subreddit_name(item):
+    ''' The lowercase name of item's subreddit, like 'aww' '''
+    return item.subreddit.display_name.lower()
+
+
+def author_name(item):
+    ''' The lowercase name of item's author, or None if it was deleted '''
+    author = getattr(item, 'author', None)
+
+    if author is None:
+        return None
+
+    return author.name.lower()
+
+
+def item_title(item):
+    ''' A submission's title, or None for comments. '''
+    return None if is_comment(item) else item.title
+
+
+def item_body(item):
+    ''' A comment's text or a submission's selftext (which is '' for links).
+    '''
+    if is_comment(item):
+        return str(item)
+
+    return getattr(item, 'selftext', None)
+
+
+def item_text(item):
+    ''' Everything searchable about an item: a submission's title and
+    selftext, or a comment's text.
+    '''
+    if is_comment(item):
+        return str(item)
+
+    return '\n'.join(filter(None, [item.title, item_body(item)]))
+
+# PRAWToys indexes its items with these, so filters like sub and sfw can look
+# up matching items instead of checking every single one. See item_store.py.
+# Comments don't have a meaningful over_18 or is_self, so they're filed under
+# None. score and created_utc aren't much use as indexes, but aggregate.py
+# uses their columns.
+ITEM_INDEXERS = {
+    'subreddit':   subreddit_name,
+    'kind':        kind,
+    'author':      author_name,
+    'over_18':     lambda i: None if is_comment(i) else bool(i.over_18),
+    'is_self':     lambda i: None if is_comment(i) else bool(i.is_self),
+    'score':       lambda i: getattr(i, 'score', None),
+    'created_utc': lambda i: getattr(i, 'created_utc', None),
+}
+
+
+_ESCAPES = str.maketrans({'\n': '\\n', '\t': '\\t', '\r': '\\r'})
 
 
 def comment_str(comment: praw.objects.Comment,
@@ -99,9 +186,7 @@ def comment_str(comment: praw.objects.Comment,
 
     # Actually printing these characters would result in very messy output, so
     # replace them with something a little more readable.
-    comment_text = comment_text.replace('\n', '\\n')
-    comment_text = comment_text.replace('\t', '\\t')
-    comment_text = comment_text.replace('\r', '\\r')
+    comment_text = comment_text.translate(_ESCAPES)
 
     comment_text = ahto_lib.shorten_string(comment_text, max_comment_width)
     return comment_text + subreddit_indicator
@@ -127,6 +212,35 @@ def submission_str(submission: praw.objects.Submission,
     return title + subreddit_indicator
 
 
+# praw_object_to_string keeps what it rendered in here, on the item itself, so
+# it goes away along with the item. CompactItems have a slot for it.
+_RENDERED = '_prawtoys_rendered'
+
+
+def _get_rendered(item):
+    if isinstance(item, CompactItem):
+        return item._rendered
+
+    # Going through vars() means praw's __getattr__ never gets asked for it,
+    # which would mean a request.
+    try:
+        return vars(item).get(_RENDERED)
+    except TypeError:
+        return None
+
+
+def _set_rendered(item, rendered):
+    if isinstance(item, CompactItem):
+        item._rendered = rendered
+        return
+
+    try:
+        vars(item)[_RENDERED] = rendered
+    except TypeError:
+        # No __dict__, so nowhere to keep it.
+        pass
+
+
 def praw_object_to_string(praw_object, characters_needed=0):
     ''' only works on submissions and comments
 
@@ -134,11 +248,26 @@ def praw_object_to_string(praw_object, characters_needed=0):
     This might not actually matter now that we're using Python 3.
 
     See comment_str for an explanation of how characters_needed works.
+
+    The result is remembered on the item, so running ls over the same items
+    again doesn't have to shorten every title all over again. Changing
+    ASSUMED_CONSOLE_WIDTH gets you fresh ones.
     '''
+    key = (characters_needed, ASSUMED_CONSOLE_WIDTH)
+    cached = _get_rendered(praw_object)
+
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
     if is_submission(praw_object):
-        return submission_str(praw_object, characters_needed)
+        string = submission_str(praw_object, characters_needed)
     elif is_comment(praw_object):
-        return comment_str(praw_object, characters_needed)
+        string = comment_str(praw_object, characters_needed)
+    else:
+        return None
+
+    _set_rendered(praw_object, (key, string))
+    return string
 
 
 def praw_object_url(praw_object):
@@ -146,7 +275,1534 @@ def praw_object_url(praw_object):
     if is_submission(praw_object):
         return praw_object.short_link
     elif is_comment(praw_object):
-        return praw_object.permalink + '?context=824545201'
+        return comment_permalink(praw_object) + '?context=824545201'
     else:
         raise ValueError(
             "praw_object_url only handles submissions and comments")
+
+
+def comment_permalink(comment):
+    ''' Like comment.permalink, but without any network requests.
+
+    praw's Comment.permalink is built from the comment's submission, and if
+    the comment didn't come from a thread, praw fetches the whole thread just
+    to get it. Every comment knows its submission's id, though, and that's all
+    a permalink really needs.
+    '''
+    link_id = getattr(comment, 'link_id', None)
+
+    if link_id is None:
+        return comment.permalink
+
+    return 'https://www.reddit.com/comments/{}/_/{}'.format(
+        link_id.split('_', 1)[1], comment.id)
+
+
+class CompactSubreddit(object):
+    ''' Just enough of a praw.objects.Subreddit for PRAWToys to use. '''
+    __slots__ = ('display_name',)
+
+    def __init__(self, display_name):
+        self.display_name = display_name
+
+
+class CompactRedditor(object):
+    ''' Just enough of a praw.objects.Redditor for PRAWToys to use. '''
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+# There are a lot fewer subreddits and users than there are items, so every
+# CompactItem from the same subreddit shares one CompactSubreddit.
+_compact_subreddits = {}
+_compact_redditors  = {}
+
+
+def _intern(cache, cls, name):
+    try:
+        return cache[name]
+    except KeyError:
+        cache[name] = cls(name)
+        return cache[name]
+
+
+class CompactItem(object):
+    ''' A small, read-only copy of a comment or submission.
+
+    A praw object holds on to reddit's whole JSON response and a reference to
+    the session, which adds up to a few KB per item. A CompactItem only keeps
+    the fields PRAWToys actually uses, and has the same attribute names as
+    the praw objects, so the rest of the code doesn't have to care which one
+    it's looking at. Use compact() to make one, and rehydrate() to get the
+    full praw object back when you need to do something like vote.
+    '''
+    FIELDS = ('kind', 'id', 'subreddit', 'author', 'title', 'body',
+              'over_18', 'is_self', 'permalink', 'short_link', 'score',
+              'created_utc')
+
+    # _rendered is praw_object_to_string's, and isn't saved anywhere.
+    __slots__ = FIELDS + ('_rendered',)
+
+    def __init__(self, kind, id, subreddit, author=None, title=None,
+                 body=None, over_18=None, is_self=None, permalink=None,
+                 short_link=None, score=None, created_utc=None):
+        ''' subreddit and author are names, like 'aww' and 'spez'. '''
+        self.kind        = kind
+        self.id          = id
+        self.title       = title
+        self.body        = body
+        self.over_18     = over_18
+        self.is_self     = is_self
+        self.permalink   = permalink
+        self.short_link  = short_link
+        self.score       = score
+        self.created_utc = created_utc
+        self._rendered   = None
+
+        self.subreddit = _intern(
+            _compact_subreddits, CompactSubreddit, subreddit)
+
+        if author is None:
+            self.author = None
+        else:
+            self.author = _intern(_compact_redditors, CompactRedditor, author)
+
+    @property
+    def fullname(self):
+        if self.id is None:
+            return None
+
+        prefix = 't1_' if self.kind == 'comment' else 't3_'
+        return prefix + self.id
+
+    def __str__(self):
+        # The same thing str() gives you for the praw objects.
+        if self.kind == 'comment':
+            return self.body
+
+        return '{} :: {}'.format(self.score, self.title)
+
+    def __repr__(self):
+        return '<CompactItem {}>'.format(self.fullname)
+
+    def to_dict(self):
+        ''' Get a JSON-friendly dict that from_dict can turn back into a
+        CompactItem.
+        '''
+        d = {i: getattr(self, i) for i in self.FIELDS}
+        d['subreddit'] = self.subreddit.display_name
+        d['author'] = self.author.name if self.author is not None else None
+
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        ''' Anything missing from d except kind and subreddit is None. '''
+        d = dict(d)
+        return cls(d.pop('kind'), d.pop('id', None), d.pop('subreddit'), **d)
+
+
+def compact(item):
+    ''' Make a CompactItem out of a comment or submission.
+
+    If item is already a CompactItem, you just get it back.
+    '''
+    if isinstance(item, CompactItem):
+        return item
+
+    author = getattr(item, 'author', None)
+
+    fields = dict(
+        id=getattr(item, 'id', None),
+        subreddit=item.subreddit.display_name,
+        author=author.name if author is not None else None,
+        score=getattr(item, 'score', None),
+        created_utc=getattr(item, 'created_utc', None))
+
+    if is_comment(item):
+        return CompactItem(
+            'comment', body=str(item), permalink=comment_permalink(item),
+            **fields)
+    else:
+        return CompactItem(
+            'submission', title=item.title, over_18=item.over_18,
+            is_self=item.is_self, short_link=item.short_link, **fields)
+
+
+def json_to_compact(thing):
+    ''' Make a CompactItem straight out of reddit's JSON for a comment or
+    submission, like {'kind': 't3', 'data': {...}}, without making a praw
+    object first.
+    '''
+    data = thing['data']
+    author = data.get('author')
+
+    fields = dict(
+        id=data['id'],
+        subreddit=data['subreddit'],
+        # praw turns deleted authors into None, so we do too.
+        author=None if author in [None, '[deleted]'] else author,
+        score=data.get('score'),
+        created_utc=data.get('created_utc'))
+
+    if thing['kind'] == 't1':
+        return CompactItem(
+            'comment', body=data['body'],
+            permalink='https://www.reddit.com/comments/{}/_/{}'.format(
+                data['link_id'].split('_', 1)[1], data['id']),
+            **fields)
+    else:
+        return CompactItem(
+            'submission', title=data['title'], over_18=data.get('over_18'),
+            is_self=data.get('is_self'),
+            short_link='https://redd.it/' + data['id'], **fields)
+
+
+# Offline fields. {{{1
+# Everything the filters, indexes and renderers read off a comment or
+# submission. praw fills these in from the listing JSON, but if one of them is
+# missing, just reading it makes praw fetch the whole object, which blocks on a
+# request. A filter over a few thousand items like that is a few thousand
+# hidden requests. pin_offline_fields makes sure that can't happen.
+#
+# subreddit.display_name and author.name aren't here because praw always
+# makes those objects with their names.
+OFFLINE_FIELDS = {
+    'submission': ['id', 'title', 'selftext', 'subreddit', 'author',
+                   'over_18', 'is_self', 'score', 'created_utc', 'url'],
+    'comment':    ['id', 'body', 'subreddit', 'author', 'score',
+                   'created_utc', 'link_id'],
+}
+
+
+def pin_offline_fields(item):
+    ''' Make sure reading any of OFFLINE_FIELDS off item won't make a
+    request, by setting the ones reddit didn't send us to None. Returns the
+    names of the fields that had to be filled in.
+    '''
+    missing = []
+
+    if isinstance(item, CompactItem):
+        return missing
+
+    stored = vars(item)
+
+    for field in OFFLINE_FIELDS.get(kind(item), []):
+        # Properties (like short_link) are worked out locally, so leave those
+        # alone.
+        if field not in stored and not hasattr(type(item), field):
+            stored[field] = None
+            missing.append(field)
+
+    return missing
+
+
+# (class name, attribute) -> how many times reading it made praw fetch the
+# object. Only counted while watch_lazy_fetches is on.
+lazy_fetches = collections.Counter()
+_lazy_fetches_lock = threading.Lock()
+_original_getattr = None
+
+
+def watch_lazy_fetches(on=True):
+    ''' Start (or stop) counting lazy fetches in lazy_fetches.
+
+    praw only goes to the network for a missing attribute from inside
+    RedditContentObject.__getattr__, and only if the object hasn't been
+    fetched yet, so that's where we listen.
+    '''
+    global _original_getattr
+
+    base = praw.objects.RedditContentObject
+
+    if on and _original_getattr is None:
+        _original_getattr = original = base.__getattr__
+
+        def __getattr__(self, attr):
+            # Roughly the check praw does before fetching.
+            if (not attr.startswith('__')
+                    and not vars(self).get('_has_fetched', True)):
+                with _lazy_fetches_lock:
+                    lazy_fetches[type(self).__name__, attr] += 1
+
+            return original(self, attr)
+
+        base.__getattr__ = __getattr__
+    elif not on and _original_getattr is not None:
+        base.__getattr__ = _original_getattr
+        _original_getattr = None
+
+
+def take_lazy_fetches():
+    ''' Get lazy_fetches and start counting again from zero. '''
+    with _lazy_fetches_lock:
+        counts = lazy_fetches.copy()
+        lazy_fetches.clear()
+
+    return counts
+
+
+# How many things reddit's /api/info will look up in one request.
+INFO_BATCH_SIZE = 100
+
+
+def is_fullname(thing_id):
+    ''' Is this a fullname like 't3_5abcde', as opposed to a bare id? '''
+    return (len(thing_id) > 3 and thing_id[0] == 't'
+            and thing_id[1].isdigit() and thing_id[2] == '_')
+
+
+def to_base36(n):
+    ''' Turn a number into a reddit id. to_base36(1337) == '115' '''
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    s = ''
+
+    while True:
+        n, digit = divmod(n, 36)
+        s = digits[digit] + s
+
+        if n == 0:
+            return s
+
+
+def hydrate(reddit_session, thing_ids, missing=None, workers=None):
+    ''' Look up comments and submissions by id and yield them in order.
+
+    thing_ids can be fullnames ('t1_d9xyz12', 't3_5abcde') or bare ids. Bare
+    ids are tried as submissions first, and then as comments.
+
+    Ids are looked up INFO_BATCH_SIZE at a time, with several batches in
+    flight at once (see fetch_all), and items are yielded as soon as their
+    batch comes back. If missing is a list, every id reddit couldn't find
+    gets appended to it.
+    '''
+    thing_ids = [i.strip() for i in thing_ids]
+    fullnames = [i if is_fullname(i) else 't3_' + i for i in thing_ids]
+
+    def source(batch):
+        def get_items():
+            # Reddit doesn't promise to keep the order we asked for.
+            found = {i.fullname: i
+                     for i in reddit_session.get_info(thing_id=batch) or []}
+            return [found[i] for i in batch if i in found]
+
+        return get_items
+
+    def lookup(fullnames):
+        ''' Yield what we found, and return the fullnames we didn't. '''
+        batches = [fullnames[i:i + INFO_BATCH_SIZE]
+                   for i in range(0, len(fullnames), INFO_BATCH_SIZE)]
+        found = set()
+
+        for item in fetch_all([source(i) for i in batches], workers):
+            found.add(item.fullname)
+            yield item
+
+        return [i for i in fullnames if i not in found]
+
+    not_found = yield from lookup(fullnames)
+
+    # Maybe the bare ids that weren't submissions were comments.
+    bare = {'t3_' + i for i in thing_ids if not is_fullname(i)}
+    retry = ['t1_' + i[3:] for i in not_found if i in bare]
+    not_found = [i for i in not_found if i not in bare]
+
+    if retry:
+        not_found += [i[3:] for i in (yield from lookup(retry))]
+
+    if missing is not None:
+        missing += not_found
+
+
+def rehydrate(items, reddit_session):
+    ''' Swap every CompactItem in items for the full praw object.
+
+    The praw objects are fetched with hydrate(). Anything that isn't a
+    CompactItem is left alone. So is anything reddit couldn't find, like
+    deleted posts.
+    '''
+    items = list(items)
+    fullnames = [i.fullname for i in items if isinstance(i, CompactItem)]
+    found = {i.fullname: i for i in hydrate(reddit_session, fullnames)}
+
+    return [found.get(i.fullname, i) if isinstance(i, CompactItem) else i
+            for i in items]
+
+
+# How many comment ids we ask /api/morechildren to expand in one request.
+MORECHILDREN_BATCH_SIZE = 100
+
+
+def _parents_first(things, name_of, parent_of):
+    ''' Yield things (one round of a thread) so that every comment comes
+    after its parent, if its parent is in there too. Otherwise the order is
+    kept. name_of(thing) should be None for anything that can't be a parent.
+
+    A "load more comments" link's ids get split over several requests, which
+    run at once, and reddit doesn't promise what order the comments in each
+    one come in, so a reply can easily turn up before its parent does.
+    '''
+    things = list(things)
+    names = {name_of(i) for i in things}
+    done = set()
+
+    # parent's fullname -> its replies that turned up before it did.
+    waiting = collections.defaultdict(list)
+
+    for thing in things:
+        if parent_of(thing) in names and parent_of(thing) not in done:
+            waiting[parent_of(thing)].append(thing)
+            continue
+
+        stack = [thing]
+
+        while stack:
+            thing = stack.pop()
+            done.add(name_of(thing))
+            yield thing
+
+            stack += reversed(waiting.pop(name_of(thing), []))
+
+
+def fetch_thread(reddit_session, submission_id, limit=None, workers=None):
+    ''' Yield the comments in a thread, following "load more comments" links
+    until there are limit of them (or the thread runs out, if limit is None).
+
+    The first few hundred comments come with the submission. After that, the
+    MoreComments links are expanded in rounds. Each round takes the most
+    promising links (the shallowest ones first, then the ones under the
+    highest-scoring parent comment), packs their comment ids into
+    /api/morechildren requests of MORECHILDREN_BATCH_SIZE, and sends them
+    through fetch_all, [workers] at a time. So a 20,000 comment thread only takes
+    a couple hundred requests, a few at a time.
+
+    Parents always come before their replies (see _parents_first), but
+    otherwise comments are yielded in the order they were found, not the
+    order reddit shows them.
+    '''
+    workers = workers or WORKERS
+    submission = reddit_session.get_submission(submission_id=submission_id)
+
+    # fullname -> how deep in the thread it is. Top-level comments are 0.
+    depths = {submission.fullname: -1}
+    scores = {}
+    seen = set()
+
+    # A heap of (depth, -parent's score, -how many comments it hides,
+    #            tie breaker, MoreComments)
+    pending = []
+    tie_breaker = itertools.count()
+
+    def add(thing):
+        ''' Queue up thing if it's a MoreComments. Returns True if it's a
+        comment we haven't seen yet.
+        '''
+        depth = depths.get(thing.parent_id, -1) + 1
+
+        if isinstance(thing, praw.objects.MoreComments):
+            heapq.heappush(pending, (
+                depth, -scores.get(thing.parent_id, 0), -thing.count,
+                next(tie_breaker), thing))
+            return False
+
+        if thing.fullname in seen:
+            return False
+
+        seen.add(thing.fullname)
+        depths[thing.fullname] = depth
+        scores[thing.fullname] = thing.score
+        return True
+
+    def expand(children):
+        def get_items():
+            data = {'children': ','.join(children),
+                    'link_id': submission.fullname,
+                    'r': str(submission.subreddit)}
+            response = reddit_session.request_json(
+                reddit_session.config['morechildren'], data=data)
+
+            things = response['data']['things']
+            for thing in things:
+                thing._update_submission(submission)
+
+            return things
+
+        return get_items
+
+    def continue_thread(more):
+        # "Continue this thread" links don't have any ids to expand, so praw
+        # loads the parent comment's page instead.
+        return lambda: praw.helpers.flatten_tree(
+            more.comments(update=True) or [])
+
+    def next_round():
+        sources = []
+        children = []
+
+        while pending and len(sources) < workers:
+            more = heapq.heappop(pending)[-1]
+
+            if more.count == 0:
+                sources.append(continue_thread(more))
+                continue
+
+            children += [i for i in more.children if 't1_' + i not in seen]
+
+            while len(children) >= MORECHILDREN_BATCH_SIZE:
+                sources.append(expand(children[:MORECHILDREN_BATCH_SIZE]))
+                children = children[MORECHILDREN_BATCH_SIZE:]
+
+        if children:
+            sources.append(expand(children))
+
+        return sources
+
+    things = praw.helpers.flatten_tree(submission.comments)
+    count = 0
+
+    while True:
+        for thing in things:
+            if add(thing):
+                yield thing
+                count += 1
+
+                if limit is not None and count >= limit:
+                    return
+
+        if not pending:
+            return
+
+        things = _parents_first(
+            fetch_all(next_round(), workers),
+            lambda i: None if isinstance(i, praw.objects.MoreComments)
+            else i.fullname,
+            lambda i: i.parent_id)
+
+
+class RateLimiter(object):
+    ''' A thread-safe token bucket that keeps us inside reddit's rate limit.
+
+    Every request should call acquire() first, which blocks until we're
+    allowed to make another request. Coroutines await acquire_async()
+    instead, so one bucket can pace threads and the event loop (see
+    AsyncReddit) together. Until reddit tells us otherwise, we allow [rate]
+    requests per second with bursts of up to [burst] requests.
+
+    Reddit sends X-Ratelimit-Remaining and X-Ratelimit-Reset headers with
+    every response. Pass those to update() and we'll spread whatever is left
+    of the budget evenly over the time until it resets, instead of guessing.
+    '''
+    def __init__(self, rate=1.0, burst=10):
+        self.rate  = rate
+        self.burst = burst
+
+        self.tokens      = burst
+        self.last_refill = time.monotonic()
+        self.lock        = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _take(self):
+        ''' Take a token and return how long to wait before using it. '''
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            # Take the token now, even if it's one we don't have yet. That way
+            # threads queue up behind each other instead of all waking up at
+            # the same moment.
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        ''' Block until we're allowed to make one more request. '''
+        delay = self._take()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        ''' acquire(), without blocking the event loop. '''
+        delay = self._take()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, headers):
+        ''' Adjust our rate based on reddit's X-Ratelimit-* headers. '''
+        try:
+            remaining = float(headers['x-ratelimit-remaining'])
+            reset     = float(headers['x-ratelimit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self.lock:
+            self._refill(time.monotonic())
+
+            # Never let the rate hit zero, or acquire() would divide by it.
+            self.rate   = max(remaining, 1) / max(reset, 1)
+            self.tokens = min(self.tokens, remaining)
+
+
+class ConcurrentHandler(praw.handlers.RateLimitHandler):
+    ''' A praw handler that lets several threads make requests at once.
+
+    praw's own handlers hold a lock for the whole length of each request, so
+    no matter how many threads you throw at them, only one request is ever in
+    flight. This one leaves the pacing to a RateLimiter instead, so requests
+    can overlap while still staying inside reddit's rate limit.
+
+    If observer is set, it's called after every request with how long the
+    request took (not counting time spent waiting on the rate limit) and how
+    many bytes came back. profiling.Profiler.request_done fits.
+    '''
+    def __init__(self, limiter=None):
+        super(ConcurrentHandler, self).__init__()
+        self.limiter  = limiter or RateLimiter()
+        self.observer = None
+
+    def request(self, request, proxies, timeout, verify, **_):
+        # praw also passes _rate_domain, _rate_delay and some caching
+        # arguments. We handle rate limiting ourselves and don't cache, so
+        # they all go in _.
+        self.limiter.acquire()
+
+        settings = self.http.merge_environment_settings(
+            request.url, proxies, False, verify, None)
+
+        start = time.perf_counter()
+        response = self.http.send(
+            request, timeout=timeout, allow_redirects=False, **settings)
+
+        self.limiter.update(response.headers)
+
+        observer = self.observer
+
+        if observer is not None:
+            observer(time.perf_counter() - start, len(response.content))
+
+        return response
+
+
+class _PerThread(object):
+    ''' An attribute that every thread gets its own value of.
+
+    praw 3 keeps some state for the length of a single call on the Reddit
+    object itself: request_json sets _request_url for the JSON decoder to
+    read and then deletes it, and _use_oauth gets switched on and back off
+    around requests that need it. With one session shared by fetch_all's
+    workers, one thread deletes the _request_url another is about to read.
+    Making those attributes per-thread fixes that without taking a lock, so
+    the requests (and the decoding) still overlap.
+    '''
+    _MISSING = object()
+
+    def __init__(self, name, default=_MISSING):
+        self.name = name
+        self.default = default
+
+    def _local(self, obj):
+        # setdefault, so two threads can't both make one.
+        return obj.__dict__.setdefault(
+            '_prawtoys_per_thread', threading.local())
+
+    def __get__(self, obj, type_=None):
+        if obj is None:
+            return self
+
+        value = getattr(self._local(obj), self.name, self.default)
+
+        if value is self._MISSING:
+            raise AttributeError(self.name)
+
+        return value
+
+    def __set__(self, obj, value):
+        setattr(self._local(obj), self.name, value)
+
+    def __delete__(self, obj):
+        try:
+            delattr(self._local(obj), self.name)
+        except AttributeError:
+            raise AttributeError(self.name)
+
+
+praw.BaseReddit._request_url = _PerThread('_request_url')
+praw.BaseReddit._use_oauth = _PerThread('_use_oauth', False)
+
+
+class _FetchFailed(object):
+    ''' fetch_all puts one of these in a queue when a source raises. '''
+    def __init__(self, error):
+        self.error = error
+
+
+def fetch_all(sources, workers=None):
+    ''' Fetch several listings at once and yield all of their items.
+
+    sources is a list of functions that each return an iterable of items,
+    usually a praw listing generator. They run on a pool of worker threads,
+    which can all use the same praw session (see _PerThread) and share its
+    RateLimiter, but the items come out in the same order as sources. That
+    way the same command always gives you the same list, no matter which
+    request happened to finish first.
+
+    Items from the first source are yielded as soon as they arrive. Later
+    sources are buffered until it's their turn. If you stop iterating early
+    (or close() the generator) the workers stop after their current request.
+    '''
+    stop = threading.Event()
+    done = object()
+    queues = [queue.Queue() for source in sources]
+
+    def fetch(source, results):
+        try:
+            if stop.is_set():
+                return
+
+            for item in source():
+                results.put(item)
+
+                if stop.is_set():
+                    return
+        except Exception as error:
+            results.put(_FetchFailed(error))
+        finally:
+            results.put(done)
+
+    pool = concurrent.futures.ThreadPoolExecutor(workers or WORKERS)
+
+    try:
+        for source, results in zip(sources, queues):
+            pool.submit(fetch, source, results)
+
+        for results in queues:
+            while True:
+                # A timeout keeps ctrl-c working on Windows, where a blocking
+                # get() can't be interrupted.
+                try:
+                    item = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                if item is done:
+                    break
+                elif isinstance(item, _FetchFailed):
+                    raise item.error
+
+                yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False)
+
+
+class VoteReport(object):
+    ''' What happened when we voted on a list of items.
+
+    succeeded is a list of indicies into the original list. failed is a list
+    of (index, exception) tuples.
+    '''
+    def __init__(self, total):
+        self.total     = total
+        self.succeeded = []
+        self.failed    = []
+
+    def summary(self):
+        summary = '{} succeeded, {} failed, {} total'.format(
+            len(self.succeeded), len(self.failed), self.total)
+        not_sent = self.total - len(self.succeeded) - len(self.failed)
+
+        if not_sent:
+            summary += ', {} not sent'.format(not_sent)
+
+        return summary
+
+
+def vote_all(items, vote, workers=None, progress=None, stop=None):
+    ''' Vote on every item in items using a pool of worker threads.
+
+    vote is either the name of a method to call on each item (like 'upvote'
+    or 'clear_vote') or a function that takes an item. progress, if given, is
+    called as progress(done, total) every time an item finishes. stop is an
+    optional threading.Event. Once it's set, or on a ctrl-c, votes that
+    haven't been sent yet are dropped. Whatever was already being sent gets
+    waited for, and the report covers everything that was sent.
+
+    Returns a VoteReport. Exceptions from individual items are recorded in
+    the report instead of being raised, so one deleted comment doesn't stop
+    the whole run.
+    '''
+    if isinstance(vote, str):
+        method_name = vote
+        vote = lambda item: getattr(item, method_name)()
+
+    items   = list(items)
+    report  = VoteReport(len(items))
+    workers = workers or WORKERS
+
+    # Only a couple of votes per worker are queued up at a time. If they were
+    # all submitted at once, a ctrl-c would still have to wait for every last
+    # one of them to be sent.
+    queue_size = 2 * workers
+    queued     = iter(enumerate(items))
+    pending    = {}
+    done       = 0
+
+    def record(future):
+        index = pending.pop(future)
+        error = future.exception()
+
+        if error is None:
+            report.succeeded.append(index)
+        else:
+            report.failed.append((index, error))
+
+    pool = concurrent.futures.ThreadPoolExecutor(workers)
+
+    try:
+        while True:
+            for index, item in itertools.islice(
+                    queued, queue_size - len(pending)):
+                pending[pool.submit(vote, item)] = index
+
+            if not pending:
+                break
+
+            finished, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in finished:
+                record(future)
+                done += 1
+
+                if progress is not None:
+                    progress(done, report.total)
+
+            if stop is not None and stop.is_set():
+                break
+    except KeyboardInterrupt:
+        # Stop sending votes, but still say what happened to the ones that
+        # were sent.
+        pass
+    finally:
+        # Votes that are already being sent can't be called back, but
+        # anything still queued is dropped.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # wait() never counts a future that shutdown() cancelled as done, so
+    # those have to go first.
+    for future in [i for i in pending if i.cancelled()]:
+        del pending[future]
+
+    for future in concurrent.futures.wait(pending)[0]:
+        record(future)
+
+    report.succeeded.sort()
+    report.failed.sort(key=lambda i: i[0])
+    return report
+
+
+# asyncio. {{{1
+# How many times AsyncReddit retries a request that got a 429.
+ASYNC_RETRIES = 3
+
+# How long to wait before retrying a 429 that didn't say how long to wait.
+# This doubles with every retry.
+ASYNC_BACKOFF = 2.0
+
+# How many redirects AsyncReddit follows for one request.
+ASYNC_REDIRECTS = 5
+
+
+class HTTPStatusError(Exception):
+    ''' AsyncReddit got a response it can't use, like a 404, or a redirect
+    it won't follow (in which case location is where it pointed).
+    '''
+    def __init__(self, status, url, location=None):
+        message = 'HTTP {} from {}'.format(status, url)
+
+        if location is not None:
+            message += ', redirecting to ' + location
+
+        super(HTTPStatusError, self).__init__(message)
+        self.status = status
+        self.url = url
+        self.location = location
+
+
+def _retry_delay(headers, attempt):
+    ''' How long to wait before retrying a request that got a 429, given
+    the response headers and how many retries came before this one.
+    '''
+    try:
+        return max(float(headers['retry-after']), 0)
+    except (KeyError, ValueError):
+        pass
+
+    # If reddit sent its X-Ratelimit-* headers, the limiter now knows we're
+    # out of requests, and the next acquire_async() waits for the reset.
+    if 'x-ratelimit-reset' in headers:
+        return 0
+
+    # Otherwise we'd just fire off the same request straight away, and most
+    # likely get another 429 for it.
+    return ASYNC_BACKOFF * 2 ** attempt
+
+
+async def _read_response(reader):
+    ''' Read one HTTP/1.1 response from reader. Returns (status, headers,
+    body, keep_alive). Header names are lowercase.
+    '''
+    status_line = await reader.readline()
+
+    if not status_line:
+        raise ConnectionResetError('The server closed the connection.')
+
+    version, status = status_line.split()[:2]
+    headers = {}
+
+    while True:
+        line = await reader.readline()
+
+        if line in [b'\r\n', b'\n', b'']:
+            break
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = (version == b'HTTP/1.1'
+                  and headers.get('connection', '').lower() != 'close')
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+
+            if size == 0:
+                # Skip any trailers.
+                while (await reader.readline()) not in [b'\r\n', b'\n', b'']:
+                    pass
+
+                break
+
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        # The body goes until the connection closes.
+        body = await reader.read()
+        keep_alive = False
+
+    if headers.get('content-encoding', '').lower() == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+    return int(status), headers, body, keep_alive
+
+
+class ConnectionPool(object):
+    ''' Keep-alive connections for AsyncReddit.
+
+    At most [size] requests (WORKERS by default) have a connection at once.
+    When a request is done with its connection, the next request to the same
+    host gets it, instead of opening a new one (and doing a new TLS
+    handshake). Only use a pool from one event loop.
+    '''
+    def __init__(self, size=None):
+        self.size = size
+
+        # How many connections have been opened, ever.
+        self.opened = 0
+
+        self._idle = collections.defaultdict(list)
+        self._in_use = 0
+        self._waiters = collections.deque()
+
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def get(self, scheme, host, port):
+        ''' Get a connection. Returns (reader, writer, reused). Give it back
+        with put() when you're done, whatever happens.
+        '''
+        while self._in_use >= (self.size or WORKERS):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # If we got woken up just before being cancelled, wake up
+                # someone else instead.
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+
+                raise
+
+        self._in_use += 1
+        idle = self._idle[scheme, host, port]
+
+        while idle:
+            reader, writer = idle.pop()
+
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+
+            writer.close()
+
+        try:
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=True if scheme == 'https' else None)
+        except BaseException:
+            self.put(scheme, host, port, None, False)
+            raise
+
+        self.opened += 1
+        return reader, writer, False
+
+    def put(self, scheme, host, port, connection, reusable):
+        ''' connection is (reader, writer). If it isn't reusable (or is
+        None), it gets closed.
+        '''
+        if connection is not None:
+            if reusable:
+                self._idle[scheme, host, port].append(connection)
+            else:
+                connection[1].close()
+
+        self._in_use -= 1
+        self._wake()
+
+    def close(self):
+        for connections in self._idle.values():
+            for reader, writer in connections:
+                writer.close()
+
+        self._idle.clear()
+
+
+class AsyncReddit(object):
+    ''' reddit's API on an asyncio event loop.
+
+    Requests go over a ConnectionPool, with HTTP keep-alive, and are paced by
+    a RateLimiter that reads reddit's X-Ratelimit-* headers. If you pass a
+    praw session whose handler is a ConcurrentHandler, its RateLimiter is
+    shared, so praw's requests and ours come out of the same budget. The
+    session's login is used too, whatever it is at the time of each request.
+
+    Comments and submissions come back as CompactItems, made straight from
+    reddit's JSON. Nothing here makes praw objects, which is a lot of the
+    time a big listing takes. EventLoopThread lets code that isn't async use
+    all of this.
+    '''
+    USER_AGENT = 'PRAWToys'
+
+    def __init__(self, reddit_session=None, base_url=None, limiter=None,
+                 connections=None):
+        ''' base_url is where requests go, like a fake_reddit.FakeReddit's
+        url. By default it's reddit, with or without OAuth depending on how
+        reddit_session is logged in. connections is the most requests to
+        have in flight at once (WORKERS by default).
+        '''
+        handler = getattr(reddit_session, 'handler', None)
+
+        self.reddit_session = reddit_session
+        self.base_url = base_url
+        self.limiter = (limiter or getattr(handler, 'limiter', None)
+                        or RateLimiter())
+        self.pool = ConnectionPool(connections)
+
+        # Called after every request with how long it took (not counting the
+        # rate limit) and how many bytes came back, like
+        # ConcurrentHandler.observer.
+        self.observer = None
+
+    def _login(self):
+        ''' (base URL, headers, modhash) for reddit_session's login. '''
+        session = self.reddit_session
+        http = getattr(session, 'http', None)
+        headers = {'User-Agent': self.USER_AGENT}
+        base_url = 'https://api.reddit.com'
+        modhash = None
+
+        if http is not None:
+            headers['User-Agent'] = http.headers.get(
+                'User-Agent', self.USER_AGENT)
+
+        if getattr(session, 'access_token', None):
+            base_url = 'https://oauth.reddit.com'
+            headers['Authorization'] = 'bearer ' + session.access_token
+        elif http is not None:
+            cookies = '; '.join(
+                '{}={}'.format(i.name, i.value) for i in http.cookies)
+
+            if cookies:
+                headers['Cookie'] = cookies
+
+            modhash = getattr(session, 'modhash', None)
+
+        return self.base_url or base_url, headers, modhash
+
+    # Requests. {{{2
+    async def request(self, method, path, params=None, data=None):
+        ''' Send a request and return reddit's JSON. path is relative to the
+        base URL, like 'r/aww/new'. data is sent as a form.
+
+        Raises HTTPStatusError for anything but a 200, after retrying 429s
+        ASYNC_RETRIES times. GET requests follow redirects, as long as they
+        stay on the same host (so the login doesn't get sent anywhere else).
+        '''
+        base_url, headers, modhash = self._login()
+
+        if data is not None and modhash:
+            data = dict(data, uh=modhash)
+
+        url = urllib.parse.urlsplit('{}/{}.json{}'.format(
+            base_url.rstrip('/'), path.strip('/'),
+            '?' + urllib.parse.urlencode(params) if params else ''))
+        scheme = url.scheme
+        port = url.port or (443 if scheme == 'https' else 80)
+
+        body = (urllib.parse.urlencode(data).encode('utf-8')
+                if data is not None else b'')
+        headers.update({
+            'Host': url.netloc, 'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive', 'Content-Length': str(len(body))})
+
+        if data is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        retries = redirects = 0
+
+        while True:
+            target = url.path + ('?' + url.query if url.query else '')
+            raw = '{} {} HTTP/1.1\r\n{}\r\n\r\n'.format(
+                method, target,
+                '\r\n'.join('{}: {}'.format(*i) for i in headers.items()))
+            raw = raw.encode('utf-8') + body
+
+            await self.limiter.acquire_async()
+
+            start = time.perf_counter()
+            status, response_headers, response = await self._send(
+                scheme, url.hostname, port, raw)
+
+            self.limiter.update(response_headers)
+
+            observer = self.observer
+
+            if observer is not None:
+                observer(time.perf_counter() - start, len(response))
+
+            if status == 429 and retries < ASYNC_RETRIES:
+                await asyncio.sleep(_retry_delay(response_headers, retries))
+                retries += 1
+                continue
+            elif 300 <= status < 400 and 'location' in response_headers:
+                location = urllib.parse.urlsplit(urllib.parse.urljoin(
+                    url.geturl(), response_headers['location']))
+
+                if (method != 'GET' or redirects >= ASYNC_REDIRECTS
+                        or location[:2] != url[:2]):
+                    raise HTTPStatusError(
+                        status, url.geturl(), location.geturl())
+
+                url = location
+                redirects += 1
+                continue
+            elif status != 200:
+                raise HTTPStatusError(status, url.geturl())
+
+            return json.loads(response.decode('utf-8'))
+
+    async def _send(self, scheme, host, port, raw):
+        ''' Send a raw request and return (status, headers, body). '''
+        while True:
+            reader, writer, reused = await self.pool.get(scheme, host, port)
+            reusable = False
+
+            try:
+                writer.write(raw)
+                await writer.drain()
+
+                status, headers, body, reusable = await _read_response(
+                    reader)
+                return status, headers, body
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server is allowed to close a keep-alive connection
+                # whenever it likes, and we only find out when we try to use
+                # it. That's worth trying again on another connection, but a
+                # brand new connection failing isn't.
+                if not reused:
+                    raise
+            finally:
+                self.pool.put(scheme, host, port, (reader, writer), reusable)
+
+    async def _in_order(self, requests):
+        ''' Run requests (an iterable of coroutines) a few more at a time
+        than there are connections, and yield what they return in order.
+        '''
+        requests = iter(requests)
+        pending = collections.deque()
+
+        try:
+            while True:
+                while len(pending) < 2 * (self.pool.size or WORKERS):
+                    coroutine = next(requests, None)
+
+                    if coroutine is None:
+                        break
+
+                    pending.append(asyncio.ensure_future(coroutine))
+
+                if not pending:
+                    return
+
+                yield await pending.popleft()
+        finally:
+            for i in pending:
+                i.cancel()
+
+    def close(self):
+        ''' Close any idle connections. Call it from the event loop. '''
+        self.pool.close()
+
+    # Listings and lookups. {{{2
+    async def _page(self, path, params, after, count, limit):
+        params = dict(params or {}, limit=limit)
+
+        if after is not None:
+            params.update(after=after, count=count)
+
+        data = (await self.request('GET', path, params))['data']
+        return data['children'], data['after']
+
+    async def listing(self, path, limit=None, params=None):
+        ''' Yield up to [limit] items (all of them if limit is None) from a
+        listing like 'r/aww/new' or 'user/spez/comments'.
+
+        The next page is always requested before this one is handed out, so
+        whoever's reading doesn't wait on the network as much.
+        '''
+        count = 0
+        next_page = asyncio.ensure_future(self._page(
+            path, params, None, 0, 100 if limit is None else min(limit, 100)))
+
+        try:
+            while next_page is not None:
+                children, after = await next_page
+                next_page = None
+                total = count + len(children)
+
+                if (children and after is not None
+                        and (limit is None or total < limit)):
+                    next_page = asyncio.ensure_future(self._page(
+                        path, params, after, total,
+                        100 if limit is None else min(limit - total, 100)))
+
+                for thing in children:
+                    yield json_to_compact(thing)
+                    count += 1
+
+                    if limit is not None and count >= limit:
+                        return
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def _lookup(self, fullnames, not_found):
+        ''' Yield the items for fullnames, and add the ones reddit couldn't
+        find to not_found.
+        '''
+        batches = [fullnames[i:i + INFO_BATCH_SIZE]
+                   for i in range(0, len(fullnames), INFO_BATCH_SIZE)]
+        requests = (self.request('GET', 'api/info', {'id': ','.join(i)})
+                    for i in batches)
+        responses = self._in_order(requests)
+
+        try:
+            for batch in batches:
+                response = await responses.__anext__()
+                found = {i['data']['name']: i
+                         for i in response['data']['children']}
+
+                for fullname in batch:
+                    if fullname in found:
+                        yield json_to_compact(found[fullname])
+                    else:
+                        not_found.append(fullname)
+        finally:
+            await responses.aclose()
+
+    async def info(self, thing_ids, missing=None):
+        ''' hydrate(), but on the event loop: yield comments and submissions
+        by id, in order. See hydrate for what thing_ids and missing are.
+        '''
+        thing_ids = [i.strip() for i in thing_ids]
+        fullnames = [i if is_fullname(i) else 't3_' + i for i in thing_ids]
+        not_found = []
+
+        async for item in self._lookup(fullnames, not_found):
+            yield item
+
+        # Maybe the bare ids that weren't submissions were comments.
+        bare = {'t3_' + i for i in thing_ids if not is_fullname(i)}
+        retry = ['t1_' + i[3:] for i in not_found if i in bare]
+        not_found = [i for i in not_found if i not in bare]
+
+        if retry:
+            still_missing = []
+
+            async for item in self._lookup(retry, still_missing):
+                yield item
+
+            not_found += [i[3:] for i in still_missing]
+
+        if missing is not None:
+            missing += not_found
+
+    async def morechildren(self, link_id, children):
+        ''' Expand a "load more comments" link. Returns reddit's JSON for the
+        comments with these ids (and any "load more comments" under them),
+        MORECHILDREN_BATCH_SIZE ids per request, all at once.
+        '''
+        batches = [children[i:i + MORECHILDREN_BATCH_SIZE]
+                   for i in range(0, len(children), MORECHILDREN_BATCH_SIZE)]
+        requests = (self.request('POST', 'api/morechildren', data={
+            'api_type': 'json', 'link_id': link_id,
+            'children': ','.join(i)}) for i in batches)
+
+        things = []
+
+        async for response in self._in_order(requests):
+            things += response['json']['data']['things']
+
+        return things
+
+    async def thread(self, submission_id, limit=None):
+        ''' fetch_thread(), but on the event loop: yield up to [limit]
+        comments from a thread, shallowest and best-scoring branches first,
+        parents before their replies.
+        '''
+        submission, comments = await self.request(
+            'GET', 'comments/' + submission_id)
+        link_id = submission['data']['children'][0]['data']['name']
+
+        depths = {link_id: -1}
+        scores = {}
+        seen = set()
+
+        # A heap of (depth, -parent's score, -how many comments it hides,
+        #            tie breaker, the "more"'s data), like fetch_thread's.
+        pending = []
+        tie_breaker = itertools.count()
+
+        def walk(things):
+            ''' Flatten a comment tree, parents first. '''
+            for thing in things:
+                yield thing
+                replies = thing['data'].get('replies')
+
+                # Comments without replies have '' instead of a listing.
+                if replies:
+                    yield from walk(replies['data']['children'])
+
+        def add(thing):
+            ''' Queue up thing if it's a "more". Returns True if it's a
+            comment we haven't seen yet.
+            '''
+            data = thing['data']
+            depth = depths.get(data['parent_id'], -1) + 1
+
+            if thing['kind'] == 'more':
+                heapq.heappush(pending, (
+                    depth, -scores.get(data['parent_id'], 0), -data['count'],
+                    next(tie_breaker), data))
+                return False
+
+            if data['name'] in seen:
+                return False
+
+            seen.add(data['name'])
+            depths[data['name']] = depth
+            scores[data['name']] = data.get('score') or 0
+            return True
+
+        async def continue_thread(more):
+            # "Continue this thread" links don't have any ids to expand, so
+            # load the parent comment's page instead.
+            _, page = await self.request('GET', 'comments/{}/_/{}'.format(
+                submission_id, more['parent_id'].split('_', 1)[1]))
+            return page['data']['children']
+
+        async def next_round():
+            rounds = []
+            children = []
+
+            while pending and len(rounds) < (self.pool.size or WORKERS):
+                more = heapq.heappop(pending)[-1]
+
+                if more['count'] == 0:
+                    rounds.append(continue_thread(more))
+                    continue
+
+                children += [i for i in more['children']
+                             if 't1_' + i not in seen]
+
+                while len(children) >= MORECHILDREN_BATCH_SIZE:
+                    rounds.append(self.morechildren(
+                        link_id, children[:MORECHILDREN_BATCH_SIZE]))
+                    children = children[MORECHILDREN_BATCH_SIZE:]
+
+            if children:
+                rounds.append(self.morechildren(link_id, children))
+
+            things = []
+
+            for i in await asyncio.gather(*rounds):
+                things += i
+
+            return things
+
+        things = walk(comments['data']['children'])
+        count = 0
+
+        while True:
+            for thing in things:
+                if add(thing):
+                    yield json_to_compact(thing)
+                    count += 1
+
+                    if limit is not None and count >= limit:
+                        return
+
+            if not pending:
+                return
+
+            things = _parents_first(
+                walk(await next_round()),
+                lambda i: None if i['kind'] == 'more' else i['data']['name'],
+                lambda i: i['data']['parent_id'])
+
+    # Voting. {{{2
+    async def vote(self, fullname, direction):
+        ''' direction is 1, 0 or -1. '''
+        await self.request('POST', 'api/vote',
+                           data={'id': fullname, 'dir': direction})
+
+    async def vote_all(self, fullnames, direction, progress=None, stop=None):
+        ''' vote_all(), but on the event loop. Returns a VoteReport. '''
+        report = VoteReport(len(fullnames))
+
+        async def vote(index, fullname):
+            try:
+                await self.vote(fullname, direction)
+            except Exception as error:
+                return index, error
+
+            return index, None
+
+        results = self._in_order(
+            vote(index, i) for index, i in enumerate(fullnames))
+        done = 0
+
+        try:
+            async for index, error in results:
+                if error is None:
+                    report.succeeded.append(index)
+                else:
+                    report.failed.append((index, error))
+
+                done += 1
+
+                if progress is not None:
+                    progress(done, report.total)
+
+                if stop is not None and stop.is_set():
+                    break
+        finally:
+            await results.aclose()
+
+        return report
+
+
+class EventLoopThread(object):
+    ''' An asyncio event loop running in a thread of its own, so code that
+    isn't async (like a cmd.Cmd command) can hand it coroutines.
+
+    The loop keeps running between commands, and so do AsyncReddit's
+    keep-alive connections.
+    '''
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True, name='asyncio')
+        self._thread.start()
+
+    def run(self, coroutine, stop=None):
+        ''' Run coroutine on the loop and return what it returns. A ctrl-c
+        while we're waiting cancels it.
+
+        If the coroutine watches a threading.Event to know when to wrap up
+        (like AsyncReddit.vote_all), pass it as stop. Then the first ctrl-c
+        just sets it, and we keep waiting for whatever the coroutine returns.
+        Only a second ctrl-c cancels it.
+        '''
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+        try:
+            try:
+                return future.result()
+            except KeyboardInterrupt:
+                if stop is None:
+                    raise
+
+                stop.set()
+
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+
+    def iterate(self, async_iterable):
+        ''' Turn an async iterable (like AsyncReddit.listing) into a normal
+        generator. Closing the generator closes the async one too.
+        '''
+        iterator = async_iterable.__aiter__()
+        done = object()
+
+        async def next_item():
+            try:
+                return await iterator.__anext__()
+            except StopAsyncIteration:
+                return done
+
+        try:
+            while True:
+                item = self.run(next_item())
+
+                if item is done:
+                    return
+
+                yield item
+        finally:
+            if hasattr(iterator, 'aclose'):
+                self.run(iterator.aclose())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
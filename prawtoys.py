@@ -8,10 +8,6 @@
 # * Example slightly obscured so that ctrl-f (or your text editor's equivalent)
 #   won't get confused and find a false positive.
 #
-# TODO: Nodupes command. praw.objects.Submission has .__eq__() so == should
-#       work. Seems to work after a bit of testing. Also, wasn't there a
-#       command in URLToys that filtered out BOTH of the dupes? Might come in
-#       handy too.
 # TODO: Progress indicator when loading items. Is this even possible? If not,
 #       just have one thread making a pretty loading animation while the other
 #       thread is waiting on the server.
@@ -19,8 +15,6 @@
 #       for title and ntitle.
 # TODO: unittests for the thread command.
 # TODO: unittests for the rm command.
-# TODO: Test PRAWToys.input and migrate code over to using it. If any code even
-#       needs input().
 # TODO: All docstrings should be in this format:
 #       '''f(oo) <bar> [baz]
 #
@@ -33,8 +27,10 @@
 # Imports. {{{1
 import cmd
 import os
+import copy
 import re
 import sys
+import shutil
 import itertools
 import traceback
 import webbrowser
@@ -42,57 +38,158 @@ from pprint import pprint
 import collections
 import pickle
 import threading
+import time
 
 import praw
 import OAuth2Util
 
 import ahto_lib
 import praw_tools
+import aggregate
+import export
 import helper
+import history
+import item_cache
+import item_filter
+import item_store
+import jobs
+import pager
+import profiling
+import session_file
+import synthetic
+import text_index
 
 VERSION = 'PRAWToys 2.3.0'
 
 
 # Functions {{{1
 def loading_screen(task, *task_args, stdout=sys.stdout,  # {{{2
-                   **task_kwargs):
+                   progress=None, **task_kwargs):
+    """ print a loading animation while doing something else
+
+    progress is an optional function that returns how many items have been
+    loaded so far. If you give it, the count is shown next to the animation so
+    you can watch it go up.
+
+    If the user hits ctrl-c, the task is abandoned and we return None. Any
+    items it already added stay where they are.
+    """
+    def status():
+        count = progress() if progress is not None else 0
+        return ' {} items'.format(count) if count else ''
+
     def loading_animation(task_finished, stdout=sys.stdout):
         # If it takes longer than one second to finish the task, display the
         # loading animation.
         if task_finished.wait(timeout=1):
             return
 
+        animation_shown.set()
+
         while True:
             for i in ["---", " \\ ", " | ", " / "]:
-                print("\rLoading...", i, end='', file=stdout)
-                sys.stdout.flush()
+                print("\rLoading..." + status(), i, end='', file=stdout)
+                stdout.flush()
 
                 if task_finished.wait(timeout=0.2):
-                    print("\rLoading... done!", file=stdout)
+                    # The trailing spaces cover up the end of the animation.
+                    print("\rLoading...", outcome[0] + status(), "    ",
+                          file=stdout)
                     return
 
-    """ print a loading animation while doing something else """
+    # A one-item list so loading_animation can see it change.
+    outcome = ['done!']
+    task_data = None
+
     task_finished = threading.Event()
+    animation_shown = threading.Event()
     animation = threading.Thread(target=loading_animation,
                                  args=(task_finished, stdout))
 
     animation.start()
-    task_data = task(*task_args, **task_kwargs)
-    task_finished.set()
 
-    # to prevent race conditions with printing
-    animation.join()
+    try:
+        task_data = task(*task_args, **task_kwargs)
+    except KeyboardInterrupt:
+        outcome[0] = 'interrupted!'
+    finally:
+        task_finished.set()
+
+        # to prevent race conditions with printing
+        animation.join()
+
+    if outcome[0] != 'done!' and not animation_shown.is_set():
+        print("Interrupted!" + status(), file=stdout)
 
     return task_data
 
 def loading_wrapper(f):  # {{{2
-    """ wrap a URLToysClone function in a loading_screen to self.stdout """
+    """ wrap a URLToysClone function in a loading_screen to self.stdout
+
+    The loading screen counts how many items have been added to self.items
+    since the command started. Background jobs don't get one, since nobody's
+    watching.
+    """
     def new_f(self, *args, **kwargs):
-        return loading_screen(f, self, *args, stdout=self.stdout, **kwargs)
+        if self.job is not None:
+            return f(self, *args, **kwargs)
+
+        start = len(self.items)
+
+        return loading_screen(f, self, *args, stdout=self.stdout,
+                              progress=lambda: len(self.items) - start,
+                              **kwargs)
+
+    # The help command reads help from each do_* command's docstrings.
+    new_f.__doc__ = f.__doc__
 
     return new_f
 
 
+def parse_limit(s):  # {{{2
+    """ Turn a command argument like '100' or 'all' into a listing limit.
+
+    'none' and 'all' (case insensitive) mean no limit, so they give None.
+    Raises ValueError for anything that isn't a number.
+    """
+    if s.lower() in ['none', 'all']:
+        return None
+
+    return int(s)
+
+
+def parse_pattern(arg):  # {{{2
+    """ Turn the argument of a command like title into a compiled regex.
+
+    The argument can start with any of these options:
+
+    -i    ignore case
+    -l    treat the pattern as plain text instead of a regex
+    -any  the rest of the words are separate patterns, and any of them can
+          match. Otherwise the whole rest of the argument (spaces and all) is
+          one pattern.
+
+    Raises ValueError for a bad regex or a missing pattern.
+    """
+    words = arg.split()
+    options = []
+
+    while words and words[0] in ['-i', '-l', '-any']:
+        options.append(words.pop(0))
+
+    if not words:
+        raise ValueError('No pattern given.')
+
+    if '-any' in options:
+        patterns = tuple(words)
+    else:
+        # Keep the spaces inside the pattern just the way they were typed.
+        patterns = (arg.split(None, len(options))[-1].strip(),)
+
+    return item_filter.compile_patterns(
+        patterns, ignore_case='-i' in options, literal='-l' in options)
+
+
 def logged_in_command(f):  # {{{2
     """ A decorator for PRAWToys commands that need the user to be logged in.
 
@@ -124,6 +221,31 @@ class URLToysClone(cmd.Cmd):  # {{{1
     prompt = '0> '
     VERSION = "URLToysClone generic class"
 
+    # What to index self.items by. See item_store.ItemStore.
+    ITEM_INDEXERS = {}
+
+    # A function that gets an item's text for the search command, or None if
+    # these items can't be searched.
+    ITEM_TEXT = None
+
+    # Should add_items skip items that are already in the list? See
+    # do_dedupe.
+    dedupe_on_add = False
+
+    # How many lines print_lines writes at once.
+    OUTPUT_BATCH_SIZE = 1000
+
+    # Should long listings go through the pager? None means only when stdout
+    # is a terminal. See do_pager.
+    use_pager = None
+
+    # A profiling.Profiler while profiling is on. See do_profile.
+    profiler = None
+
+    # The jobs.Job this copy of the shell is running, if it's running one.
+    # See start_job.
+    job = None
+
     def __init__(self, *args, **kwargs):  # {{{2
         """ See cmd.Cmd.__init__ for valid arguments """
         # This is arguably more readable than having an if/else, but I'll
@@ -135,13 +257,49 @@ class URLToysClone(cmd.Cmd):  # {{{1
         # Don't use raw input if we can use readline, the better alternative.
         self.use_rawinput = not can_use_readline
 
+        self.history = history.History()
         self.items = []
+        self.jobs = jobs.Jobs()
 
         super(URLToysClone, self).__init__(self, *args, **kwargs)
 
         self.print(self.VERSION)
         self.print()
 
+    @property
+    def items(self):  # {{{2
+        """ The item list. Always an item_store.ItemStore.
+
+        You can set this to a plain list and it'll get wrapped for you.
+        Setting it directly throws away the undo history, since there's no
+        way to know what changed. Commands should use add_items, keep_positions
+        and friends instead.
+        """
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self.history.clear()
+        self._items = self.make_item_store(items)
+
+    def make_item_store(self, items):  # {{{2
+        if isinstance(items, item_store.ItemStore):
+            return items
+
+        # The 'key' index is what nodupes, uniq and dedupe use to spot
+        # duplicates.
+        indexers = dict(self.ITEM_INDEXERS, key=self.item_key)
+        return item_store.ItemStore(items, indexers, self.ITEM_TEXT)
+
+    def item_key(self, item):  # {{{2
+        """ Two items with the same key are duplicates. None means the item
+        can't be compared, so it's never treated as a duplicate.
+
+        By default, items are their own key. Overwrite this if your items
+        aren't hashable or you have a better way to tell them apart.
+        """
+        return item
+
     def print(self, *args, file=None, **kwargs):  # {{{2
         """ A version of print that defaults to using self.stdout
 
@@ -183,9 +341,16 @@ class URLToysClone(cmd.Cmd):  # {{{1
         self.stdout.buffer.write(sep.join(args) + end)
 
     def input(self, prompt=""):  # {{{2
-        """ A version of input that always uses self.stdin UNTESTED """
-        self.print(prompt, end="")
-        self.stdin.readline()
+        """ A version of input that always uses self.stdin. Returns None once
+        there's nothing left to read.
+        """
+        self.print(prompt, end="", flush=True)
+        line = self.stdin.readline()
+
+        if not line:
+            return None
+
+        return line.rstrip('\n')
 
     def emptyline(self):  # {{{2
         # Disable empty line repeating the last command. Who thought that was a
@@ -207,8 +372,239 @@ class URLToysClone(cmd.Cmd):  # {{{1
         # But personally, I think there are too many opportunities for
         # programmer oversight with that system. So I'm going with the slower
         # but safer (and more maintainable!) approach.
+        self.merge_jobs()
         self.update_prompt()
 
+        if self.profiler is not None:
+            self.profiler.finish(postcmd_ran=True)
+
+    def precmd(self, line):  # {{{2
+        # Jobs that finished while we were waiting for the user go in before
+        # their command runs, not halfway through it.
+        self.merge_jobs()
+        return line
+
+    def onecmd(self, line):  # {{{2
+        # Jobs can't start jobs of their own.
+        if line.rstrip().endswith('&') and self.job is None:
+            self.start_job(line.rstrip()[:-1].strip())
+            return
+
+        profiler = self.profiler
+
+        if profiler is None:
+            return super(URLToysClone, self).onecmd(line)
+
+        profiler.start(line, len(self.items))
+
+        try:
+            return super(URLToysClone, self).onecmd(line)
+        finally:
+            profiler.stop(len(self.items))
+
+            # "profile off" turns the profiler off in the middle of its own
+            # command, so there's no postcmd coming for it.
+            if self.profiler is not profiler:
+                profiler.finish()
+
+    def set_profiler(self, profiler):  # {{{2
+        """ Turn profiling on with a profiling.Profiler, or off with None.
+        Overwrite this if you have something else to hook up to it, like an
+        HTTP session.
+        """
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        if profiler is not None:
+            profiler.enable()
+
+        self.profiler = profiler
+
+    def do_profile(self, arg):  # {{{2
+        """profile [on [cprofile=<dir>] [trace=<file>]|off|stats|last]
+
+        Time every command. With profiling on, each command's time, network
+        time, number of HTTP requests, bytes downloaded, change in the number
+        of items, peak memory use, and time spent updating the prompt
+        afterwards are all recorded. This slows things down a little.
+
+        profile stats shows totals for each command, slowest first, and
+        profile last shows everything about the last command.
+
+        cprofile=<dir> also runs every command under cProfile and dumps the
+        results into <dir>, one file per command. trace=<file> writes a line
+        of JSON to <file> for every command.
+        """
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('profile =', 'off' if self.profiler is None else 'on')
+            return
+
+        option = args[0].lower()
+
+        if option == 'on':
+            names = {'cprofile': 'cprofile_dir', 'trace': 'trace_file'}
+            settings = {}
+
+            for i in args[1:]:
+                name, equals, value = i.partition('=')
+
+                if not equals or name not in names:
+                    self.print('Unexpected argument:', i)
+                    return
+
+                settings[names[name]] = value
+
+            self.set_profiler(profiling.Profiler(**settings))
+        elif option == 'off':
+            self.set_profiler(None)
+        elif option in ['stats', 'last']:
+            if self.profiler is None or not self.profiler.records:
+                self.print('Nothing has been profiled. Try "profile on".')
+            elif option == 'stats':
+                self.print_profile_stats(self.profiler.summary())
+            else:
+                record = self.profiler.records[-1].to_dict()
+
+                for name in sorted(record):
+                    self.print('{:>12} : {}'.format(name, record[name]))
+        else:
+            self.print('Expected on, off, stats or last, not:', args[0])
+
+    def print_profile_stats(self, summary):  # {{{2
+        columns = [
+            ('command', '{}'), ('runs', '{}'), ('wall', '{:.3f}s'),
+            ('network', '{:.3f}s'), ('requests', '{}'),
+            ('KB', lambda i: '{:.1f}'.format(i['bytes'] / 1024)),
+            ('items', '{:+}'),
+            ('peak KB', lambda i: '{:.1f}'.format(i['memory_peak'] / 1024)),
+            ('postcmd', lambda i: '{:.1f}ms'.format(i['postcmd'] * 1000))]
+
+        table = [[name for name, _ in columns]]
+
+        for row in summary:
+            table.append([
+                i(row) if callable(i) else i.format(row[name])
+                for name, i in columns])
+
+        widths = [max(len(row[i]) for row in table)
+                  for i in range(len(columns))]
+
+        for row in table:
+            self.print('  '.join(
+                [row[0].ljust(widths[0])]
+                + [j.rjust(width) for j, width in zip(row[1:], widths[1:])]))
+
+    def start_job(self, line):  # {{{2
+        """ Run line in the background. See jobs.py. """
+        if not line:
+            self.print('Nothing to run in the background.')
+            return
+
+        job = self.jobs.new(line)
+        job.start(self.job_shell(job))
+        self.print('[{}] {}'.format(job.number, line))
+
+    def job_shell(self, job):  # {{{2
+        """ A copy of this shell for job to run on. Everything is shared
+        except the item list, the undo history and the output. The job gets
+        an ItemStore.share of the list, so it's only copied if the job
+        changes it. Overwrite this if you have anything else a job shouldn't
+        touch.
+        """
+        shell = copy.copy(self)
+        shell.job = job
+        shell.stdout = job.output
+        shell.use_pager = False
+        shell.profiler = None
+        shell.history = history.History()
+        shell._items = self.items.share()
+
+        return shell
+
+    def merge_jobs(self):  # {{{2
+        """ Add the items from every finished job to self.items, oldest job
+        first, and show what they printed. Only call this between commands.
+        """
+        if self.job is not None:
+            return
+
+        for job in self.jobs.pop_finished():
+            output = job.output.getvalue() + (job.error or '')
+
+            if output:
+                self.print(output, end='' if output.endswith('\n') else '\n')
+
+            # One change, so a single undo takes the whole job back out.
+            if job.added:
+                self.add_items(job.added)
+
+            self.print(job.status())
+
+    def do_jobs(self, arg):  # {{{2
+        """jobs
+
+        List background jobs. To start one, put & at the end of a command,
+        like "get_from aww all &". You can keep using the list while it runs.
+        Once it's done, whatever it printed gets shown and the items it got
+        are added to the list, all at once.
+
+        A job works on its own copy of the list, so filtering in the
+        background doesn't do anything. Only the items it adds come back.
+        """
+        if not len(self.jobs):
+            self.print('No jobs running.')
+            return
+
+        for job in self.jobs:
+            self.print(job.status())
+
+    def do_fg(self, arg):  # {{{2
+        """fg [job]
+
+        Wait for a background job to finish. [job] is the job's number from
+        the jobs command, and it's the newest job by default. Hit ctrl-c to
+        stop waiting. The job keeps going either way.
+        """
+        args = arg.split()
+
+        try:
+            job = self.jobs.get(args[0] if args else None)
+        except ValueError as error:
+            self.print(error)
+            return
+
+        def wait():
+            # A short timeout, so ctrl-c gets noticed.
+            while not job.wait(timeout=0.1):
+                pass
+
+        self.print(job.status())
+        loading_screen(wait, stdout=self.stdout,
+                       progress=lambda: len(job.added))
+
+        if not job.finished.is_set():
+            self.print('[{}] is still running.'.format(job.number))
+
+    def do_kill(self, arg):  # {{{2
+        """kill <job>...
+
+        Stop background jobs. Each one stops after the item or vote it's on,
+        and any items it already got are still added to the list.
+        """
+        args = arg.split()
+
+        if not args:
+            self.print('No job specified!')
+            return
+
+        for i in args:
+            try:
+                self.jobs.get(i).kill()
+            except ValueError as error:
+                self.print(error)
+
     def do_EOF(self, arg):  # {{{2
         # If the user types an EOF character, exit.
         exit(0)
@@ -220,18 +616,111 @@ class URLToysClone(cmd.Cmd):  # {{{1
         self.prompt = items_len + '> '
 
     def add_items(self, l):  # {{{2
-        self.old_items = self.items[:]
-        self.items += list(l)
+        """ add the items in l to self.items as they come in
+
+        l can be a slow generator, like a praw listing. Items are appended one
+        at a time, so the loading screen can count them and a ctrl-c keeps
+        everything that was loaded before it.
+        """
+        change = history.Change()
+        start = len(self.items)
+        iterator = iter(l)
+        skipped = 0
+
+        # This gets kept up-to-date as items are appended, so it knows about
+        # duplicates within l too.
+        keys = self.items.index('key') if self.dedupe_on_add else None
+
+        # In a background job, everything added is also kept for merging into
+        # the real list later, and we stop as soon as the job is killed.
+        job = self.job
+
+        try:
+            for item in iterator:
+                if job is not None and job.stop.is_set():
+                    raise KeyboardInterrupt
+
+                item = self.ingest_item(item)
+
+                if keys is not None:
+                    key = self.item_key(item)
+
+                    if key is not None and key in keys:
+                        skipped += 1
+                        continue
+
+                self.items.append(item)
+
+                if job is not None:
+                    job.added.append(item)
+        except KeyboardInterrupt:
+            # Let generators clean up after themselves. praw_tools.fetch_all
+            # uses this to tell its worker threads to stop.
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+            raise
+        finally:
+            change.added = len(self.items) - start
+            self.history.push(change)
+
+            if skipped:
+                self.print('Skipped {} duplicate(s).'.format(skipped))
+
+    def ingest_item(self, item):  # {{{2
+        """ add_items runs every new item through this before storing it.
+
+        Overwrite it if you want to change items on the way in. By default it
+        just gives you the item back.
+        """
+        return item
+
+    def keep_positions(self, positions):  # {{{2
+        """ keep only the items at these (sorted) positions
+
+        Everything else is removed, and remembered in the undo history.
+        """
+        if self.items.lazy:
+            # The old list is just an array of positions into a file, so
+            # it's cheaper to keep the whole thing than to work out a diff.
+            old_items, self._items = self.items, self.items.take(positions)
+            self.history.push(self.whole_list_change(old_items))
+        else:
+            self.history.push(history.filter_change(self.items, positions))
+            self._items = self.items.take(positions)
+
+    def whole_list_change(self, store):  # {{{2
+        """ A history change for throwing away all of store (an ItemStore).
+
+        A lazy store is only an array of positions into a file, so it's
+        cheap to keep as it is, once its columns and indexes (which aren't
+        cheap at all) are thrown away. Anything else counts every item
+        towards undo_limit.
+        """
+        if store.lazy:
+            store.forget_indexes()
+            return history.SnapshotChange(store)
+
+        return history.SnapshotChange(store, cost=len(store))
 
     def filter_items(self, f, invert=False):  # {{{2
         """ filter self.items by f and update undo history """
+        self.keep_positions([index for index, item in enumerate(self.items)
+                             if invert != bool(f(item))])
+
+    def filter_by_index(self, name, keys, invert=False):  # {{{2
+        """ keep only the items whose [name] index key is in keys
+
+        Like filter_items, but uses self.items' indexes to find the matches
+        instead of checking every item. invert=True throws the matches out
+        instead.
+        """
+        positions = self.items.positions(name, *keys)
+
         if invert:
-            new_items = itertools.filterfalse(f, self.items)
-        else:
-            new_items = filter(f, self.items)
+            positions = list(history.complement(positions, len(self.items)))
 
-        self.old_items = self.items
-        self.items = list(new_items)
+        self.keep_positions(positions)
 
     def item_to_str(self, item, chars_printed=0):  # {{{2
         """ Don't call this directly! Instead, use print_item.
@@ -258,6 +747,10 @@ class URLToysClone(cmd.Cmd):  # {{{1
         fine.
         '''
 
+        self.safe_print(self.item_line(index, item, index_rjust))
+
+    def item_line(self, index, item=None, index_rjust=None):  # {{{2
+        """ The line print_item would print, without printing it. """
         if item is None:
             item = self.items[index]
 
@@ -269,27 +762,121 @@ class URLToysClone(cmd.Cmd):  # {{{1
         # index_rjust + 2 because we also have ': ', which is 2 characters.
         item_str = self.item_to_str(item, index_rjust + 2)
 
-        self.safe_print('{index_str}: {item_str}'.format(**locals()))
+        return '{index_str}: {item_str}'.format(**locals())
+
+    def print_lines(self, lines):  # {{{2
+        """ Print lines (any iterable of strings) with as few writes as
+        possible. Writing to the console line by line is a lot slower than
+        writing a big chunk at once, so lines are printed OUTPUT_BATCH_SIZE at
+        a time.
+        """
+        lines = iter(lines)
+
+        while True:
+            batch = list(itertools.islice(lines, self.OUTPUT_BATCH_SIZE))
+
+            if not batch:
+                break
+
+            self.safe_print('\n'.join(batch))
+
+    def paging(self):  # {{{2
+        if self.use_pager is None:
+            return self.stdout.isatty()
+
+        return self.use_pager
+
+    def page_lines(self, length, get_line, labels=None):  # {{{2
+        """ Show [length] lines, where get_line(n) renders line n. If they
+        don't fit on the screen and the pager is on, only the lines that are
+        actually on screen get rendered. See pager.Pager for what labels is.
+        """
+        # Leave a line for the pager's prompt.
+        rows = shutil.get_terminal_size().lines - 1
+
+        if length <= rows or not self.paging():
+            self.print_lines(get_line(i) for i in range(length))
+            return
+
+        pager.Pager(length, get_line, rows, labels).run(
+            self.print_lines, self.input)
+
+    def print_items(self, indicies, index_rjust=None):  # {{{2
+        """ print_item for each of indicies, but all in one go, and through
+        the pager if there are a lot of them. indicies has to be sorted.
+        """
+        if index_rjust is None and len(indicies) > 0:
+            index_rjust = len(str(max(indicies)))
+
+        def get_line(n):
+            index = indicies[n]
+            return self.item_line(index, self.items[index], index_rjust)
+
+        self.page_lines(len(indicies), get_line, indicies)
+
+    def undo_redo(self, arg, method, verb):  # {{{2
+        ''' do_undo and do_redo call this. method is self.history.undo or
+        self.history.redo, and verb is 'undo' or 'redo'.
+        '''
+        args = arg.split()
+        n = int(args[0]) if len(args) > 0 else 1
+
+        items, done = method(self.items, n)
+
+        if done == 0:
+            self.print('No {verb} history found. Nothing to {verb}.'.format(
+                verb=verb))
+            return
+
+        self._items = self.make_item_store(items)
+
+        if done < n:
+            self.print('Could only {verb} {done} step(s).'.format(
+                verb=verb, done=done))
 
     def do_undo(self, arg):  # {{{2
-        '''undo
+        '''undo [n=1]
 
-        Resets the item list one change back in time.
+        Resets the item list [n] changes back in time. 'u' is an alias for
+        this command.
         '''
         # Unit-tested.
-        if hasattr(self, 'old_items'):
-            self.items = self.old_items[:]
-        else:
-            self.print('No undo history found. Nothing to undo.')
+        self.undo_redo(arg, self.history.undo, 'undo')
     do_u = do_undo
 
+    def do_redo(self, arg):  # {{{2
+        '''redo [n=1]
+
+        Re-does the last [n] changes that you undid.
+        '''
+        # Unit-tested.
+        self.undo_redo(arg, self.history.redo, 'redo')
+
+    def do_undo_limit(self, arg):  # {{{2
+        '''undo_limit [n]
+
+        Set or view how many removed items the undo history is allowed to
+        remember. When it goes over, the oldest changes get forgotten.
+        '''
+        args = arg.split()
+
+        if len(args) > 0:
+            history.LIMIT = int(args[0])
+            self.history.trim()
+        else:
+            self.print('undo_limit =', history.LIMIT)
+            self.print('currently remembering', self.history.cost, 'items')
+
     def do_reset(self, arg):  # {{{2
         '''reset
 
         Clear all items from the item list.
         '''
         # Unit-tested.
-        self.items = []
+        # The old ItemStore is being thrown away anyway, so the history can
+        # just hang on to it instead of making a copy.
+        self.history.push(self.whole_list_change(self.items))
+        self._items = self.make_item_store([])
 
     def do_x(self, arg):  # {{{2
         ''' x <command>
@@ -316,37 +903,121 @@ class URLToysClone(cmd.Cmd):  # {{{1
                 self.print("Out of range:", i)
                 return
 
-        self.old_items = self.items[:]
+        unwanted = set(indicies)
+        self.keep_positions(
+            [i for i in range(items_len) if i not in unwanted])
 
-        for i in indicies:
-            self.items[i] = None
+    def duplicate_positions(self):  # {{{2
+        """ Get {key: [position, ...]} for every key that's in the list more
+        than once. See item_key.
+        """
+        return {key: positions
+                for key, positions in self.items.index('key').items()
+                if key is not None and len(positions) > 1}
+
+    def do_nodupes(self, arg):  # {{{2
+        '''nodupes
+
+        Filter out duplicates, keeping the first copy of each item. Two items
+        are duplicates if they're the same comment or submission.
+        '''
+        unwanted = set()
+
+        for positions in self.duplicate_positions().values():
+            unwanted.update(positions[1:])
 
-        self.items = [i for i in self.items if i is not None]
+        self.keep_positions(
+            list(history.complement(sorted(unwanted), len(self.items))))
+
+    def do_uniq(self, arg):  # {{{2
+        '''uniq [-both]
+
+        Without -both, the same as nodupes. With -both, every copy of an item
+        that shows up more than once is filtered out, and only items that were
+        in the list exactly once are kept.
+        '''
+        args = arg.split()
+
+        if not args:
+            self.do_nodupes('')
+            return
+        elif args != ['-both']:
+            self.print('Unexpected argument:', ' '.join(args))
+            return
+
+        unwanted = []
+
+        for positions in self.duplicate_positions().values():
+            unwanted += positions
+
+        self.keep_positions(
+            list(history.complement(sorted(unwanted), len(self.items))))
+
+    def do_dedupe(self, arg):  # {{{2
+        '''dedupe [on|off]
+
+        Turn dedupe mode on or off, or see whether it's on.
+
+        In dedupe mode, any new item that's already in the list gets skipped,
+        so running saved, user and get_from one after another never leaves
+        you with duplicates. Items that are already in the list aren't
+        changed. Use nodupes for those.
+        '''
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('dedupe =', 'on' if self.dedupe_on_add else 'off')
+        elif args[0].lower() in ['on', 'off']:
+            self.dedupe_on_add = args[0].lower() == 'on'
+        else:
+            self.print('Expected "on" or "off", not:', args[0])
+
+    def do_pager(self, arg):  # {{{2
+        '''pager [on|off|auto]
+
+        Turn the pager on or off, or see whether it's on. With the pager on,
+        listings too long for the screen (like ls, lsub and view_subs) are
+        shown a page at a time. auto, the default, means on if you're at a
+        terminal. While paging:
+
+        <enter>/n   next page
+        p/b         previous page
+        g <n>       jump to item <n>
+        /<regex>    find the next line matching <regex>. / repeats it.
+        q           stop paging
+        '''
+        args = arg.split()
+        settings = {'on': True, 'off': False, 'auto': None}
+
+        if len(args) == 0:
+            setting = [k for k, v in settings.items() if v is self.use_pager]
+            self.print('pager =', setting[0],
+                       '(on)' if self.paging() else '(off)')
+        elif args[0].lower() in settings:
+            self.use_pager = settings[args[0].lower()]
+        else:
+            self.print('Expected "on", "off" or "auto", not:', args[0])
 
     def do_ls(self, arg):  # {{{2
         '''
         ls [start [n=10]]: list items, with [start] list [n] items starting at
         [start]
         '''
-        if len(self.items) == 0:
-            return
-
         args = arg.split()
 
-        to_print = list(enumerate(self.items))
+        # Work out which indicies to print before looking at any items, so
+        # that "ls 500000 10" only has to touch 10 of them.
+        indicies = range(len(self.items))
 
         if len(args) > 0:
             start = int(args[0])
-            to_print = to_print[start:]
+            indicies = indicies[start:]
 
             if len(args) > 1:
                 n = int(args[1])
-                to_print = to_print[:n]
+                indicies = indicies[:n]
 
-        index_rjust = len(str(
-            max(index for index, item in to_print)))
-        for index, item in to_print:
-            self.print_item(index, item, index_rjust)
+        self.print_items(indicies)
 
     def do_head(self, arg):  # {{{2
         '''head [n=10]: show first [n] items'''
@@ -375,13 +1046,39 @@ class URLToysClone(cmd.Cmd):  # {{{1
 
 
 class PRAWToys(URLToysClone):  # {{{1
+    ITEM_INDEXERS = praw_tools.ITEM_INDEXERS
+    ITEM_TEXT = staticmethod(praw_tools.item_text)
+
+    # Should new items be stored as praw_tools.CompactItems? See do_compact.
+    compact_items = False
+
+    # An item_cache.ItemCache, or None if caching is off. See do_cache.
+    cache = None
+
+    # Should we report praw fetching objects behind our back? See
+    # do_watch_fetches.
+    watch_fetches = False
+
+    # Should get_from, thread, load_ids and voting go through
+    # praw_tools.AsyncReddit instead of praw? See do_async.
+    async_network = False
+
+    # The praw_tools.EventLoopThread and AsyncReddit for async_network, made
+    # the first time they're needed. See async_client.
+    event_loop = None
+    async_reddit = None
+    _async_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):  # {{{2
         """ See URLToysClone.__init__ for valid arguments """
         global VERSION
         self.VERSION = VERSION
 
-        self.reddit_session = praw.Reddit(self.VERSION,
-                                          disable_update_check=True)
+        # ConcurrentHandler lets commands like upvote have more than one
+        # request in flight at a time.
+        self.reddit_session = praw.Reddit(
+            self.VERSION, disable_update_check=True,
+            handler=praw_tools.ConcurrentHandler())
 
         super(PRAWToys, self).__init__(*args, **kwargs)
 
@@ -389,10 +1086,7 @@ class PRAWToys(URLToysClone):  # {{{1
         '''given a list of subs, return all stored items from those subs'''
         subs = [i.lower() for i in subs]
 
-        def filter_func(i):
-            return i.subreddit.display_name.lower() in subs
-
-        return list(filter(filter_func, self.items))
+        return self.items.take(self.items.positions('subreddit', *subs))
 
     def arg_to_matching_subs(self, subs_string=None):  # {{{2
         '''
@@ -411,6 +1105,53 @@ class PRAWToys(URLToysClone):  # {{{1
     def item_to_str(self, item, chars_printed=0):  # {{{2
         return praw_tools.praw_object_to_string(item, chars_printed)
 
+    def item_key(self, item):  # {{{2
+        # Comments and submissions are told apart by their fullnames, like
+        # t3_5abcde. That works for CompactItems too.
+        return getattr(item, 'fullname', None)
+
+    def ingest_item(self, item):  # {{{2
+        # Everything after this point (filters, ls, compacting...) reads these
+        # fields, so make sure none of them can trigger a request later.
+        praw_tools.pin_offline_fields(item)
+
+        if self.compact_items:
+            return praw_tools.compact(item)
+
+        return item
+
+    def postcmd(self, r, l):  # {{{2
+        if self.watch_fetches:
+            self.report_lazy_fetches()
+
+        return super(PRAWToys, self).postcmd(r, l)
+
+    def set_profiler(self, profiler):  # {{{2
+        # Network time gets counted separately, straight from the handler.
+        super(PRAWToys, self).set_profiler(profiler)
+
+        handler = getattr(self.reddit_session, 'handler', None)
+
+        observer = None if profiler is None else profiler.request_done
+
+        if isinstance(handler, praw_tools.ConcurrentHandler):
+            handler.observer = observer
+
+        if self.async_reddit is not None:
+            self.async_reddit.observer = observer
+
+    def report_lazy_fetches(self):  # {{{2
+        fetches = praw_tools.take_lazy_fetches()
+
+        if not fetches:
+            return
+
+        self.print('Warning: {} lazy fetch(es) during that command:'.format(
+            sum(fetches.values())))
+
+        for (class_name, attr), count in fetches.most_common():
+            self.print('    {}.{}: {}'.format(class_name, attr, count))
+
     def do_help(self, arg):  # {{{2
         'List available commands with "help" or detailed help with "help cmd".'
         # HACK: This is pretty much the cmd.Cmd.do_help method copied verbatim,
@@ -435,18 +1176,21 @@ class PRAWToys(URLToysClone):  # {{{1
             'Commands for adding items:', [
                 'saved', 'user', 'user_comments', 'user_submissions', 'mine',
                 'my_comments', 'my_submissions', 'thread', 'get_from',
-                'load_from_file'],
+                'load_from_file', 'load_ids', 'generate'],
 
             'Commands for filtering items:', [
                 'submission', 'comment', 'sub', 'nsub', 'sfw', 'nsfw', 'self',
-                'nself', 'title', 'ntitle', 'rm'],
+                'nself', 'title', 'ntitle', 'body', 'nbody', 'where', 'rm',
+                'nodupes', 'uniq'],
 
             'Commands for viewing list items:', [
                 'ls', 'head', 'tail', 'view_subs', 'vs', 'get_links', 'gl',
-                'oi', 'open_index', 'lsub'],
+                'oi', 'open_index', 'lsub', 'search', 'stats'],
 
             'Commands for interacting with items:', [
-                'open', 'save_to_file', 'upvote', 'clear_vote'])
+                'open', 'save_to_file', 'export', 'upvote', 'clear_vote'],
+
+            'Commands for background jobs:', ['jobs', 'fg', 'kill'])
 
         names = self.get_names()
         misc_commands = []
@@ -516,6 +1260,29 @@ class PRAWToys(URLToysClone):  # {{{1
                    end='')
         self.print(self.reddit_session.user.link_karma)
 
+    def do_watch_fetches(self, arg):  # {{{2
+        """watch_fetches [on|off]
+
+        Turn lazy fetch watching on or off, or see whether it's on.
+
+        praw fetches a whole comment or submission from reddit when you read
+        an attribute it doesn't have yet, and waits for the response. PRAWToys
+        tries hard to never do that, since a filter that did it would make a
+        request for every single item. With this on, after every command
+        you'll see how many times it happened anyway, and for what.
+        """
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('watch_fetches =',
+                       'on' if self.watch_fetches else 'off')
+        elif args[0].lower() in ['on', 'off']:
+            self.watch_fetches = args[0].lower() == 'on'
+            praw_tools.watch_lazy_fetches(self.watch_fetches)
+            praw_tools.take_lazy_fetches()
+        else:
+            self.print('Expected "on" or "off", not:', args[0])
+
     def do_width(self, arg):  # {{{2
         """width [width]
 
@@ -530,6 +1297,134 @@ class PRAWToys(URLToysClone):  # {{{1
         else:
             self.print("width =", praw_tools.ASSUMED_CONSOLE_WIDTH)
 
+    def do_workers(self, arg):  # {{{2
+        """workers [n]
+
+        Set or view how many requests PRAWToys will have in flight at once for
+        commands like upvote. More workers won't get you past reddit's rate
+        limit, but they do stop PRAWToys from sitting around waiting on one
+        request at a time.
+        """
+        args = arg.split()
+
+        if len(args) > 0:
+            praw_tools.WORKERS = max(1, int(args[0]))
+        else:
+            self.print("workers =", praw_tools.WORKERS)
+
+    def do_compact(self, arg):  # {{{2
+        """compact [on|off]
+
+        Turn compact mode on or off, or see whether it's on.
+
+        In compact mode, new items are stored as small read-only copies that
+        only hold the fields PRAWToys needs, instead of whole praw objects.
+        That takes about a tenth of the memory, which matters once you're
+        dealing with hundreds of thousands of items. Items are swapped back
+        for full praw objects automatically when a command like upvote needs
+        them.
+
+        Items that are already in the list aren't changed.
+        """
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('compact =', 'on' if self.compact_items else 'off')
+        elif args[0].lower() in ['on', 'off']:
+            self.compact_items = args[0].lower() == 'on'
+        else:
+            self.print('Expected "on" or "off", not:', args[0])
+
+    def do_async(self, arg):  # {{{2
+        """async [on|off]
+
+        Turn the asyncio network layer on or off, or see whether it's on.
+
+        With it on, get_from, thread, load_ids, upvote and clear_vote talk to
+        reddit straight from one event loop, over a few kept-alive
+        connections, instead of going through praw and a thread per request.
+        Items come back compact (see the compact command) since no praw
+        objects get made, and voting doesn't need to fetch the full objects
+        first. Everything else still goes through praw. Both share the same
+        rate limit.
+        """
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('async =', 'on' if self.async_network else 'off')
+        elif args[0].lower() in ['on', 'off']:
+            self.async_network = args[0].lower() == 'on'
+        else:
+            self.print('Expected "on" or "off", not:', args[0])
+
+    def async_client(self):  # {{{2
+        """ Get the praw_tools.AsyncReddit for async_network, starting its
+        event loop if it isn't running yet.
+        """
+        # get_from's sources can get here from several threads at once.
+        with self._async_lock:
+            if self.async_reddit is None:
+                self.event_loop = praw_tools.EventLoopThread()
+                self.async_reddit = praw_tools.AsyncReddit(
+                    self.reddit_session)
+
+                if self.profiler is not None:
+                    self.async_reddit.observer = self.profiler.request_done
+
+        return self.async_reddit
+
+    def iterate_async(self, async_iterable):  # {{{2
+        """ Turn one of AsyncReddit's async iterators into a normal one, so
+        add_items and friends can use it.
+        """
+        self.async_client()
+        return self.event_loop.iterate(async_iterable)
+
+    def cached(self, source, get_items, limit=None,  # {{{2
+               incremental=False):
+        """ Get a function that returns the items from a listing.
+
+        If caching is on, the items come from self.cache when possible. If
+        not, this just calls get_items(limit). See item_cache.ItemCache.fetch
+        for what the arguments mean.
+        """
+        if self.cache is None:
+            return lambda: get_items(limit)
+
+        return lambda: self.cache.fetch(source, get_items, limit, incremental)
+
+    def do_cache(self, arg):  # {{{2
+        """cache [on|off|stats|clear]
+
+        Cache fetched items on disk so that running the same get_from, user or
+        thread command again doesn't download everything again. Listings
+        sorted by 'new' (including user listings) only download what's newer
+        than the cached copy. Anything else is reused for a day.
+
+        With no argument, shows whether the cache is on.
+        """
+        args = arg.split()
+        subcommand = args[0].lower() if args else ''
+
+        if subcommand == 'on':
+            if self.cache is None:
+                self.cache = item_cache.ItemCache()
+        elif subcommand == 'off':
+            if self.cache is not None:
+                self.cache.close()
+                self.cache = None
+        elif subcommand in ['stats', 'clear'] and self.cache is None:
+            self.print('The cache is off. Try "cache on" first.')
+        elif subcommand == 'stats':
+            for key, value in sorted(self.cache.stats().items()):
+                self.print('{}: {}'.format(key, value))
+        elif subcommand == 'clear':
+            self.cache.clear()
+        elif subcommand == '':
+            self.print('cache =', 'off' if self.cache is None else 'on')
+        else:
+            self.print('Unknown cache command:', subcommand)
+
     # Commands to add items. {{{2
     @logged_in_command  # do_saved {{{3
     @loading_wrapper
@@ -541,65 +1436,81 @@ class PRAWToys(URLToysClone):  # {{{1
         self.add_items(
             self.reddit_session.user.get_saved(limit=None))
 
+    def get_from_users(self, arg, listing):  # {{{3
+        ''' do_user, do_user_comments and do_user_submissions call this.
+
+        arg is the command's argument string, like 'spez kn0thing 100'.
+        listing is the name of the praw.objects.Redditor method that gets the
+        items we want, like 'get_overview'. Every user is fetched at once.
+        '''
+        args = arg.split()
+
+        # The last argument is only a limit if there's a username before it.
+        limit = None
+        if len(args) > 1:
+            try:
+                limit = parse_limit(args[-1])
+            except ValueError:
+                pass
+            else:
+                args = args[:-1]
+
+        def source(username):
+            def get_items(limit):
+                user = self.reddit_session.get_redditor(username)
+                return getattr(user, listing)(limit=limit)
+
+            # User listings are always newest first.
+            return self.cached(
+                'u/{} {}'.format(username.lower(), listing),
+                get_items, limit, incremental=True)
+
+        self.add_items(praw_tools.fetch_all([source(i) for i in args]))
+
     @loading_wrapper  # do_user {{{3
     def do_user(self, arg):
-        '''user <username> [limit=None]
+        '''user <username>... [limit=None]
 
-        Get up to [limit] of a user's comments and submissions. If 'limit' is
-        left blank, get ALL of them. Which, by the way, could take awhile.
+        Get up to [limit] of each user's comments and submissions. If 'limit'
+        is left blank, get ALL of them. Which, by the way, could take awhile.
+
+        If you give more than one username, they're all fetched at the same
+        time and added in the order you listed them.
         '''
         # If you change this docstring, also change the ones for
         # do_user_comments and do_user_submissions.
         # Unit-tested.
-        args = arg.split()
-        user = self.reddit_session.get_redditor(arg.split()[0])
-
-        try:
-            limit = int(args[1])
-        except IndexError:
-            limit = None
-
-        self.add_items(list(user.get_overview(limit=limit)))
+        self.get_from_users(arg, 'get_overview')
 
     @loading_wrapper  # do_user_comments {{{3
     def do_user_comments(self, arg):
-        '''user_comments <username> [limit=None]
+        '''user_comments <username>... [limit=None]
+
+        Get up to [limit] of each user's comments. If 'limit' is left blank,
+        get ALL of them. Which, by the way, could take awhile.
 
-        Get up to [limit] of a user's comments. If 'limit' is left blank, get
-        ALL of them. Which, by the way, could take awhile.
+        If you give more than one username, they're all fetched at the same
+        time and added in the order you listed them.
         '''
         # If you change this docstring, also change the ones for do_user and
         # do_user_submissions.
         # Unit-tested.
-        args = arg.split()
-        user = self.reddit_session.get_redditor(arg.split()[0])
-
-        try:
-            limit = int(args[1])
-        except IndexError:
-            limit = None
-
-        self.add_items(list(user.get_comments(limit=limit)))
+        self.get_from_users(arg, 'get_comments')
 
     @loading_wrapper  # do_user_submissions {{{3
     def do_user_submissions(self, arg):
-        '''user_submissions <username> [limit=None]
+        '''user_submissions <username>... [limit=None]
 
-        Get up to [limit] of a user's submissions. If 'limit' is left blank,
-        get ALL of them. Which, by the way, could take awhile.
+        Get up to [limit] of each user's submissions. If 'limit' is left
+        blank, get ALL of them. Which, by the way, could take awhile.
+
+        If you give more than one username, they're all fetched at the same
+        time and added in the order you listed them.
         '''
         # If you change this docstring, also change the ones for do_user and
         # do_user_comments.
         # Unit-tested.
-        args = arg.split()
-        user = self.reddit_session.get_redditor(arg.split()[0])
-
-        try:
-            limit = int(args[1])
-        except IndexError:
-            limit = None
-
-        self.add_items(list(user.get_submitted(limit=limit)))
+        self.get_from_users(arg, 'get_submitted')
 
     @logged_in_command  # do_mine {{{3
     @loading_wrapper
@@ -636,99 +1547,275 @@ class PRAWToys(URLToysClone):  # {{{1
     @loading_wrapper  # do_thread {{{3
     def do_thread(self, arg):
         '''thread <submission id> [n=10,000]: get <n> comments from thread.
-        BUGGY
-        '''
-        # raise NotImplementedError
 
+        "load more comments" links are followed a few at a time, shallow and
+        high-scoring branches first, until there are <n> comments or the
+        thread runs out. <n> can be "all".
+        '''
         args = arg.split()
-        sub_id = args[0]
-        self.print('Retrieving thread id: {sub_id}'.format(**locals()))
 
         try:
-            n = int(args[1])
-        except IndexError as ValueError:
-            n = 10000
-
-        sub = praw.objects.Submission.from_id(
-            self.reddit_session,
-            sub_id)
-
-        self.print('Retrieving comments...')
-        # while True:
-        #     coms = praw.helpers.flatten_tree(sub.comments)
-        #     ncoms = 0
+            sub_id = args[0]
+        except IndexError:
+            self.print('No submission id specified!')
+            return
 
-        #    for i in coms:
-        #        if type(i) != praw.objects.MoreComments:
-        #            ncoms += 1
+        try:
+            n = parse_limit(args[1])
+        except IndexError:
+            n = 10000
+        except ValueError:
+            self.print('Not a number:', args[1])
+            return
 
-        #    self.print '\r{ncoms}/{n}'.format(**locals()),
+        self.print('Retrieving thread id: {sub_id}'.format(**locals()))
 
-        #    if ncoms >= n: break
-        #    sub.replace_more_comments(limit=1)
+        def get_items(limit):
+            if self.async_network:
+                return self.iterate_async(
+                    self.async_client().thread(sub_id, limit))
 
-        # self.print()
+            return praw_tools.fetch_thread(self.reddit_session, sub_id, limit)
 
-        # self.add_items(list(coms))
-        self.add_items(
-            i for i in praw.helpers.flatten_tree(sub.comments)
-            if type(i) != praw.objects.MoreComments
-        )
+        self.add_items(self.cached('thread ' + sub_id, get_items, n)())
 
     @loading_wrapper  # do_get_from {{{3
     def do_get_from(self, arg):
-        ''' get_from <subreddit> [n=1000] [sort=hot]
+        ''' get_from <subreddit>... [n=1000] [sort=hot]
 
-        Get [n] submissions from /r/<subreddit>, sorting by [sort]. [sort] can
-        be 'hot', 'new', 'top', 'controversial', and maybe 'rising' (which is
-        untested).
+        Get [n] submissions from each /r/<subreddit>, sorting by [sort]. [sort]
+        can be 'hot', 'new', 'top', 'controversial', and maybe 'rising' (which
+        is untested).
 
         You can set [n] to 'none' or 'all' (case insensitive) and you'll get
         EVERYTHING from the chosen subreddit. This is obviously going to take
-        awhile, depending on the subreddit. 
+        awhile, depending on the subreddit.
+
+        If you list more than one subreddit, like "get_from aww pics 100 top",
+        they're all fetched at the same time and added in the order you
+        listed them. To use [sort], you have to give [n] too.
         '''
         # Unit-tested.
 
-        args      = arg.split()
-        subreddit = args[0]
+        args       = arg.split()
+        subreddits = args[:1]
+        limit      = 1000
+        sort       = 'hot'
 
-        if len(args) > 1:
-            if args[1].lower() in ['none', 'all']:
-                limit = None
-            else:
-                limit = int(args[1])
-        else:
-            limit = 1000
+        # The first argument is always a subreddit, even if it's called 'all'.
+        for index, i in enumerate(args[1:], 1):
+            try:
+                limit = parse_limit(i)
+            except ValueError:
+                subreddits.append(i)
+                continue
 
-        if len(args) > 2:
-            sort = args[2]
-        else:
-            sort = 'hot'
+            if index + 1 < len(args):
+                sort = args[index + 1]
+
+            break
+
+        def source(subreddit):
+            def get_items(limit):
+                if self.async_network:
+                    return self.iterate_async(self.async_client().listing(
+                        'r/{}/search'.format(subreddit), limit,
+                        {'q': '', 'sort': sort, 'restrict_sr': 'on'}))
 
-        sub = self.reddit_session.get_subreddit(subreddit)
+                sub = self.reddit_session.get_subreddit(subreddit)
+                return sub.search('', limit=limit, sort=sort)
 
-        self.add_items(sub.search('', limit=limit, sort=sort))
+            return self.cached(
+                'r/{} search {}'.format(subreddit.lower(), sort.lower()),
+                get_items, limit, incremental=sort.lower() == 'new')
+
+        self.add_items(praw_tools.fetch_all([source(i) for i in subreddits]))
 
     @loading_wrapper  # do_load_from_file {{{3
     def do_load_from_file(self, arg):
-        '''load_from_file <filename>
+        '''load_from_file <filename> [--sub <sub>...] [--limit <n>] [--mmap]
 
-        Load the items stored in <filename>.pickle. This is generally to get
+        Load the items stored in <filename>.jsonl. This is generally to get
         items stored with the save_to_file command.
 
-        Be careful when openning pickle files from sources you don't trust!
-        It's very easy for a hacker to write malicious pickle files.
+        --sub only loads items from the given subreddit(s), and --limit stops
+        after <n> items. Either way, the file is read one item at a time, so
+        it doesn't matter how big it is.
 
-        UNTESTED
+        If there's no <filename>.jsonl but there's a <filename>.pickle from an
+        older version of PRAWToys, that gets loaded instead. Be careful when
+        opening pickle files from sources you don't trust! It's very easy for
+        a hacker to write malicious pickle files.
+
+        --mmap replaces the current list with the file itself, opened
+        read-only, instead of loading anything. Viewing and filtering work
+        straight off the file, so even a dump with millions of items opens
+        instantly. Adding items to the list loads the rest of the file into
+        memory.
+
+        If the file was saved with a search index (see save_to_file), that
+        gets loaded too, as long as the whole file is being loaded into an
+        empty list or --mmap is used.
+        '''
+        args = arg.split()
+
+        if len(args) == 0:
+            self.print('No file specified!')
+            return
+
+        name, subreddits, limit = args[0], None, None
+        option = None
+        use_mmap = False
+
+        for i in args[1:]:
+            if i == '--mmap':
+                use_mmap = True
+            elif i in ['--sub', '--limit']:
+                option = i
+            elif option == '--sub':
+                subreddits = (subreddits or []) + [i]
+            elif option == '--limit':
+                limit = parse_limit(i)
+            else:
+                self.print('Unexpected argument:', i)
+                return
+
+        filename = name + session_file.EXTENSION
+
+        if not os.path.exists(filename) and os.path.exists(name + '.pickle'):
+            self.print('Loading an old-style pickle file. --sub and --limit'
+                       ' are ignored. Save it again to convert it.')
+
+            with open(name + '.pickle', 'rb') as file_:
+                self.add_items(pickle.load(file_))
+
+            return
+
+        whole_file = (len(self.items) == 0 and subreddits is None
+                      and limit is None)
+
+        try:
+            if use_mmap:
+                self.map_session(filename, subreddits, limit)
+            else:
+                self.add_items(
+                    session_file.read_session(filename, subreddits, limit))
+
+                if whole_file:
+                    self.load_text_index(filename)
+        except (OSError, ValueError) as error:
+            self.print("Couldn't load {}: {}".format(filename, error))
+
+    def load_text_index(self, filename, store=None):  # {{{3
+        ''' Give store (self.items by default) the search index saved next to
+        the session file filename, if there's an up-to-date one. Returns the
+        index, or None if there wasn't one.
+        '''
+        store = self.items if store is None else store
+        index = text_index.TextIndex.load(filename + text_index.EXTENSION,
+                                          os.path.getsize(filename))
+
+        if index is None or len(index) != len(store):
+            return None
+
+        store.set_text_index(index)
+        return index
+
+    def map_session(self, filename, subreddits=None, limit=None):  # {{{3
+        ''' Replace self.items with a memory-mapped session file. '''
+        view = session_file.SessionView(
+            session_file.MappedSession(filename))
+        store = self.make_item_store(view)
+        index = self.load_text_index(filename, store)
+        positions = range(len(store))
+
+        if subreddits is not None:
+            positions = store.positions(
+                'subreddit', *[i.lower() for i in subreddits])
+
+        if limit is not None:
+            positions = positions[:limit]
+
+        if len(positions) < len(store):
+            store = store.take(positions)
+
+            # take doesn't bring the text index along, but cutting down the
+            # one we just loaded is still a lot quicker than reading every
+            # item to build a new one.
+            if index is not None:
+                store.set_text_index(index.take(positions))
+
+        self.history.push(self.whole_list_change(self.items))
+        self._items = store
+
+    @loading_wrapper  # hydrate_ids {{{3
+    def hydrate_ids(self, thing_ids, missing):
+        ''' do_load_ids calls this. See praw_tools.hydrate. '''
+        if self.async_network:
+            self.add_items(self.iterate_async(
+                self.async_client().info(thing_ids, missing)))
+            return
+
+        self.add_items(
+            praw_tools.hydrate(self.reddit_session, thing_ids, missing))
+
+    def do_load_ids(self, arg):  # {{{3
+        '''load_ids <filename>
+
+        Load comments and submissions by id. <filename> should have one id per
+        line, either a fullname like t3_5abcde or t1_d9xyz12, or a bare id
+        (which is tried as a submission first, then as a comment). Blank lines
+        and lines starting with # are ignored.
+
+        Ids are looked up 100 at a time, several requests at once, and you'll
+        get a list of any that reddit couldn't find at the end.
         '''
         try:
-            filename = arg.split()[0] + '.pickle'
+            filename = arg.split()[0]
         except IndexError:
             self.print('No file specified!')
             return
 
-        with open(filename, 'rb') as file_:
-            self.items += pickle.load(file_)
+        try:
+            with open(filename, encoding='utf-8') as file_:
+                thing_ids = [i.strip() for i in file_]
+        except OSError as error:
+            self.print("Couldn't read {}: {}".format(filename, error))
+            return
+
+        thing_ids = [i for i in thing_ids if i and not i.startswith('#')]
+        missing = []
+
+        self.hydrate_ids(thing_ids, missing)
+
+        if missing:
+            self.print("Couldn't find {} of {} ids:".format(
+                len(missing), len(thing_ids)))
+
+            for i in missing:
+                self.print(' ', i)
+
+    @loading_wrapper  # do_generate {{{3
+    def do_generate(self, arg):
+        '''generate <n> [seed]
+
+        Add <n> made-up comments and submissions, for trying things out on a
+        big list without waiting on reddit. The same [seed] always gives you
+        the same items. See synthetic.py for what they look like.
+        '''
+        args = arg.split()
+
+        try:
+            n = int(args[0])
+            seed = int(args[1]) if len(args) > 1 else 0
+        except IndexError:
+            self.print('How many items?')
+            return
+        except ValueError:
+            self.print('Not a number:', ' '.join(args))
+            return
+
+        self.add_items(synthetic.compact_items(n, seed))
 
     # Commands for filtering. {{{2
     def do_submission(self, arg):  # {{{3
@@ -736,14 +1823,14 @@ class PRAWToys(URLToysClone):  # {{{1
 
         Filter out all but links and self posts.'''
         # Unit-tested.
-        self.filter_items(praw_tools.is_submission)
+        self.filter_by_index('kind', ['submission'])
 
     def do_comment(self, arg):  # {{{3
         '''comment
 
         Filter out all but comments.'''
         # Unit-tested.
-        self.filter_items(praw_tools.is_comment)
+        self.filter_by_index('kind', ['comment'])
 
     def sub_nsub(self, invert, arg):  # {{{3
         ''' do_sub calls this with invert=False, and vice versa for do_nsub.
@@ -754,10 +1841,7 @@ class PRAWToys(URLToysClone):  # {{{1
         '''
         target_subs = [i.lower() for i in arg.split()]
 
-        def filter_func(item):
-            return item.subreddit.display_name.lower() in target_subs
-
-        self.filter_items(invert=invert, f=filter_func)
+        self.filter_by_index('subreddit', target_subs, invert=invert)
 
     def do_sub(self, arg):  # {{{3
         '''
@@ -779,15 +1863,8 @@ class PRAWToys(URLToysClone):  # {{{1
         ''' See the docstring for sub_nsub. filter_sfw == True means filter out sfw.
         Otherwise, filters out nsfw.
         '''
-
-        def filter_func(item):
-            if praw_tools.is_comment(item):
-                return True
-
-            sfw = not item.over_18
-            return filter_sfw != sfw
-
-        self.filter_items(filter_func)
+        # Comments are indexed under None, so they always get kept.
+        self.filter_by_index('over_18', [filter_sfw, None])
 
     def do_sfw(self, arg):  # {{{3
         '''sfw: filter out anything nsfw. Keeps comments.'''
@@ -801,9 +1878,8 @@ class PRAWToys(URLToysClone):  # {{{1
         ''' See the docstring for sub_nsub. invert==True will filter out all
         self-posts.
         '''
-        self.filter_items(
-            lambda item:
-                praw_tools.is_comment(item) or (invert != item.is_self))
+        # Comments are indexed under None, so they always get kept.
+        self.filter_by_index('is_self', [not invert, None])
 
     def do_self(self, arg):  # {{{3
         '''self: filter out all but self-posts (and comments)'''
@@ -813,29 +1889,49 @@ class PRAWToys(URLToysClone):  # {{{1
         '''nself: filter out all self-posts'''
         self.self_nself(invert=True, arg=arg)
 
-    def title_ntitle(self, invert, arg):  # {{{3
-        ''' See the docstring for sub_nsub. invert==True means filter out
-        matches, not non-matches.
+    def match_filter(self, get_text, invert, arg):  # {{{3
+        ''' The guts of title, ntitle, body and nbody. See parse_pattern for
+        what arg can be.
+
+        get_text takes an item and returns the text to search, or None if the
+        item should be left alone no matter what. invert==True means filter
+        out matches, not non-matches.
         '''
+        try:
+            search = parse_pattern(arg).search
+        except ValueError as error:
+            self.print(error)
+            return
 
         def filter_func(item):
-            if praw_tools.is_comment(item):
-                return True
+            text = get_text(item)
 
-            search_success = bool(re.search(arg, item.title))
+            if text is None:
+                return True
 
-            return invert != search_success
+            return invert != (search(text) is not None)
 
         self.filter_items(filter_func)
 
+    def title_ntitle(self, invert, arg):  # {{{3
+        ''' See the docstring for sub_nsub. invert==True means filter out
+        matches, not non-matches.
+        '''
+        self.match_filter(praw_tools.item_title, invert, arg)
+
     def do_title(self, arg):  # {{{3
         '''
-        title <regex>: filter out anything whose title doesn't match <regex>
+        title [-i] [-l] [-any] <regex>: filter out anything whose title doesn't
+        match <regex>
 
         You can have spaces in your command, like "title asdf fdsa", but don't
         put any quotation marks if you don't want them taken as literal
         characters!
 
+        -i ignores case, and -l searches for <regex> as plain text instead.
+        With -any, every word is a separate pattern and anything matching at
+        least one of them is kept, like "title -i -any cat dog hamster".
+
         Also implicitely filters out comments.
         '''
 
@@ -843,57 +1939,216 @@ class PRAWToys(URLToysClone):  # {{{1
 
     def do_ntitle(self, arg):  # {{{3
         '''
-        ntitle <regex>: filter out anything whose title matches <regex>
+        ntitle [-i] [-l] [-any] <regex>: filter out anything whose title
+        matches <regex>
 
         You can have spaces in your command, like "ntitle asdf fdsa", but don't
         put any quotation marks if you don't want them taken as literal
         characters!
 
+        Takes the same options as title. With -any, anything matching any of
+        the patterns is filtered out.
+
         Also implicitely filters out comments.
         '''
         self.title_ntitle(invert=True, arg=arg)
 
+    def body_nbody(self, invert, arg):  # {{{3
+        ''' Like title_ntitle, but for comment text. Submissions are always
+        kept.
+        '''
+        self.match_filter(
+            lambda i: praw_tools.item_body(i) if praw_tools.is_comment(i)
+            else None,
+            invert, arg)
+
+    def do_body(self, arg):  # {{{3
+        '''body [-i] [-l] [-any] <regex>
+
+        Filter out any comment whose text doesn't match <regex>. Takes the
+        same options as title. Submissions are left alone.
+        '''
+        self.body_nbody(invert=False, arg=arg)
+
+    def do_nbody(self, arg):  # {{{3
+        '''nbody [-i] [-l] [-any] <regex>
+
+        Filter out any comment whose text matches <regex>. Takes the same
+        options as title. Submissions are left alone.
+        '''
+        self.body_nbody(invert=True, arg=arg)
+
+    def do_where(self, arg):  # {{{3
+        '''where <expression>: keep only the items that match <expression>
+
+        For example:
+
+        where kind==submission and sub in (aww, pics) and not self
+        where (title~/foo/i or body~/foo/i) and score>100
+        where comment or not nsfw
+
+        Fields: kind, sub, author, nsfw, self, title, body, url, id, score,
+        created. Operators: == != < <= > >= ~ (regex match) !~ (no match),
+        plus "in (a, b, ...)" and "not in (...)". Combine them with and, or,
+        not and parentheses. A field on its own, like "self", means
+        field==true. Quote anything with spaces or slashes in it.
+
+        This is a lot faster than a chain of sub/self/title/etc. commands,
+        since it only goes through the list once. It's also only one step to
+        undo.
+        '''
+        try:
+            filter_ = item_filter.parse(arg)
+        except ValueError as error:
+            self.print(error)
+            return
+
+        self.keep_positions(filter_.positions(self.items))
+
     # Commands for viewing list items. {{{2
     def do_view_subs(self, arg):  # {{{3
         '''view_subs: shows how many of the list items are from which sub'''
-        frequency_by_sub = {}
+        self.do_stats('by=sub')
+    do_vs = do_view_subs # {{{3
 
-        for i in self.items:
-            sub_name = i.subreddit.display_name.lower()
+    def do_stats(self, arg):  # {{{3
+        '''stats [by=<field>] [metric=<metric>] [top=<n>]
 
-            try:
-                frequency_by_sub[sub_name] += 1
-            except KeyError:
-                frequency_by_sub[sub_name] = 1
+        Group the list by <field> and show a total for each group. For
+        example:
 
-        # Convert to [(k, v)] and then sort (ascending) by v.
-        frequency_by_sub = list(frequency_by_sub.items())
-        frequency_by_sub.sort(key=lambda item: item[1])
+        stats by=author                  (how many items each author has)
+        stats by=sub metric=sum(score)   (total score in each subreddit)
+        stats by=hour metric=mean(score) (average score by hour posted, UTC)
 
-        # This tells us how much we should rjust the numbers in our printout.
-        max_number_length = len(str(len(self.items)))
+        <field> can be sub, author, kind, nsfw, self, hour, weekday or day.
+        Defaults to sub. <metric> can be count, or sum, mean, min or max of
+        score or created. Defaults to count. top=<n> only shows the <n>
+        biggest groups.
 
-        for sub, number in frequency_by_sub:
-            self.print('{number} : /r/{sub}'.format(sub=sub,
-                    number=str(number).rjust(max_number_length)))
-    do_vs = do_view_subs # {{{3
+        This is fast even on huge lists, especially with numpy installed.
+        '''
+        by, metric, field, top = 'sub', 'count', None, None
+
+        try:
+            for i in arg.split():
+                option, equals, value = i.partition('=')
+
+                if not equals:
+                    raise ValueError('Expected option=value, not: ' + i)
+                elif option == 'by':
+                    by = value.lower()
+                    aggregate.check_group(by)
+                elif option == 'metric':
+                    metric, field = aggregate.parse_metric(value)
+                elif option == 'top':
+                    top = int(value)
+                else:
+                    raise ValueError('Unknown option: ' + option)
+        except ValueError as error:
+            self.print(error)
+            return
+
+        totals = aggregate.aggregate(self.items, by, metric, field)
+
+        # Ascending, so the biggest ones end up next to the prompt.
+        rows = sorted(totals.items(), key=lambda row: row[1])
+
+        if top is not None:
+            rows = rows[-top:] if top > 0 else []
+
+        if by in aggregate.TIME_GROUPS:
+            rows.sort()
+
+        def format_total(total):
+            if metric == 'mean' or total != int(total):
+                return '{:.2f}'.format(total)
+
+            return str(int(total))
+
+        prefixes = {'sub': '/r/', 'author': '/u/'}
+        totals = [format_total(total) for key, total in rows]
+        rjust = max((len(i) for i in totals), default=0)
+
+        lines = []
+
+        for (key, _), total in zip(rows, totals):
+            if by == 'hour':
+                key = '{:02}:00'.format(key)
+
+            lines.append('{total} : {prefix}{key}'.format(
+                total=total.rjust(rjust), prefix=prefixes.get(by, ''),
+                key=key))
+
+        self.page_lines(len(lines), lines.__getitem__)
 
     def do_lsub(self, arg): # {{{3
         '''lsub <sub>...: show all items from the given sub(s)'''
-        # TODO: Refactor! This is so ugly.
-        subs = arg.split()
-        items_with_indicies = enumerate(self.items)
-        items_with_indicies = [(i, v) for i, v in items_with_indicies if
-            v.subreddit.display_name.lower() in subs]
+        subs = [i.lower() for i in arg.split()]
+        positions = self.items.positions('subreddit', *subs)
 
-        if len(items_with_indicies) <= 0:
+        if len(positions) <= 0:
             self.print('Nothing matched.')
             return
 
-        rjust = max(i for i, v in items_with_indicies)
-        rjust = len(str(rjust))
-        for i, v in items_with_indicies:
-            self.print_item(i, v, rjust)
+        self.print_items(positions)
+
+    def do_search(self, arg):  # {{{3
+        '''search [-keep] <words>...
+
+        Show every item whose title or text has all of the given words. Put
+        "or" between words to match either one, and "quotes" around words that
+        have to be right next to each other. Case and punctuation don't
+        matter. For example:
+
+        search cat "cute dog" or hamster
+
+        Each match is shown with the words it matched. -keep filters out
+        everything that didn't match instead of showing the matches.
+
+        The first search builds an index of every word in the list, which can
+        take a while. After that, searches are very fast, even on big lists.
+        '''
+        args = arg.split(None, 1)
+        keep = args[:1] == ['-keep']
+
+        if keep:
+            query = args[1] if len(args) > 1 else ''
+        else:
+            query = arg
+
+        try:
+            start = time.perf_counter()
+            index = self.items.text_index()
+            indexed = time.perf_counter()
+
+            positions = index.search(
+                query, lambda i: self.items.text(self.items[i]))
+        except ValueError as error:
+            self.print(error)
+            return
+
+        searched = time.perf_counter()
+
+        if keep:
+            self.keep_positions(positions)
+        elif positions:
+            rjust = len(str(positions[-1]))
+
+            def lines():
+                for i in positions:
+                    yield self.item_line(i, self.items[i], rjust)
+                    yield '{}  matched: {}'.format(
+                        ' ' * rjust, ', '.join(index.matched_words(i, query)))
+
+            self.print_lines(lines())
+
+        if indexed - start >= 0.01:
+            self.print('Indexed {} items in {:.2f}s.'.format(
+                len(index), indexed - start))
+
+        self.print('{} match(es) in {:.1f}ms.'.format(
+            len(positions), (searched - indexed) * 1000))
 
     def do_get_links(self, arg): # {{{3
         ''' get_links [sub]...
@@ -905,26 +2160,44 @@ class PRAWToys(URLToysClone):  # {{{1
         '''
         target_items = self.arg_to_matching_subs(arg)
 
-        with open('urls.html', 'w', encoding='utf-8') as html_file:
-            html_file.write(
-                '<html>\n'
-                '    <head>\n'
-                '        <meta charset="utf-8">\n'
-                '    </head><body>\n')
+        # Big lists get split up into pages, with urls.html linking to all of
+        # them. See export.export_html.
+        export.export_html(target_items, 'urls.html')
 
-            for item in target_items:
-                item_string = praw_tools.praw_object_to_string(item)
-                item_url = praw_tools.praw_object_url(item)
+        webbrowser.open('file://' + os.getcwd() + '/urls.html')
+    do_gl = do_get_links # {{{3
 
-                html_file.write(
-                    '<a href="{item_url}">{item_string}</a><br>'.format(
-                        **locals()))
 
-            html_file.write('</body></html>')
+    def do_export(self, arg): # {{{3
+        '''export <format> <file> [sub]...
 
-        webbrowser.open('file://' + os.getcwd() + '/urls.html')
-    do_gl = do_get_links # {{{3
+        Write everything (or everything in the given subreddit(s)) to <file>.
+        <format> is one of html, csv, json or md (Markdown). For example:
+
+        export csv saved.csv
+        export md aww.md aww
+
+        Big HTML exports are split up into pages, and <file> links to each of
+        them. CSV and JSON exports have the title, text, subreddit, author,
+        score, time and URL of each item.
+        '''
+        args = arg.split(None, 2)
+
+        if len(args) < 2:
+            self.print('Expected a format and a filename. See "help export".')
+            return
+
+        format_, filename = args[:2]
 
+        try:
+            count = export.export(
+                self.arg_to_matching_subs(args[2] if len(args) > 2 else None),
+                format_, filename)
+        except ValueError as error:
+            self.print(error)
+            return
+
+        self.print('Exported {} item(s) to {}.'.format(count, filename))
 
     # Commands for doing stuff with the items. {{{2
     def open(self, index_or_item): # {{{3
@@ -969,54 +2242,120 @@ class PRAWToys(URLToysClone):  # {{{1
 
     do_oi = do_open_index # {{{3
 
+    def vote_items(self, vote): # {{{3
+        ''' Vote on every item in self.items and print a report.
+
+        vote is passed straight through to praw_tools.vote_all, so it can be
+        'upvote', 'clear_vote', or a function that takes an item. A ctrl-c
+        stops sending votes, and the report covers the ones that were sent.
+        '''
+        job = self.job
+        stop = job.stop if job is not None else threading.Event()
+
+        def progress(done, total):
+            if job is not None:
+                job.progress = '{done}/{total} votes'.format(**locals())
+                return
+
+            self.print('\r{done}/{total}'.format(**locals()), end='')
+            self.stdout.flush()
+
+        directions = {'upvote': 1, 'clear_vote': 0}
+
+        if self.async_network and vote in directions:
+            # All reddit needs to vote is the fullname, and compact items
+            # have those too.
+            client = self.async_client()
+            report = self.event_loop.run(client.vote_all(
+                [i.fullname for i in self.items], directions[vote],
+                progress, stop), stop)
+        else:
+            # Compact items don't know how to vote, so swap them back for the
+            # real praw objects first.
+            items = praw_tools.rehydrate(self.items, self.reddit_session)
+            report = praw_tools.vote_all(items, vote, progress=progress,
+                                         stop=stop)
+
+        self.print()
+        self.print(report.summary())
+
+        for index, error in report.failed:
+            self.print('  {index}: {error!r}'.format(**locals()))
+
+        return report
+
+    def confirm(self, arg, question): # {{{3
+        ''' Ask question, unless the command's arguments (arg) include -y.
+        Returns whether to go ahead.
+        '''
+        if '-y' in arg.split():
+            return True
+
+        if self.job is not None:
+            self.print("Can't ask if you're sure in the background. Add -y"
+                       " if you are.")
+            return False
+
+        return ahto_lib.yes_no(False, question)
+
     def do_save_to_file(self, arg): # {{{3
-        '''save_to_file <filename>
+        '''save_to_file <filename> [--index]
 
-        Save the current items to <filename>.pickle, so that you can load them
+        Save the current items to <filename>.jsonl, so that you can load them
         later with load_from_file.
 
-        UNTESTED
+        Only the fields PRAWToys uses are saved, so loaded items are compact
+        (see the compact command).
+
+        --index also saves the search index (see the search command) next to
+        the file, so it doesn't need to be built again after loading.
         '''
+        args = arg.split()
+
         try:
-            filename = arg.split()[0] + '.pickle'
-        except ValueError:
+            filename = args[0] + session_file.EXTENSION
+        except IndexError:
             self.print('No file specified!')
             return
 
-        with open(filename, 'wb') as file_:
-            pickle.dump(self.items, file_)
+        session_file.write_session(filename, self.items)
+
+        if '--index' in args[1:]:
+            self.items.text_index().save(
+                filename + text_index.EXTENSION, os.path.getsize(filename))
 
     @logged_in_command # do_upvote {{{3
     def do_upvote(self, arg):
-        '''upvote
+        '''upvote [-y]
+
+        Upvote EVERYTHING in the current list. Several votes are sent at once
+        (see the workers command) and you'll get a report of anything that
+        failed at the end.
 
-        Upvote EVERYTHING in the current list.
+        You'll be asked if you're sure first, unless you give -y. Background
+        jobs can't ask, so "upvote &" needs -y too.
 
         Note: Untested for comments.
         '''
-
-        self.print("You're about to upvote EVERYTHING in the current list.")
-        continue_ = ahto_lib.yes_no(False, "Do you really want to continue?")
-
-        if continue_:
-            ahto_lib.progress_map( (lambda i: i.upvote()), self.items )
+        if self.confirm(arg, "You're about to upvote EVERYTHING in the"
+                        " current list. Do you really want to continue?"):
+            self.vote_items('upvote')
         else:
             self.print("Cancelled. Phew.")
 
     @logged_in_command # do_clear_vote {{{3
     def do_clear_vote(self, arg):
-        '''clear_vote
+        '''clear_vote [-y]
 
-        Clear your vote on EVERYTHING in the current list.
+        Clear your vote on EVERYTHING in the current list. -y works the same
+        as it does for upvote.
 
         UNTESTED
         '''
-        continue_ = ahto_lib.yes_no(False, "You're about to clear your votes on"
-            " EVERYTHING in the current list. Do you really want to"
-            " continue?")
-
-        if continue_:
-            ahto_lib.progress_map( (lambda i: i.clear_vote()), self.items )
+        if self.confirm(arg, "You're about to clear your votes on"
+                        " EVERYTHING in the current list. Do you really want"
+                        " to continue?"):
+            self.vote_items('clear_vote')
         else:
             self.print("Cancelled. Phew.")
 
@@ -0,0 +1,185 @@
+"""
+Timing every command, for the profile command.
+
+While a Profiler is on, URLToysClone hands it every command it runs. For each
+one it records:
+
+    wall         how long the command took, in seconds
+    network      how much of that was spent waiting on HTTP responses
+    requests     how many HTTP requests were made
+    bytes        how many bytes those responses had in them
+    items        how many items were in the list before and after
+    memory_peak  the most memory the command had allocated at once, in bytes
+    postcmd      how long postcmd (updating the prompt and so on) took after
+
+The network numbers only show up if something reports requests with
+request_done(). PRAWToys does that from praw_tools.ConcurrentHandler.
+
+Each command can also be run under cProfile, with the output dumped to a
+directory, and/or written to a trace file as one line of JSON.
+"""
+import os
+import re
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+
+
+class CommandProfile(object):
+    def __init__(self, number, line, items_before):
+        self.number       = number
+        self.line         = line
+        self.command      = line.split()[0] if line.split() else ''
+        self.started      = time.time()
+        self.wall         = None
+        self.network      = 0.0
+        self.requests     = 0
+        self.bytes        = 0
+        self.items_before = items_before
+        self.items_after  = None
+        self.memory_peak  = None
+        self.postcmd      = None
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class Profiler(object):
+    def __init__(self, cprofile_dir=None, trace_file=None):
+        ''' cprofile_dir is a directory to dump cProfile stats into, one file
+        per command. trace_file is a file to append a line of JSON to for
+        every command. Both are optional.
+        '''
+        self.cprofile_dir = cprofile_dir
+        self.trace_file   = trace_file
+        self.records      = []
+
+        self._lock          = threading.Lock()
+        self._current       = None
+        self._pending       = None
+        self._cprofile      = None
+        self._start_time    = None
+        self._stopped_at    = None
+        self._memory_before = 0
+        self._started_tracemalloc = False
+
+        if cprofile_dir is not None:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    def enable(self):
+        # tracemalloc makes everything a bit slower, but it's the only way to
+        # see how much memory a single command needed.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def disable(self):
+        self.finish()
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # Recording. {{{1
+    def request_done(self, seconds, size):
+        ''' Call this from whatever makes HTTP requests, after each one. It
+        can be called from any thread.
+        '''
+        with self._lock:
+            record = self._current
+
+            if record is not None:
+                record.network  += seconds
+                record.requests += 1
+                record.bytes    += size
+
+    def start(self, line, items_before):
+        # If postcmd never ran for the last command (like when onecmd is
+        # called directly), it's done now.
+        self.finish()
+
+        record = CommandProfile(len(self.records) + 1, line, items_before)
+
+        with self._lock:
+            self._current = record
+
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._memory_before = tracemalloc.get_traced_memory()[0]
+
+        if self.cprofile_dir is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+        self._start_time = time.perf_counter()
+
+    def stop(self, items_after):
+        ''' The command is done, but postcmd hasn't run yet. '''
+        self._stopped_at = time.perf_counter()
+        wall = self._stopped_at - self._start_time
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        with self._lock:
+            record, self._current = self._current, None
+
+        record.wall = wall
+        record.items_after = items_after
+
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            record.memory_peak = max(peak - self._memory_before, 0)
+
+        if self._cprofile is not None:
+            name = '{:04}-{}.prof'.format(
+                record.number, re.sub(r'\W', '_', record.command) or 'empty')
+            self._cprofile.dump_stats(os.path.join(self.cprofile_dir, name))
+            self._cprofile = None
+
+        self.records.append(record)
+        self._pending = record
+
+        return record
+
+    def finish(self, postcmd_ran=False):
+        ''' Everything after the command is done too. If postcmd_ran, the time
+        since stop() is counted as postcmd time.
+        '''
+        record, self._pending = self._pending, None
+
+        if record is None:
+            return
+
+        if postcmd_ran:
+            record.postcmd = time.perf_counter() - self._stopped_at
+
+        if self.trace_file is not None:
+            with open(self.trace_file, 'a', encoding='utf-8') as file_:
+                file_.write(json.dumps(record.to_dict()) + '\n')
+
+    # Summaries. {{{1
+    def summary(self):
+        ''' Totals for each command name, biggest total wall time first.
+        Returns a list of dicts.
+        '''
+        totals = {}
+
+        for record in self.records:
+            total = totals.setdefault(record.command, dict(
+                command=record.command, runs=0, wall=0.0, network=0.0,
+                requests=0, bytes=0, items=0, memory_peak=0, postcmd=0.0))
+
+            total['runs']     += 1
+            total['wall']     += record.wall
+            total['network']  += record.network
+            total['requests'] += record.requests
+            total['bytes']    += record.bytes
+            total['items']    += record.items_after - record.items_before
+            total['postcmd']  += record.postcmd or 0.0
+            total['memory_peak'] = max(
+                total['memory_peak'], record.memory_peak or 0)
+
+        return sorted(totals.values(), key=lambda i: -i['wall'])
@@ -0,0 +1,362 @@
+"""
+Reading and writing the files that save_to_file and load_from_file use.
+
+A session file is line-delimited JSON. The first line is a header, and every
+line after that is one item, as a praw_tools.CompactItem dict:
+
+    {"format": "prawtoys-session", "version": 1}
+    {"subreddit":"aww","kind":"submission","id":"5abcde",...}
+    {"subreddit":"pics","kind":"comment","id":"d9xyz12",...}
+
+Both reading and writing are done one line at a time, so neither one ever
+needs the whole session in memory. Every line starts with the subreddit, so
+read_session can skip items from the wrong subreddit without parsing them.
+
+Unlike the old pickle files, loading one of these can't run arbitrary code.
+
+Next to every session file, write_session also writes an index (the same
+filename plus INDEX_EXTENSION). It starts with a JSON header line, followed by
+three arrays with one entry per item:
+
+    offsets  array('Q')  where each line starts, plus one for the end of file
+    subs     array('I')  which entry of the header's "subreddits" list
+    flags    array('B')  bit 0: comment, bit 1: over_18, bit 2: is_self
+
+That's enough for MappedSession to find any item without reading the others,
+and to answer questions like "which items are from /r/aww?" without parsing
+any JSON at all.
+"""
+import os
+import sys
+import json
+import mmap
+import array
+import shutil
+import tempfile
+import contextlib
+import collections.abc
+
+import praw_tools
+
+EXTENSION = '.jsonl'
+HEADER = {'format': 'prawtoys-session', 'version': 1}
+
+INDEX_EXTENSION = '.idx'
+INDEX_HEADER = {'format': 'prawtoys-session-index', 'version': 1}
+
+COMMENT_FLAG = 1
+OVER_18_FLAG = 2
+IS_SELF_FLAG = 4
+
+# Subreddit names are only letters, numbers and underscores, so they never
+# need escaping and we can find them with plain string operations.
+_SUBREDDIT_PREFIX = '{"subreddit":"'
+
+
+def item_to_line(item):
+    ''' Turn an item into one line of a session file, newline included. '''
+    d = praw_tools.compact(item).to_dict()
+
+    # Put the subreddit first (see _SUBREDDIT_PREFIX) and leave out
+    # anything that's None, since that's CompactItem's default anyway.
+    line = {'subreddit': d.pop('subreddit')}
+    line.update((k, v) for k, v in d.items() if v is not None)
+
+    return json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def line_to_item(line):
+    return praw_tools.CompactItem.from_dict(json.loads(line))
+
+
+def line_subreddit(line):
+    ''' Get the lowercase subreddit of a line without parsing all of it. '''
+    if line.startswith(_SUBREDDIT_PREFIX):
+        start = len(_SUBREDDIT_PREFIX)
+        return line[start:line.index('"', start)].lower()
+
+    return json.loads(line)['subreddit'].lower()
+
+
+class _IndexBuilder(object):
+    ''' Collects index entries, one item at a time. See the module docstring.
+    '''
+    def __init__(self):
+        self.offsets = array.array('Q')
+        self.subs    = array.array('I')
+        self.flags   = array.array('B')
+
+        # lowercase subreddit name -> its number in self.subreddits
+        self.sub_numbers = {}
+        self.subreddits  = []
+
+    def add(self, offset, item):
+        subreddit = item.subreddit.display_name.lower()
+
+        if subreddit not in self.sub_numbers:
+            self.sub_numbers[subreddit] = len(self.subreddits)
+            self.subreddits.append(subreddit)
+
+        flags = 0
+        if item.kind == 'comment':
+            flags |= COMMENT_FLAG
+        if item.over_18:
+            flags |= OVER_18_FLAG
+        if item.is_self:
+            flags |= IS_SELF_FLAG
+
+        self.offsets.append(offset)
+        self.subs.append(self.sub_numbers[subreddit])
+        self.flags.append(flags)
+
+    def write(self, filename, end_offset):
+        header = dict(INDEX_HEADER, count=len(self.subs), size=end_offset,
+                      byteorder=sys.byteorder, subreddits=self.subreddits)
+
+        with _replacing(filename) as file_:
+            file_.write(json.dumps(header).encode('utf-8') + b'\n')
+            self.offsets.tofile(file_)
+            array.array('Q', [end_offset]).tofile(file_)
+            self.subs.tofile(file_)
+            self.flags.tofile(file_)
+
+
+@contextlib.contextmanager
+def _replacing(filename):
+    ''' Open a temporary file next to filename for writing, and move it over
+    filename once it's been written.
+
+    Truncating a file that a MappedSession has mapped would crash us the next
+    time it read an item (with SIGBUS, not an exception). This way, anything
+    that already has the old file open keeps seeing the old file.
+    '''
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp = tempfile.mkstemp(
+        dir=directory, prefix='.' + os.path.basename(filename) + '.')
+
+    try:
+        with os.fdopen(fd, 'wb') as file_:
+            yield file_
+
+        # mkstemp makes files only we can read. Keep whatever the old file
+        # had instead.
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp)
+
+        os.replace(temp, filename)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def write_session(filename, items):
+    ''' Write items to filename, one at a time. Returns how many there were.
+
+    Also writes the index that MappedSession uses. filename is only replaced
+    once everything's been written, so it's safe to save over a session
+    that's open with MappedSession.
+    '''
+    index = _IndexBuilder()
+
+    with _replacing(filename) as file_:
+        offset = file_.write(json.dumps(HEADER).encode('utf-8') + b'\n')
+
+        for item in items:
+            item = praw_tools.compact(item)
+            index.add(offset, item)
+            offset += file_.write(item_to_line(item).encode('utf-8'))
+
+    index.write(filename + INDEX_EXTENSION, offset)
+    return len(index.subs)
+
+
+def build_index(filename):
+    ''' (Re)write the index for a session file that doesn't have one, or
+    whose index is out of date.
+    '''
+    index = _IndexBuilder()
+
+    with open(filename, 'rb') as file_:
+        offset = len(file_.readline())
+
+        for line in file_:
+            index.add(offset, line_to_item(line))
+            offset += len(line)
+
+    index.write(filename + INDEX_EXTENSION, offset)
+
+
+def check_header(line):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+
+    if (not isinstance(header, dict)
+            or header.get('format') != HEADER['format']):
+        raise ValueError("This doesn't look like a PRAWToys session file.")
+
+    if header.get('version') != HEADER['version']:
+        raise ValueError(
+            'Unsupported session file version: ' + repr(header.get('version')))
+
+
+def read_session(filename, subreddits=None, limit=None):
+    ''' Yield the items in filename as CompactItems, one at a time.
+
+    If subreddits is given, only items from those subreddits are loaded. Lines
+    from any other subreddit are skipped without being parsed. If limit is
+    given, we stop reading after that many items.
+    '''
+    if subreddits is not None:
+        subreddits = {i.lower() for i in subreddits}
+
+    if limit is not None and limit <= 0:
+        return
+
+    with open(filename, encoding='utf-8') as file_:
+        check_header(file_.readline())
+
+        count = 0
+        for line in file_:
+            if (subreddits is not None
+                    and line_subreddit(line) not in subreddits):
+                continue
+
+            yield line_to_item(line)
+            count += 1
+
+            if limit is not None and count >= limit:
+                return
+
+
+class MappedSession(object):
+    ''' A read-only session file, memory-mapped instead of loaded.
+
+    Items are only parsed when you ask for them, so opening a file with
+    millions of items is instant. You'll usually want a SessionView of this
+    rather than the MappedSession itself.
+    '''
+    def __init__(self, filename):
+        with open(filename, 'rb') as file_:
+            check_header(file_.readline().decode('utf-8'))
+
+        index = self._read_index(filename)
+
+        if index is None:
+            build_index(filename)
+            index = self._read_index(filename)
+
+        header, self.offsets, self.subs, self.flags = index
+        self.subreddits = header['subreddits']
+
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _read_index(filename):
+        ''' Returns (header, offsets, subs, flags), or None if the index is
+        missing or doesn't match the session file.
+        '''
+        try:
+            file_ = open(filename + INDEX_EXTENSION, 'rb')
+        except FileNotFoundError:
+            return None
+
+        with file_:
+            try:
+                header = json.loads(file_.readline().decode('utf-8'))
+            except ValueError:
+                return None
+
+            if (header.get('format') != INDEX_HEADER['format']
+                    or header.get('version') != INDEX_HEADER['version']
+                    or header.get('size') != os.path.getsize(filename)):
+                return None
+
+            count = header.get('count')
+            offsets = array.array('Q')
+            subs    = array.array('I')
+            flags   = array.array('B')
+
+            if not isinstance(count, int) or count < 0:
+                return None
+
+            # An index that got cut off (or has junk on the end) is no better
+            # than no index at all.
+            try:
+                offsets.fromfile(file_, count + 1)
+                subs.fromfile(file_, count)
+                flags.fromfile(file_, count)
+            except EOFError:
+                return None
+
+            if file_.read(1):
+                return None
+
+        if header.get('byteorder') != sys.byteorder:
+            offsets.byteswap()
+            subs.byteswap()
+
+        return header, offsets, subs, flags
+
+    def __len__(self):
+        return len(self.subs)
+
+    def item(self, position):
+        line = self.map[self.offsets[position]:self.offsets[position + 1]]
+        return line_to_item(line)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class SessionView(collections.abc.Sequence):
+    ''' Some of the items in a MappedSession, by position.
+
+    This is what an item_store.ItemStore holds on to when you open a session
+    with load_from_file --mmap. Filtering one only makes a new array of
+    positions. The items themselves stay in the file until you look at them.
+    '''
+    def __init__(self, session, positions=None):
+        self.session = session
+
+        if positions is None:
+            positions = range(len(session))
+
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.session.item(i) for i in self.positions[index]]
+
+        return self.session.item(self.positions[index])
+
+    def take(self, positions):
+        return SessionView(self.session, array.array(
+            'Q', (self.positions[i] for i in positions)))
+
+    def column(self, name):
+        ''' Get the praw_tools.ITEM_INDEXERS key of every item straight from
+        the index, or None if the index doesn't have it.
+        '''
+        session = self.session
+        flags = session.flags
+
+        if name == 'subreddit':
+            subreddits, subs = session.subreddits, session.subs
+            return [subreddits[subs[i]] for i in self.positions]
+        elif name == 'kind':
+            return ['comment' if flags[i] & COMMENT_FLAG else 'submission'
+                    for i in self.positions]
+        elif name in ['over_18', 'is_self']:
+            flag = OVER_18_FLAG if name == 'over_18' else IS_SELF_FLAG
+
+            return [None if flags[i] & COMMENT_FLAG else bool(flags[i] & flag)
+                    for i in self.positions]
+
+        return None
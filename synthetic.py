@@ -0,0 +1,194 @@
+"""
+Made-up comments and submissions, for seeing how PRAWToys copes with millions
+of items.
+
+The numbers are roughly what reddit looks like: a handful of subreddits and
+users account for most of everything (both are Zipf-distributed), about a
+third of submissions are self posts, a few percent are NSFW, scores have a
+long tail, and comments run from a couple of words to a few paragraphs, with
+the newlines, tabs and non-ASCII characters that come with them.
+
+Everything is worked out from a seed, so the same seed always gives you the
+same items, and everything is made lazily, one item at a time:
+
+    >>> items = compact_items(1000000, seed=1)
+    >>> next(items)
+    <CompactItem t3_0>
+
+Use things() for reddit's JSON, compact_items() for praw_tools.CompactItems,
+praw_items() for real praw objects, and write_session() to go straight to a
+session file without keeping anything in memory.
+"""
+import random
+import itertools
+
+import praw
+import praw_tools
+import session_file
+
+# The most popular subreddits come first. After these, they're named sub<n>.
+POPULAR_SUBREDDITS = [
+    'askreddit', 'funny', 'pics', 'aww', 'gaming', 'worldnews',
+    'todayilearned', 'videos', 'science', 'movies', 'music', 'news', 'gifs',
+    'showerthoughts', 'iama', 'earthporn', 'askscience', 'jokes', 'food',
+    'explainlikeimfive',
+]
+
+VOCABULARY = (
+    'the of and a to in is you that it he was for on are as with his they I '
+    'at be this have from or one had by word but not what all were we when '
+    'your can said there use an each which she do how their if will up other '
+    'about out many then them these so some her would make like him into '
+    'time has look two more write go see number no way could people my than '
+    'first water been call who oil its now find long down day did get come '
+    'made may part cat dog reddit upvote TIL edit: thanks gold kind stranger '
+    'über café naïve façade jalapeño 日本 中文 Ωmega ☃ ♥ 😀 ¯\\_(ツ)_/¯ '
+    '**bold** *italic* [link](http://example.com) &amp; >quote'
+).split()
+
+# reddit's first post was in June 2005.
+START_TIME = 1118000000.0
+
+# How many seconds apart items are, on average.
+AVERAGE_GAP = 30.0
+
+# How many random words text is taken from.
+WORD_POOL = 1 << 16
+
+
+def _zipf_cum_weights(n, exponent):
+    ''' Cumulative weights for random.choices, where item [rank] is picked
+    1 / (rank + 1) ** exponent as often as the first one.
+    '''
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+class Generator(object):
+    def __init__(self, seed=0, subreddits=1000, users=100000,
+                 comment_ratio=0.6, nsfw_ratio=0.06, self_ratio=0.3,
+                 zipf=1.1):
+        self.seed = seed
+        self.comment_ratio = comment_ratio
+        self.nsfw_ratio = nsfw_ratio
+        self.self_ratio = self_ratio
+
+        self.subreddits = (POPULAR_SUBREDDITS + [
+            'sub' + str(i) for i in range(len(POPULAR_SUBREDDITS), subreddits)
+        ])[:subreddits]
+        self.users = users
+
+        self._sub_weights = _zipf_cum_weights(len(self.subreddits), zipf)
+        self._user_weights = _zipf_cum_weights(users, zipf)
+
+        # Text is cut out of one long run of random words. Picking every word
+        # separately would make this several times slower.
+        self._words = random.Random(seed).choices(VOCABULARY, k=WORD_POOL)
+
+    def _text(self, rng, words):
+        start = rng.randrange(WORD_POOL - words)
+        return ' '.join(self._words[start:start + words])
+
+    def _body(self, rng):
+        ''' A comment or selftext: a few paragraphs, usually short. '''
+        paragraphs = []
+
+        for _ in range(min(int(rng.paretovariate(1.5)), 8)):
+            paragraph = self._text(rng, min(int(rng.paretovariate(0.8)), 300))
+
+            # Code blocks and lists come with tabs.
+            if rng.random() < 0.05:
+                paragraph = '\t' + paragraph.replace(' ', '\n\t', 3)
+
+            paragraphs.append(paragraph)
+
+        return '\n\n'.join(paragraphs)
+
+    def things(self, n):
+        ''' Yield n items as reddit's JSON, like {'kind': 't3', 'data':
+        {...}}.
+        '''
+        rng = random.Random(self.seed)
+        submissions = comments = 0
+        created = START_TIME
+
+        # Picking from a few thousand weights at a time is a lot faster than
+        # one at a time.
+        batch = 4096
+        subreddits = users = iter(())
+
+        for i in range(n):
+            try:
+                subreddit, author = next(subreddits), next(users)
+            except StopIteration:
+                subreddits = iter(rng.choices(
+                    self.subreddits, cum_weights=self._sub_weights, k=batch))
+                users = iter(rng.choices(
+                    range(self.users), cum_weights=self._user_weights,
+                    k=batch))
+                subreddit, author = next(subreddits), next(users)
+
+            created += rng.expovariate(1 / AVERAGE_GAP)
+            data = {
+                'subreddit': subreddit,
+                # Deleted accounts don't have an author.
+                'author': ('user' + str(author)
+                           if rng.random() > 0.02 else None),
+                'score': int(rng.paretovariate(1.2)) - 1,
+                'created_utc': round(created),
+            }
+
+            if submissions and rng.random() < self.comment_ratio:
+                data['id'] = praw_tools.to_base36(comments)
+                data['name'] = 't1_' + data['id']
+                data['body'] = self._body(rng)
+                data['link_id'] = 't3_' + praw_tools.to_base36(
+                    rng.randrange(submissions))
+                data['parent_id'] = data['link_id']
+                data['replies'] = ''
+                comments += 1
+
+                yield {'kind': 't1', 'data': data}
+            else:
+                data['id'] = praw_tools.to_base36(submissions)
+                data['name'] = 't3_' + data['id']
+                data['title'] = self._text(
+                    rng, rng.randrange(1, 25)).capitalize()
+                data['is_self'] = rng.random() < self.self_ratio
+                data['selftext'] = (self._body(rng) if data['is_self']
+                                    else '')
+                data['over_18'] = rng.random() < self.nsfw_ratio
+                data['url'] = 'http://example.com/' + data['id']
+                data['permalink'] = '/r/{}/comments/{}/'.format(
+                    subreddit, data['id'])
+                submissions += 1
+
+                yield {'kind': 't3', 'data': data}
+
+
+# Different kinds of items. {{{1
+def things(n, seed=0, **options):
+    ''' n items as reddit's JSON. See Generator for the options. '''
+    return Generator(seed, **options).things(n)
+
+
+def compact_items(n, seed=0, **options):
+    ''' n items as praw_tools.CompactItems. '''
+    return map(praw_tools.json_to_compact, things(n, seed, **options))
+
+
+def praw_items(reddit_session, n, seed=0, **options):
+    ''' n items as praw Comments and Submissions. '''
+    for thing in things(n, seed, **options):
+        if thing['kind'] == 't1':
+            yield praw.objects.Comment(reddit_session, thing['data'])
+        else:
+            yield praw.objects.Submission(reddit_session, thing['data'])
+
+
+def write_session(filename, n, seed=0, **options):
+    ''' Write n items straight to a session file (see session_file.py), one
+    at a time. Returns how many were written.
+    '''
+    return session_file.write_session(
+        filename, compact_items(n, seed, **options))
@@ -2,6 +2,9 @@
 import unittest
 import unittest.mock
 import io
+import os
+import re
+import time
 
 import prawtoys
 import praw_tools
@@ -23,6 +26,14 @@ class PostLookalike(object):  # {{{2
         else:
             self.subreddit = SubredditLookalike(subreddit)
 
+        self.vote = 0
+
+    def upvote(self):
+        self.vote = 1
+
+    def clear_vote(self):
+        self.vote = 0
+
 
 class CommentLookalike(PostLookalike):  # {{{2
     '''Designed to generate test data for PRAWToys to munch on.'''
@@ -99,6 +110,31 @@ class GenericPRAWToysTest(unittest.TestCase):  # {{{2
         if clear_after:
             self.output.truncate(0)
 
+    def ctrl_c(self):
+        ''' Press ctrl-c, from any thread. It has to be a real SIGINT sent to
+        the main thread, or it won't wake it up if it's waiting on a lock.
+        '''
+        import signal
+        import threading
+
+        if hasattr(signal, 'pthread_kill'):
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+        else:
+            import _thread
+            _thread.interrupt_main()
+
+    def use_fake_reddit(self, server):
+        ''' Point self.prawtoys at a fake_reddit.FakeReddit, through a real
+        praw session.
+        '''
+        import praw
+        import fake_reddit
+
+        limiter = praw_tools.RateLimiter(rate=10000, burst=10000)
+        self.prawtoys.reddit_session = praw.Reddit(
+            'PRAWToys tests', disable_update_check=True,
+            handler=fake_reddit.LocalHandler(server.url, limiter))
+
 
 class Offline(GenericPRAWToysTest):  # {{{2
     TEST_DATA = [
@@ -110,6 +146,7 @@ class Offline(GenericPRAWToysTest):  # {{{2
         self.prawtoys.items = ['foo']
         self.cmd('reset')
         self.assertTrue(self.prawtoys.items == [])
+        self.assertTrue(self.prawtoys.history.cost == 1)
 
     def data_tester(self, data):
         '''Example of how this is used:
@@ -154,6 +191,45 @@ class Offline(GenericPRAWToysTest):  # {{{2
         dt('ntitle ba[rz]', lambda i:
             'bar' not in i.title and 'baz' not in i.title)
 
+    def test_title_options(self):
+        titles = ['Foo bar', 'foo.bar', 'BAZ', 'qux (1)', 'x']
+        dt = self.data_tester(
+            [SubmissionLookalike(title=i) for i in titles]
+            + [CommentLookalike(i) for i in titles])
+
+        def titles_left():
+            return [i.title for i in self.prawtoys.items
+                    if not praw_tools.is_comment(i)]
+
+        dt('title -i foo bar', lambda i: True)
+        self.assertTrue(titles_left() == ['Foo bar'])
+
+        dt('title -l foo.bar', lambda i: True)
+        self.assertTrue(titles_left() == ['foo.bar'])
+
+        dt('title -l -i -any baz (1)', lambda i: True)
+        self.assertTrue(titles_left() == ['BAZ', 'qux (1)'])
+
+        # Without -i, case matters.
+        dt('ntitle -any ^f ^x', lambda i: True)
+        self.assertTrue(titles_left() == ['Foo bar', 'BAZ', 'qux (1)'])
+
+        # Comments get kept by title, and submissions by body.
+        self.assertTrue(len(self.prawtoys.items) == 3 + len(titles))
+
+        dt('body -i -any ^foo baz', lambda i:
+            not praw_tools.is_comment(i) or str(i) in titles[:3])
+        self.assertTrue(len(self.prawtoys.items) == 3 + len(titles))
+
+        dt('nbody -l (', lambda i:
+            not praw_tools.is_comment(i) or '(' not in str(i))
+        self.assertTrue(len(self.prawtoys.items) == 4 + len(titles))
+
+        self.output.truncate(0)
+        dt('title (', lambda i: True)
+        self.assertTrue(len(self.prawtoys.items) == 2 * len(titles))
+        self.assertInOutput('Bad regex')
+
     def test_sfw_nsfw(self):
         test_data = [
             SubmissionLookalike(over_18=i) for i in self.BOOL_TEST_DATA]
@@ -176,6 +252,44 @@ class Offline(GenericPRAWToysTest):  # {{{2
         dt('self', lambda i: i.is_self)
         dt('nself', lambda i: not i.is_self)
 
+    def test_where(self):
+        test_data = [
+            SubmissionLookalike(i, i, is_self=j, over_18=not j)
+            for i, j in zip(self.TEST_DATA, self.BOOL_TEST_DATA)]
+
+        test_data += [CommentLookalike(i, i, i) for i in self.TEST_DATA]
+
+        for i, item in enumerate(test_data):
+            item.score = i * 10
+
+        dt = self.data_tester(test_data)
+
+        dt('where submission and sub in (FOO, baz) and not self',
+           lambda i: i.subreddit.display_name in ['foo', 'baz']
+           and not i.is_self and not praw_tools.is_comment(i))
+        self.assertTrue(len(self.prawtoys.items) == 1)
+
+        dt('where title~/^B/i or (comment and score >= 100)',
+           lambda i: praw_tools.is_comment(i) and i.score >= 100
+           or i.title[0] == 'b')
+
+        dt('where not nsfw and sub not in (foo) and title !~ "a"',
+           lambda i: praw_tools.is_comment(i)
+           or not i.over_18 and 'a' not in i.title
+           and i.subreddit.display_name != 'foo')
+
+        # The whole thing is one step to undo.
+        self.cmd('undo')
+        self.assertTrue(self.prawtoys.items == test_data)
+
+        self.output.truncate(0)
+        for bad in ['sub ==', 'score > lots', 'foo == bar', 'title~/(/',
+                    '(self', 'self and']:
+            self.cmd('where ' + bad)
+            self.assertTrue(self.prawtoys.items == test_data)
+
+        self.assertInOutput('Unknown field: foo')
+
     def test_undo(self):
         def test_undo_on(cmd, data):
             self.prawtoys.items = data[:]
@@ -194,6 +308,45 @@ class Offline(GenericPRAWToysTest):  # {{{2
             'sfw',
             [SubmissionLookalike(over_18=i) for i in self.BOOL_TEST_DATA])
 
+        test_undo_on(
+            'rm 0 3',
+            [SubmissionLookalike(title=i) for i in self.TEST_DATA])
+
+        test_undo_on(
+            'reset',
+            [SubmissionLookalike(title=i) for i in self.TEST_DATA])
+
+    def test_undo_redo_multiple(self):
+        data = [SubmissionLookalike(title=i, subreddit=i, over_18=j)
+                for i, j in zip(self.TEST_DATA, self.BOOL_TEST_DATA)]
+
+        self.prawtoys.items = data[:]
+        self.prawtoys.add_items(data[:2])
+        states = [self.prawtoys.items[:]]
+
+        for cmd in ['nsub qux', 'rm 1', 'title ^[fb]', 'sfw']:
+            self.cmd(cmd)
+            states.append(self.prawtoys.items[:])
+
+        self.cmd('undo 3')
+        self.assertTrue(self.prawtoys.items == states[1])
+
+        self.cmd('redo')
+        self.assertTrue(self.prawtoys.items == states[2])
+
+        self.cmd('undo 10')
+        self.assertTrue(self.prawtoys.items == data)
+        self.assertInOutput('Could only undo 3 step(s).')
+
+        self.cmd('redo 5')
+        self.assertTrue(self.prawtoys.items == states[-1])
+
+        # A new change should throw away whatever could've been redone.
+        self.cmd('undo')
+        self.cmd('sub foo')
+        self.cmd('redo')
+        self.assertInOutput('Nothing to redo.')
+
     def test_x(self):
         self.cmd('x self.test_worked = True')
         self.assertTrue(
@@ -216,6 +369,1122 @@ class Offline(GenericPRAWToysTest):  # {{{2
         self.cmd('width ' + str(old_width))
         self.assertTrue(prawtoys.praw_tools.ASSUMED_CONSOLE_WIDTH == old_width)
 
+    def test_ls_width(self):
+        # Rendered items are cached, but changing the width shouldn't get you
+        # the old ones.
+        old_width = prawtoys.praw_tools.ASSUMED_CONSOLE_WIDTH
+        self.prawtoys.items = [SubmissionLookalike('x' * 200)] * 3
+        self.prawtoys.OUTPUT_BATCH_SIZE = 2
+
+        try:
+            for width in [80, 40, 80]:
+                self.cmd('width ' + str(width))
+                self.output.truncate(0)
+                self.output.seek(0)
+
+                self.cmd('ls')
+                lines = self.output.getvalue().splitlines()
+
+                self.assertTrue(len(lines) == 3)
+                self.assertTrue(all(len(i) == width for i in lines))
+                self.assertTrue(lines[2].startswith('2: xxx'))
+        finally:
+            self.cmd('width ' + str(old_width))
+
+        # The cache lives on the items, so it doesn't keep them alive.
+        import gc
+        import weakref
+
+        item = SubmissionLookalike('foo')
+        compact_item = praw_tools.compact(item)
+        ref = weakref.ref(item)
+
+        for i in [item, compact_item]:
+            self.assertTrue(praw_tools.praw_object_to_string(i)
+                            == praw_tools.praw_object_to_string(i))
+
+        self.assertTrue('_rendered' not in compact_item.to_dict())
+        del item
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+    def test_pager(self):
+        self.prawtoys.items = [
+            SubmissionLookalike('item' + str(i)) for i in range(20)]
+        self.prawtoys.use_pager = True
+        self.prawtoys.stdin = io.StringIO(
+            '\n'.join(['', 'p', 'g 12', '/item3', 'x', '/item1[89]', 'q']))
+
+        def shown(output):
+            # Nothing echoes what was typed here, so the pager's prompts end
+            # up on the same line as whatever comes next.
+            output = re.sub(r'-- lines .*? -- ', '\n', output)
+            return [int(i.split(':')[0]) for i in output.splitlines()
+                    if i.strip()[:1].isdigit()]
+
+        size = unittest.mock.patch('shutil.get_terminal_size',
+                                   return_value=os.terminal_size((80, 6)))
+
+        try:
+            with size:
+                self.output.truncate(0)
+                self.output.seek(0)
+                self.cmd('ls')
+        finally:
+            self.prawtoys.use_pager = None
+
+        output = self.output.getvalue()
+        self.assertTrue(shown(output) == (
+            list(range(0, 10)) + list(range(0, 5)) + list(range(12, 17)) * 3
+            + list(range(18, 20))))
+        self.assertTrue('Pattern not found.' in output)
+        self.assertTrue('Unknown pager command: x' in output)
+        self.assertTrue(output.count('-- lines') == 7)
+
+        # Anything that fits on the screen is just printed.
+        self.output.truncate(0)
+        self.output.seek(0)
+        self.prawtoys.use_pager = True
+
+        try:
+            with size:
+                self.cmd('ls 0 3')
+        finally:
+            self.prawtoys.use_pager = None
+
+        self.assertTrue(shown(self.output.getvalue()) == [0, 1, 2])
+        self.assertTrue('-- lines' not in self.output.getvalue())
+
+    def test_vote_items(self):
+        class Deleted(SubmissionLookalike):
+            def upvote(self):
+                raise RuntimeError('deleted')
+
+        self.prawtoys.items = [SubmissionLookalike() for i in range(20)]
+        self.prawtoys.items[7] = Deleted()
+
+        report = self.prawtoys.vote_items('upvote')
+        self.assertTrue(len(report.succeeded) == 19)
+        self.assertTrue([i for i, error in report.failed] == [7])
+        self.assertInOutput('19 succeeded, 1 failed, 20 total')
+
+        self.prawtoys.vote_items('clear_vote')
+        self.assertAllItems(lambda i: i.vote == 0)
+
+        # A ctrl-c stops the votes that haven't been sent yet, but the ones
+        # that were still get reported.
+        sent = []
+
+        def vote(item):
+            time.sleep(0.01)
+            sent.append(item)
+
+        def progress(done, total):
+            raise KeyboardInterrupt
+
+        report = praw_tools.vote_all(range(200), vote, workers=4,
+                                     progress=progress)
+
+        time.sleep(0.1)
+        self.assertTrue(len(sent) <= 8)
+        self.assertTrue(sorted(report.succeeded) == sorted(sent))
+
+        # The same with a real ctrl-c, which shouldn't get any further.
+        ctrl_c = self.ctrl_c
+
+        class Interrupting(SubmissionLookalike):
+            def upvote(self):
+                ctrl_c()
+
+        self.prawtoys.items = [SubmissionLookalike() for i in range(200)]
+        self.prawtoys.items[3] = Interrupting()
+        self.output.truncate(0)
+        self.prawtoys.vote_items('upvote')
+        self.assertTrue(re.search(r'200 total, \d+ not sent',
+                                  self.output.getvalue()))
+
+    def test_fetch_all(self):
+        import time
+
+        def source(name, delay):
+            def get_items():
+                time.sleep(delay)
+                return (name + str(i) for i in range(3))
+
+            return get_items
+
+        # The slowest source comes first, but its items should too.
+        items = list(praw_tools.fetch_all(
+            [source('a', 0.05), source('b', 0), source('c', 0.01)]))
+
+        self.assertTrue(
+            items == ['a0', 'a1', 'a2', 'b0', 'b1', 'b2', 'c0', 'c1', 'c2'])
+
+        # Now with real praw listings, all on one session.
+        import fake_reddit
+
+        subs = ['aww', 'pics', 'gifs', 'askreddit', 'funny', 'todayilearned']
+
+        with fake_reddit.FakeReddit(fake_reddit.Corpus(6000),
+                                    latency=0.005) as server:
+            self.use_fake_reddit(server)
+            self.cmd('get_from {} 250'.format(' '.join(subs)))
+
+        self.assertTrue(
+            [i.subreddit.display_name for i in self.prawtoys.items]
+            == [i for i in subs for _ in range(250)])
+
+    def test_fetch_thread(self):
+        objects = praw_tools.praw.objects
+
+        class Comment(object):
+            def __init__(self, id, parent_id, score=1, replies=()):
+                self.fullname  = 't1_' + id
+                self.parent_id = parent_id
+                self.score     = score
+                self.replies   = list(replies)
+
+            def _update_submission(self, submission):
+                pass
+
+        # praw's own constructor, so it has everything praw expects.
+        def More(parent_id, children):
+            return objects.MoreComments(session, {
+                'parent_id': parent_id, 'children': children,
+                'count': len(children)})
+
+        deep_ids = ['d' + str(i) for i in range(5)]
+        wide_ids = ['w' + str(i) for i in range(250)]
+
+        requests = []
+
+        def request_json(url, data):
+            children = data['children'].split(',')
+            requests.append(children)
+
+            # Reddit sometimes sends back things we've already seen.
+            return {'data': {'things': [Comment('a', 't3_s')] + [
+                Comment(i, 't1_b' if i[0] == 'd' else 't3_s')
+                for i in children]}}
+
+        submission = unittest.mock.Mock(fullname='t3_s', subreddit='foo')
+        session = unittest.mock.Mock(
+            request_json=request_json, config=unittest.mock.MagicMock(),
+            get_submission=lambda submission_id: submission)
+        submission.comments = [
+            Comment('a', 't3_s'),
+            Comment('b', 't3_s', 50, [More('t1_b', deep_ids)]),
+            More('t3_s', wide_ids),
+        ]
+
+        comments = list(praw_tools.fetch_thread(session, 's', workers=1))
+
+        self.assertTrue(len(comments) == 2 + 5 + 250)
+        self.assertTrue(len({i.fullname for i in comments}) == len(comments))
+        self.assertTrue(max(len(i) for i in requests) == 100)
+
+        # Top-level comments get expanded before replies.
+        self.assertTrue(requests[0][0] == 'w0')
+        self.assertTrue(requests[-1] == deep_ids)
+
+        comments = list(praw_tools.fetch_thread(session, 's', 50))
+        self.assertTrue(len(comments) == 50)
+
+        # And a whole thread from a real praw session.
+        import fake_reddit
+
+        corpus = fake_reddit.Corpus(3000, thread_size=300)
+
+        with fake_reddit.FakeReddit(corpus, latency=0.005) as server:
+            self.use_fake_reddit(server)
+            self.cmd('thread 0 all')
+
+        fullnames = [i.fullname for i in self.prawtoys.items]
+        position = {name: i for i, name in enumerate(fullnames)}
+        self.assertTrue(len(set(fullnames)) == corpus.thread_size)
+        self.assertTrue(all(position.get(corpus.parent(int(i[3:], 36)), -1)
+                            < position[i] for i in fullnames))
+
+    def test_parents_first(self):
+        # (name, parent), as they might come back from a few requests.
+        things = [('c', 'b'), ('a', 't3'), ('d', 'c'), (None, 'a'),
+                  ('e', 'x'), ('b', 'a')]
+        ordered = list(praw_tools._parents_first(
+            things, lambda i: i[0], lambda i: i[1]))
+
+        self.assertTrue(sorted(ordered, key=str) == sorted(things, key=str))
+        self.assertTrue([i[0] for i in ordered]
+                        == ['a', None, 'e', 'b', 'c', 'd'])
+
+    def test_load_ids(self):
+        import os
+        import tempfile
+
+        class Thing(object):
+            def __init__(self, fullname):
+                self.fullname = fullname
+
+        # Reddit knows about 300 submissions and one comment, and gives them
+        # back in whatever order it feels like.
+        known = {'t3_' + str(i) for i in range(300)} | {'t1_abc'}
+        batches = []
+
+        def get_info(thing_id):
+            batches.append(thing_id)
+            return [Thing(i) for i in reversed(thing_id) if i in known]
+
+        ids = ['t3_' + str(i) for i in range(250)] + ['abc', 'gone', 't3_x']
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'ids.txt')
+
+            with open(name, 'w') as file_:
+                file_.write('# some ids\n\n' + '\n'.join(ids) + '\n')
+
+            self.prawtoys.reddit_session = unittest.mock.Mock(
+                get_info=get_info)
+            self.cmd('load_ids ' + name)
+
+        self.assertTrue(max(len(i) for i in batches) == 100)
+        self.assertTrue([i.fullname for i in self.prawtoys.items]
+                        == ['t3_' + str(i) for i in range(250)] + ['t1_abc'])
+        self.assertInOutput("Couldn't find 2 of 253 ids:", False)
+        self.assertInOutput('gone', False)
+        self.assertInOutput('t3_x')
+
+        # The same, through a real praw session, several batches at once.
+        import fake_reddit
+
+        ids = [praw_tools.to_base36(i) for i in range(1000)] + ['t1_5']
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'ids.txt')
+
+            with open(name, 'w') as file_:
+                file_.write('\n'.join(ids))
+
+            with fake_reddit.FakeReddit(fake_reddit.Corpus(3000),
+                                        latency=0.005) as server:
+                self.use_fake_reddit(server)
+                self.reset()
+                self.cmd('load_ids ' + name)
+
+        self.assertTrue([i.fullname for i in self.prawtoys.items]
+                        == ['t3_' + i for i in ids[:-1]] + ['t1_5'])
+
+    def test_add_items_interrupted(self):
+        def listing():
+            yield SubmissionLookalike()
+            yield SubmissionLookalike()
+            raise KeyboardInterrupt
+
+        self.prawtoys.items = [SubmissionLookalike()]
+        self.assertRaises(
+            KeyboardInterrupt, self.prawtoys.add_items, listing())
+
+        # Nothing that made it in before the ctrl-c should be lost.
+        self.assertTrue(len(self.prawtoys.items) == 3)
+
+    def test_item_store(self):
+        store = prawtoys.item_store.ItemStore(
+            ['foo', 'bar', 'baz'], {'first': lambda i: i[0]})
+
+        self.assertTrue(store.positions('first', 'b') == [1, 2])
+
+        # Appending has to keep already-built indexes up-to-date.
+        store.append('bop')
+        self.assertTrue(store.positions('first', 'b') == [1, 2, 3])
+        self.assertTrue(store.counts('first') == {'f': 1, 'b': 3})
+
+        # And so does anything else that changes the list.
+        store[0] = 'bam'
+        self.assertTrue(store.positions('first', 'b') == [0, 1, 2, 3])
+
+        taken = store.take([1, 3])
+        self.assertTrue(taken == ['bar', 'bop'])
+        self.assertTrue(taken.positions('first', 'b') == [0, 1])
+        self.assertTrue(store.without([1, 3]) == ['bam', 'baz'])
+
+        # A shared store doesn't copy anything until it's changed, and
+        # neither side sees the other's changes.
+        shared = store.share()
+        self.assertTrue(shared._items.items is store._items)
+        self.assertTrue(shared.positions('first', 'b') == [0, 1, 2, 3])
+
+        store.append('bug')
+        self.assertTrue(store._items is shared._items.items)
+        self.assertTrue(shared == ['bam', 'bar', 'baz', 'bop'])
+
+        shared.append('fez')
+        self.assertTrue(shared.positions('first', 'f') == [4])
+        self.assertTrue(store == ['bam', 'bar', 'baz', 'bop', 'bug'])
+
+        shared = store.share()
+        store[0] = 'zap'
+        self.assertTrue(shared[0] == 'bam' and store[0] == 'zap')
+
+    def test_view_subs_and_lsub(self):
+        self.prawtoys.items = [
+            SubmissionLookalike(subreddit=i) for i in self.TEST_DATA]
+
+        self.cmd('view_subs')
+        self.assertInOutput('2 : /r/foo', clear_after=False)
+        self.assertInOutput('1 : /r/bar')
+
+        self.cmd('lsub FOO qux')
+        self.assertTrue(self.output.getvalue().count('/r/foo') == 2)
+        self.assertInOutput('4: foo :: /r/qux')
+
+    def test_nodupes(self):
+        def item(fullname):
+            submission = SubmissionLookalike(fullname)
+            submission.fullname = fullname
+            return submission
+
+        data = [item(i) for i in ['a', 'b', 'a', 'c', 'b', 'a']]
+
+        # Items without a fullname can't be compared, so they always stay.
+        data += [SubmissionLookalike(), SubmissionLookalike()]
+
+        first_copies = [data[i] for i in [0, 1, 3, 6, 7]]
+
+        self.prawtoys.items = data[:]
+        self.cmd('nodupes')
+        self.assertTrue(self.prawtoys.items == first_copies)
+
+        self.cmd('undo')
+        self.cmd('uniq -both')
+        self.assertTrue(self.prawtoys.items == [data[i] for i in [3, 6, 7]])
+
+        self.prawtoys.items = data[:2]
+        self.cmd('dedupe on')
+        self.prawtoys.add_items(data)
+        self.assertTrue(self.prawtoys.items == first_copies)
+        self.assertInOutput('Skipped 5 duplicate(s).')
+
+        self.cmd('dedupe off')
+        self.prawtoys.add_items(data[:1])
+        self.assertTrue(len(self.prawtoys.items) == 6)
+
+    def test_stats(self):
+        import aggregate
+
+        data = [SubmissionLookalike(subreddit=i) for i in self.TEST_DATA]
+        data += [CommentLookalike(subreddit='foo')]
+
+        for i, item in enumerate(data):
+            item.score = i
+            item.created_utc = i * 3600 * 5
+
+        # Comments don't have an nsfw. Neither do they have a score here.
+        del data[-1].score
+
+        def check():
+            self.prawtoys.items = data[:]
+
+            self.cmd('stats by=sub metric=sum(score)')
+            self.assertInOutput('3 : /r/foo', False)
+            self.assertInOutput('4 : /r/qux')
+
+            self.cmd('stats by=nsfw metric=count')
+            self.assertInOutput('7 : False')
+
+            self.cmd('stats by=hour metric=mean(score) top=2')
+            self.assertTrue(self.output.getvalue().count(':00') == 2)
+            self.assertInOutput('5.00 : 01:00', False)
+            self.assertInOutput('6.00 : 06:00')
+
+            self.cmd('stats by=day metric=max(created)')
+            self.assertInOutput(' 72000 : 1970-01-01', False)
+            self.assertInOutput('126000 : 1970-01-02')
+
+            self.cmd('stats by=author')
+            self.assertTrue(len(self.output.getvalue().strip('\0')) == 0)
+
+            for bad in ['by=score', 'metric=sum(author)', 'metric=median',
+                        'foo']:
+                self.cmd('stats ' + bad)
+                self.assertTrue(self.output.getvalue().strip('\0'))
+                self.output.truncate(0)
+
+        check()
+
+        if aggregate.numpy is not None:
+            with unittest.mock.patch.object(aggregate, 'numpy', None):
+                check()
+
+    def test_compact(self):
+        data  = [SubmissionLookalike(i, i, i, is_self=j, over_18=j)
+                 for i, j in zip(self.TEST_DATA, self.BOOL_TEST_DATA)]
+        data += [CommentLookalike('a\nb ' + i, i, i) for i in self.TEST_DATA]
+
+        self.cmd('compact on')
+        self.prawtoys.add_items(data)
+        self.cmd('compact off')
+
+        self.assertAllItems(
+            lambda i: isinstance(i, praw_tools.CompactItem))
+
+        for full, compact in zip(data, self.prawtoys.items):
+            self.assertTrue(
+                praw_tools.praw_object_to_string(full)
+                == praw_tools.praw_object_to_string(compact))
+            self.assertTrue(
+                praw_tools.praw_object_url(full)
+                == praw_tools.praw_object_url(compact))
+
+        # Every CompactItem from the same subreddit shares one subreddit.
+        self.assertTrue(
+            self.prawtoys.items[0].subreddit
+            is self.prawtoys.items[3].subreddit)
+
+        self.cmd('nsfw')
+        self.assertTrue(len(self.prawtoys.items) == 11)
+        self.cmd('comment')
+        self.assertAllItems(praw_tools.is_comment)
+
+    def test_watch_fetches(self):
+        import fake_reddit
+
+        objects = praw_tools.praw.objects
+        base = objects.RedditContentObject
+        original_getattr = base.__getattr__
+
+        with fake_reddit.FakeReddit(fake_reddit.Corpus(100)) as server:
+            self.use_fake_reddit(server)
+            session = self.prawtoys.reddit_session
+
+            # A subreddit praw hasn't loaded yet, so reading almost anything
+            # off it goes and fetches it.
+            self.prawtoys.lazy = objects.Subreddit(session, 'foo', fetch=False)
+
+            self.cmd('watch_fetches on')
+            self.output.truncate(0)
+            self.prawtoys.onecmd('x getattr(self.lazy, "subscribers", None)')
+            self.prawtoys.postcmd(None, '')
+            self.assertInOutput('1 lazy fetch(es)', clear_after=False)
+            self.assertInOutput('Subreddit.subscribers: 1')
+
+            # Anything that came in through add_items has everything filters
+            # and ls need already, even if reddit left some of it out.
+            self.prawtoys.add_items([objects.Submission(session, {
+                'title': 'pinned', 'permalink': '/comments/p',
+                'subreddit': 'foo', 'over_18': False,
+                'is_self': True})])
+            self.assertTrue(self.prawtoys.items[0].selftext is None)
+
+            self.prawtoys.onecmd('ls')
+            self.prawtoys.onecmd('stats by=author')
+            self.prawtoys.onecmd('where body ~ "x" or score > 1')
+            self.prawtoys.postcmd(None, '')
+            self.assertTrue('lazy fetch' not in self.output.getvalue())
+
+        self.cmd('watch_fetches off')
+        self.assertTrue(base.__getattr__ is original_getattr)
+
+    def test_profile(self):
+        import json
+        import tempfile
+
+        self.prawtoys.items = [
+            SubmissionLookalike(subreddit=i) for i in self.TEST_DATA]
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace = os.path.join(directory, 'trace.jsonl')
+            dumps = os.path.join(directory, 'prof')
+
+            self.cmd('profile on trace={} cprofile={}'.format(trace, dumps))
+
+            # What a request would look like, as far as the profiler can
+            # tell.
+            self.cmd('x self.reddit_session.handler.observer(0.25, 2048)')
+            self.cmd('sub foo')
+            self.prawtoys.postcmd(None, 'sub foo')
+
+            self.output.truncate(0)
+            self.output.seek(0)
+            self.cmd('profile stats')
+            stats = self.output.getvalue().splitlines()
+            self.assertTrue(stats[0].split()[:3] == ['command', 'runs', 'wall'])
+            self.assertTrue(any(i.split()[0] == 'sub' and '-5' in i.split()
+                                for i in stats))
+            self.assertTrue(any(i.split()[0] == 'x' and '0.250s' in i.split()
+                                and '2.0' in i.split() for i in stats))
+
+            self.cmd('profile last')
+            self.assertInOutput('command : profile')
+
+            self.cmd('profile off')
+            self.assertTrue(self.prawtoys.profiler is None)
+            self.assertTrue(
+                self.prawtoys.reddit_session.handler.observer is None)
+
+            with open(trace, encoding='utf-8') as file_:
+                records = [json.loads(i) for i in file_]
+
+            self.assertTrue([i['command'] for i in records]
+                            == ['x', 'sub', 'profile', 'profile', 'profile'])
+            self.assertTrue(records[0]['requests'] == 1)
+            self.assertTrue(records[1]['items_after'] == 2)
+            self.assertTrue(records[1]['postcmd'] is not None)
+            self.assertTrue(len(os.listdir(dumps)) == 5)
+
+    def test_item_cache(self):
+        import os
+        import tempfile
+        import item_cache
+
+        def make_items(ids):
+            return [praw_tools.CompactItem('submission', i, 'foo', title=i)
+                    for i in ids]
+
+        listing = make_items(['c', 'b', 'a'])
+        requested = []
+
+        def get_items(limit):
+            for i in listing[:limit]:
+                requested.append(i.id)
+                yield i
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = item_cache.ItemCache(os.path.join(directory, 'cache'))
+
+            def fetch(limit=None):
+                requested.clear()
+                return [i.id for i in cache.fetch(
+                    'r/foo search new', get_items, limit, incremental=True)]
+
+            self.assertTrue(fetch() == ['c', 'b', 'a'])
+            self.assertTrue(requested == ['c', 'b', 'a'])
+
+            # Only what's newer than the cached copy should be downloaded.
+            listing[:0] = make_items(['e', 'd'])
+            self.assertTrue(fetch() == ['e', 'd', 'c', 'b', 'a'])
+            self.assertTrue(requested == ['e', 'd', 'c'])
+
+            self.assertTrue(fetch(2) == ['e', 'd'])
+            self.assertTrue(cache.stats()['items'] == 5)
+
+            # evict runs after every store_listing, so it can't scan all of
+            # listing_items for every item.
+            plan = cache.db.execute(
+                'EXPLAIN QUERY PLAN DELETE FROM items WHERE fullname NOT IN'
+                ' (SELECT fullname FROM listing_items)').fetchall()
+            self.assertTrue(any('listing_items_fullname' in i[-1]
+                                for i in plan))
+
+            cache.clear()
+            self.assertTrue(cache.stats()['listings'] == 0)
+            cache.close()
+
+    def test_search(self):
+        import os
+        import tempfile
+
+        titles = ['Cute dog', 'A dog, cute', 'cat', 'Dogs and cats']
+        data  = [SubmissionLookalike(i, i[0]) for i in titles]
+        data += [CommentLookalike('my cute DOG!', 'c')]
+
+        self.prawtoys.items = data[:1]
+        self.prawtoys.items.text_index()
+
+        # The index should keep up with items as they're added.
+        self.prawtoys.add_items(data[1:])
+        self.cmd('search dog cute')
+        self.assertInOutput('3 match(es)', False)
+        self.assertInOutput('matched: dog, cute')
+
+        self.cmd('search "cute dog" or cat')
+        self.assertInOutput('3 match(es)', False)
+        self.assertInOutput('matched: cat')
+
+        self.cmd('search -keep "cute dog" or cat')
+        self.assertTrue(self.prawtoys.items == [data[0], data[2], data[4]])
+
+        self.cmd('undo')
+        self.assertTrue(self.prawtoys.items == data)
+
+        # Filters don't bring the index along; it's built again when needed.
+        self.prawtoys.items.text_index()
+        self.cmd('nsub c')
+        self.assertTrue(self.prawtoys.items._text_index is None)
+        self.cmd('search -keep dogs')
+        self.assertTrue(self.prawtoys.items == [data[3]])
+
+        self.prawtoys.items = data[:]
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'session')
+            self.cmd('save_to_file ' + name + ' --index')
+            self.assertTrue(os.path.exists(name + '.jsonl.terms'))
+
+            self.prawtoys.items = []
+            self.cmd('load_from_file ' + name)
+            self.assertTrue(self.prawtoys.items._text_index is not None)
+
+            self.prawtoys.items = []
+            self.cmd('load_from_file ' + name + ' --mmap --sub d')
+            self.assertTrue(self.prawtoys.items._text_index is not None)
+
+            self.cmd('search -keep cats')
+            self.assertTrue(
+                [i.title for i in self.prawtoys.items] == ['Dogs and cats'])
+
+            # A save that dies halfway leaves the old index alone.
+            index = self.prawtoys.items.text_index()
+            terms = name + '.jsonl.terms'
+            size = os.path.getsize(name + '.jsonl')
+            index.postings['broken'] = None
+
+            with self.assertRaises(TypeError):
+                index.save(terms, size)
+
+            self.assertTrue(prawtoys.text_index.TextIndex.load(terms, size)
+                            .search('cute dog') == [0, 1, 4])
+
+            # And doesn't leave its temporary file lying around either.
+            self.assertTrue(len(os.listdir(directory)) == 3)
+
+            self.prawtoys.items = []
+
+    def test_save_and_load(self):
+        import os
+        import tempfile
+
+        data  = [SubmissionLookalike(i, i, i) for i in self.TEST_DATA]
+        data += [CommentLookalike('"\t\n' + i, i, i) for i in self.TEST_DATA]
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'session')
+
+            self.prawtoys.items = data[:]
+            self.cmd('save_to_file ' + name)
+            self.cmd('reset')
+
+            self.cmd('load_from_file ' + name)
+            self.assertTrue(len(self.prawtoys.items) == len(data))
+
+            for full, loaded in zip(data, self.prawtoys.items):
+                self.assertTrue(
+                    praw_tools.praw_object_to_string(full)
+                    == praw_tools.praw_object_to_string(loaded))
+
+            self.prawtoys.items = []
+            self.cmd('load_from_file ' + name + ' --sub FOO bar --limit 3')
+            self.assertTrue(len(self.prawtoys.items) == 3)
+            self.assertAllItems(
+                lambda i: i.subreddit.display_name in ['foo', 'bar'])
+
+    def test_export(self):
+        import csv
+        import json
+        import tempfile
+        import export
+
+        data  = [SubmissionLookalike(i, i, 'http://x/?a=1&b=' + i)
+                 for i in ['<b>', 'a & b', 'c']]
+        data += [CommentLookalike('[link](x) *' + i, i) for i in 'de']
+        self.prawtoys.items = data[:]
+
+        with tempfile.TemporaryDirectory() as directory:
+            def read(name):
+                with open(os.path.join(directory, name),
+                          encoding='utf-8', newline='') as file_:
+                    return file_.read()
+
+            for format_ in ['html', 'csv', 'json', 'md']:
+                self.cmd('export {} {}'.format(
+                    format_, os.path.join(directory, 'out.' + format_)))
+                self.assertInOutput('Exported 5 item(s)')
+
+            page = read('out.html')
+            self.assertTrue('&lt;b&gt; :: /r/&lt;b&gt;' in page)
+            self.assertTrue('href="http://x/?a=1&amp;b=a &amp; b"' in page)
+            self.assertTrue('<b>' not in page)
+
+            exported = json.loads(read('out.json'))
+            self.assertTrue([i['title'] for i in exported]
+                            == ['<b>', 'a & b', 'c', None, None])
+            self.assertTrue(exported[3]['body'] == '[link](x) *d')
+
+            rows = list(csv.reader(io.StringIO(read('out.csv'))))
+            self.assertTrue(rows[0] == export.FIELDS)
+            self.assertTrue(len(rows) == 6 and rows[2][6] == 'a & b')
+
+            self.assertTrue('- [\\[link\\]\\(x\\) \\*d :: /r/d]'
+                            in read('out.md'))
+
+            # Only things from /r/c, /r/d and /r/e.
+            self.cmd('export json {} c d e'.format(
+                os.path.join(directory, 'some.json')))
+            self.assertTrue(len(json.loads(read('some.json'))) == 3)
+
+            self.cmd('export xml ' + os.path.join(directory, 'out.xml'))
+            self.assertInOutput('Unknown format: xml')
+
+            # Big exports get split into pages.
+            with unittest.mock.patch.object(export, 'PAGE_SIZE', 2):
+                self.cmd('export html ' + os.path.join(directory, 'p.html'))
+
+            index = read('p.html')
+            self.assertTrue(index.count('<a href="p-') == 3)
+            self.assertTrue('items 4-4' in index)
+            self.assertTrue('>next<' in read('p-2.html'))
+            self.assertTrue('>next<' not in read('p-3.html'))
+            self.assertTrue('>previous<' in read('p-3.html'))
+
+    def test_fake_reddit(self):
+        import json
+        import urllib.error
+        import urllib.request
+        import fake_reddit
+
+        corpus = fake_reddit.Corpus(1000, thread_size=300)
+
+        # Every comment in the big thread is either top-level or one of its
+        # parent's children.
+        for n in range(corpus.thread_size):
+            parent = corpus.parent(n)
+            self.assertTrue(parent == 't3_0' if n < corpus.top_level else
+                            n in corpus.children(int(parent[3:], 36)))
+
+        with fake_reddit.FakeReddit(corpus, rate_limit=20) as server:
+            def get(path, data=None):
+                request = urllib.request.urlopen(
+                    server.url + path,
+                    data.encode('utf-8') if data is not None else None)
+
+                with request:
+                    return json.loads(request.read().decode('utf-8'))
+
+            # Walk through all of /r/pics, a page at a time.
+            names, after = [], ''
+
+            while after is not None:
+                listing = get('/r/pics/search.json?limit=20&after=' + after)
+                names += [i['data']['name']
+                          for i in listing['data']['children']]
+                after = listing['data']['after']
+
+            self.assertTrue(len(names) == corpus.submissions // 10)
+            self.assertTrue(names[:2] == ['t3_1', 't3_b'])
+
+            thread = get('/comments/0')
+            comments = thread[1]['data']['children']
+            self.assertTrue(len(comments) == corpus.top_level)
+            more = comments[0]['data']['replies']['data']['children'][0]
+            self.assertTrue(more['kind'] == 'more')
+
+            things = get('/api/morechildren', 'link_id=t3_0&children='
+                         + ','.join(more['data']['children']))
+            things = things['json']['data']['things']
+            self.assertTrue(all(i['data']['parent_id'] == 't1_0'
+                                for i in things if i['kind'] == 't1'))
+
+            info = get('/api/info?id=t3_5,t1_7,t3_zzz')
+            self.assertTrue([i['data']['name']
+                             for i in info['data']['children']]
+                            == ['t3_5', 't1_7'])
+
+            get('/api/vote', 'id=t3_5&dir=1')
+            self.assertTrue(server.votes == {'t3_5': 1})
+
+            # Use up the rest of the rate limit.
+            for _ in range(20 - server.requests):
+                get('/api/me')
+
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                get('/api/me')
+
+            self.assertTrue(error.exception.code == 429)
+            self.assertTrue(
+                error.exception.headers['X-Ratelimit-Remaining'] == '0')
+
+        # Without a limit, there's nothing for a RateLimiter to go by.
+        with fake_reddit.FakeReddit(corpus) as server:
+            with urllib.request.urlopen(server.url + '/api/me') as request:
+                self.assertTrue('X-Ratelimit-Remaining' not in request.headers)
+
+    def test_async(self):
+        import os
+        import tempfile
+        import threading
+        import fake_reddit
+
+        corpus = fake_reddit.Corpus(3000, thread_size=300)
+
+        with fake_reddit.FakeReddit(corpus) as server:
+            client = praw_tools.AsyncReddit(
+                base_url=server.url,
+                limiter=praw_tools.RateLimiter(rate=1000, burst=1000))
+            self.prawtoys.async_reddit = client
+            self.prawtoys.event_loop = praw_tools.EventLoopThread()
+
+            self.cmd('async on')
+            self.cmd('get_from pics 130 new')
+            self.assertTrue(len(self.prawtoys.items) == 130)
+            self.assertAllItems(
+                lambda i: isinstance(i, praw_tools.CompactItem)
+                and i.subreddit.display_name == 'pics')
+
+            # Two pages, one after the other, over the same connection.
+            self.assertTrue(server.requests == 2)
+            self.assertTrue(client.pool.opened == 1)
+
+            self.cmd('reset')
+            self.cmd('thread 0 all')
+            fullnames = [i.fullname for i in self.prawtoys.items]
+            self.assertTrue(len(set(fullnames)) == corpus.thread_size)
+
+            # Parents always come before their replies.
+            position = {name: i for i, name in enumerate(fullnames)}
+            self.assertTrue(all(
+                position.get(corpus.parent(i), -1) < position['t1_' + j]
+                for i, j in ((int(k[3:], 36), k[3:]) for k in fullnames)))
+
+            with tempfile.TemporaryDirectory() as directory:
+                name = os.path.join(directory, 'ids.txt')
+
+                with open(name, 'w') as file_:
+                    file_.write('\n'.join(['5', 't1_7', 'zzzz', 't3_1']))
+
+                self.cmd('reset')
+                self.output.truncate(0)
+                self.cmd('load_ids ' + name)
+
+            self.assertTrue([i.fullname for i in self.prawtoys.items]
+                            == ['t3_5', 't1_7', 't3_1'])
+            self.assertInOutput('zzzz')
+
+            self.prawtoys.vote_items('upvote')
+            self.assertTrue(server.votes == {'t3_5': 1, 't1_7': 1, 't3_1': 1})
+            self.assertTrue(client.pool.opened <= praw_tools.WORKERS)
+
+            # A ctrl-c stops the rest of the votes and still gets a report.
+            def progress(done, total):
+                if done == 5:
+                    self.ctrl_c()
+
+            stop = threading.Event()
+            report = self.prawtoys.event_loop.run(client.vote_all(
+                ['t3_' + str(i) for i in range(500)], 1, progress, stop),
+                stop)
+            self.assertTrue(5 <= len(report.succeeded) < 500)
+
+            with self.assertRaises(praw_tools.HTTPStatusError):
+                self.prawtoys.event_loop.run(client.request('GET', 'nope'))
+
+            # GETs follow redirects. Anything else can't.
+            listing = self.prawtoys.event_loop.run(
+                client.request('GET', 'r/random'))
+            self.assertTrue(listing['kind'] == 'Listing')
+
+            with self.assertRaises(praw_tools.HTTPStatusError) as error:
+                self.prawtoys.event_loop.run(
+                    client.request('POST', 'r/random', data={}))
+
+            self.assertTrue(error.exception.location is not None)
+
+            # A 429 that doesn't say when to come back gets backed off from.
+            delay = praw_tools._retry_delay
+            self.assertTrue(delay({}, 1) == 2 * delay({}, 0) > 0)
+            self.assertTrue(delay({'retry-after': '3'}, 2) == 3)
+            self.assertTrue(delay({'x-ratelimit-reset': '3'}, 2) == 0)
+
+            self.prawtoys.event_loop.stop()
+
+    def test_load_mmap(self):
+        import os
+        import tempfile
+
+        data = [SubmissionLookalike(i, i, i, over_18=j)
+                for i, j in zip(self.TEST_DATA, self.BOOL_TEST_DATA)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'session')
+
+            self.prawtoys.items = data[:]
+            self.cmd('save_to_file ' + name)
+            self.cmd('reset')
+
+            # Without an index, one should get built on the spot.
+            os.remove(name + '.jsonl.idx')
+
+            self.cmd('load_from_file ' + name + ' --mmap')
+            self.assertTrue(self.prawtoys.items.lazy)
+            self.assertTrue(len(self.prawtoys.items) == len(data))
+
+            self.output.truncate(0)
+            self.cmd('ls 4 1')
+            self.assertInOutput('4: qux :: /r/qux')
+
+            self.cmd('view_subs')
+            self.assertInOutput('2 : /r/foo')
+
+            self.cmd('sfw')
+            self.cmd('nsub baz')
+            self.assertTrue(self.prawtoys.items.lazy)
+
+            # The lazy lists kept for undo have nothing built on top of them.
+            snapshot = self.prawtoys.history.undo_stack[-1]
+            self.assertTrue(snapshot.cost == 0)
+            self.assertTrue(not snapshot.old_items._columns)
+            self.assertTrue(not snapshot.old_items._indexes)
+            self.assertTrue(
+                [i.title for i in self.prawtoys.items] == ['qux', '\xfcmlaut'])
+
+            self.cmd('undo 3')
+            self.assertTrue(len(self.prawtoys.items) == 0)
+            self.cmd('redo')
+            self.assertTrue(len(self.prawtoys.items) == len(data))
+
+            # Saving over the mapped file leaves the mapped copy alone.
+            self.cmd('sfw')
+            self.cmd('save_to_file ' + name)
+            self.cmd('undo')
+            self.assertTrue([i.title for i in self.prawtoys.items]
+                            == [i.title for i in data])
+
+            self.prawtoys.items = []
+            self.cmd('load_from_file ' + name)
+            self.assertTrue(len(self.prawtoys.items)
+                            == self.BOOL_TEST_DATA.count(False))
+
+            # A cut-off index, or one with junk on the end, gets rebuilt.
+            index_name = name + '.jsonl.idx'
+
+            for size in [os.path.getsize(index_name) - 3,
+                         os.path.getsize(index_name) + 3]:
+                with open(index_name, 'r+b') as file_:
+                    file_.truncate(size)
+
+                self.prawtoys.items = []
+                self.cmd('load_from_file ' + name + ' --mmap')
+                self.assertTrue(len(self.prawtoys.items)
+                                == self.BOOL_TEST_DATA.count(False))
+
+            # Let go of the file so Windows can delete it.
+            self.prawtoys.items = []
+
+    def test_synthetic(self):
+        import os
+        import tempfile
+        import collections
+        import synthetic
+
+        things = list(synthetic.things(2000, seed=3))
+        self.assertTrue(things == list(synthetic.things(2000, seed=3)))
+        self.assertTrue(things != list(synthetic.things(2000, seed=4)))
+
+        subreddits = collections.Counter(
+            i['data']['subreddit'] for i in things)
+        self.assertTrue(subreddits.most_common(1)[0][0] == 'askreddit')
+
+        bodies = ''.join(i['data'].get('body', '') for i in things)
+        self.assertTrue('\n' in bodies and '\t' in bodies)
+        self.assertTrue(any(ord(i) > 127 for i in bodies))
+
+        # Comments only ever point at submissions that came before them.
+        submissions = set()
+
+        for i in things:
+            if i['kind'] == 't3':
+                submissions.add(i['data']['name'])
+            else:
+                self.assertTrue(i['data']['link_id'] in submissions)
+
+        # Real praw objects can be made out of all of them.
+        session = praw_tools.praw.Reddit('PRAWToys tests',
+                                         disable_update_check=True)
+        self.assertTrue(
+            [praw_tools.praw_object_to_string(i)
+             for i in synthetic.praw_items(session, 500, 3)]
+            == [praw_tools.praw_object_to_string(i)
+                for i in synthetic.compact_items(500, 3)])
+
+        self.cmd('generate 500 3')
+        self.assertTrue(len(self.prawtoys.items) == 500)
+        self.cmd('sub askreddit')
+        self.assertAllItems(
+            lambda i: i.subreddit.display_name == 'askreddit')
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'session')
+            self.assertTrue(synthetic.write_session(
+                name + '.jsonl', 500, seed=3) == 500)
+
+            self.cmd('reset')
+            self.cmd('load_from_file ' + name)
+            self.assertTrue(len(self.prawtoys.items) == 500)
+
+            for generated, loaded in zip(synthetic.compact_items(500, 3),
+                                         self.prawtoys.items):
+                self.assertTrue(
+                    praw_tools.praw_object_to_string(generated)
+                    == praw_tools.praw_object_to_string(loaded))
+
+    def test_jobs(self):
+        import threading
+
+        data = [SubmissionLookalike(subreddit=i) for i in self.TEST_DATA]
+        waiting, gate = threading.Event(), threading.Event()
+
+        def do_slow(shell, arg):
+            def items():
+                for index, i in enumerate(data):
+                    if index == 3:
+                        waiting.set()
+                        gate.wait()
+
+                    yield i
+
+            shell.add_items(items())
+
+        with unittest.mock.patch.object(
+                prawtoys.PRAWToys, 'do_slow', do_slow, create=True):
+            self.prawtoys.items = data[:]
+            self.cmd('slow &')
+            self.assertInOutput('[1] slow')
+
+            # The job works on its own copy, so the list can be used while
+            # it's running.
+            self.cmd('sub foo')
+            self.assertTrue(len(self.prawtoys.items) == 2)
+
+            waiting.wait()
+            self.cmd('jobs')
+            self.assertInOutput('[1] Running   slow  (+3 items)')
+
+            self.cmd('kill 1')
+            gate.set()
+            self.cmd('fg')
+            self.prawtoys.merge_jobs()
+
+            self.assertInOutput('[1] Killed    slow  (+3 items)')
+            self.assertTrue([i.subreddit.display_name
+                             for i in self.prawtoys.items]
+                            == ['foo', 'foo', 'foo', 'bar', 'baz'])
+
+            # Merging is a single change.
+            self.cmd('undo')
+            self.assertTrue(len(self.prawtoys.items) == 2)
+
+            self.cmd('generate 500 &')
+            self.cmd('fg 2')
+            self.prawtoys.merge_jobs()
+            self.assertTrue(len(self.prawtoys.items) == 502)
+
+            self.cmd('jobs')
+            self.assertInOutput('No jobs running.')
+            self.cmd('fg 2')
+            self.assertInOutput('No such job: 2')
+
+    def test_parse_limit(self):
+        self.assertTrue(prawtoys.parse_limit('25') == 25)
+        self.assertTrue(prawtoys.parse_limit('ALL') is None)
+        self.assertTrue(prawtoys.parse_limit('none') is None)
+        self.assertRaises(ValueError, prawtoys.parse_limit, 'aww')
+
     def test_submission_and_comment(self):
         test_data  = [CommentLookalike(i, i, i)    for i in self.TEST_DATA]
         test_data += [SubmissionLookalike(i, i, i) for i in self.TEST_DATA]
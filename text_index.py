@@ -0,0 +1,250 @@
+"""
+An inverted index over the text of a list of items, for the search command.
+
+For every word, a TextIndex keeps the sorted positions of the items that
+contain it. Looking up a query is then a few set operations on those lists,
+instead of running a regex over every title and comment. item_store.ItemStore
+builds one the first time you search, and keeps it up-to-date as items are
+appended, just like its other indexes.
+
+Queries are words separated by spaces, which all have to match. "or" between
+words means either side can match instead, and "quoted words" have to appear
+next to each other, in that order:
+
+    >>> index = TextIndex.build(['A cat.', 'A dog', 'The cat and the dog'])
+    >>> index.search('cat dog')
+    [2]
+    >>> index.search('cat or dog')
+    [0, 1, 2]
+    >>> texts = ['A cat.', 'A dog', 'The cat and the dog']
+    >>> index.search('"a dog"', lambda i: texts[i])
+    [1]
+
+Matching ignores case and punctuation.
+
+An index can also be saved next to a session file (see session_file.py) with
+save(), so that opening a big session doesn't have to index it all again.
+"""
+import io
+import re
+import json
+import array
+import bisect
+
+import session_file
+
+EXTENSION = '.terms'
+HEADER = {'format': 'prawtoys-text-index', 'version': 1}
+
+_WORD = re.compile(r'\w+')
+_QUERY_PART = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def words(text):
+    ''' Split text into lowercase words. '''
+    return _WORD.findall(text.lower()) if text else []
+
+
+def parse_query(query):
+    ''' Turn a query into a list of groups, any of which can match. Each group
+    is a list of phrases that all have to match, and each phrase is a tuple of
+    words.
+
+    >>> parse_query('foo "bar baz" or qux')
+    [[('foo',), ('bar', 'baz')], [('qux',)]]
+    '''
+    groups = [[]]
+
+    for match in _QUERY_PART.finditer(query):
+        quoted, word = match.groups()
+
+        if word is not None and word.lower() == 'or':
+            groups.append([])
+            continue
+
+        phrase = tuple(words(quoted if quoted is not None else word))
+
+        if phrase:
+            groups[-1].append(phrase)
+
+    groups = [i for i in groups if i]
+
+    if not groups:
+        raise ValueError('Nothing to search for.')
+
+    return groups
+
+
+def _contains(haystack, phrase):
+    ''' Is the tuple phrase a run of consecutive words in haystack? '''
+    length = len(phrase)
+
+    return any(tuple(haystack[i:i + length]) == phrase
+               for i, word in enumerate(haystack) if word == phrase[0])
+
+
+class TextIndex(object):
+    def __init__(self):
+        # word -> array('L') of the positions that contain it, sorted.
+        self.postings = {}
+        self.count = 0
+
+    @classmethod
+    def build(cls, texts):
+        index = cls()
+
+        for text in texts:
+            index.add(text)
+
+        return index
+
+    def __len__(self):
+        return self.count
+
+    def add(self, text):
+        ''' Index the text of one more item, at the end of the list. '''
+        position = self.count
+
+        for word in set(words(text)):
+            try:
+                self.postings[word].append(position)
+            except KeyError:
+                self.postings[word] = array.array('L', [position])
+
+        self.count += 1
+
+    def positions(self, word):
+        return self.postings.get(word, ())
+
+    def contains(self, position, word):
+        positions = self.positions(word)
+        i = bisect.bisect_left(positions, position)
+        return i < len(positions) and positions[i] == position
+
+    def take(self, positions):
+        ''' Get the index you'd get by building one from only the items at
+        these (sorted) positions, without looking at any text.
+        '''
+        new_positions = {old: new for new, old in enumerate(positions)}
+        new_index = TextIndex()
+        new_index.count = len(new_positions)
+
+        for word, old in self.postings.items():
+            new = array.array(
+                'L', (new_positions[i] for i in old if i in new_positions))
+
+            if new:
+                new_index.postings[word] = new
+
+        return new_index
+
+    # Searching. {{{1
+    def search(self, query, get_text=None):
+        ''' Get the sorted positions of everything matching query.
+
+        Phrases with more than one word can only be checked against the
+        actual text, so for those you need to pass in get_text, a function
+        that takes a position and returns the text that was indexed there.
+        It only gets called for items that have all the right words.
+        '''
+        matches = set()
+
+        for group in parse_query(query):
+            # Start with the rarest word, so the set we're narrowing down is
+            # as small as possible from the start.
+            group_words = sorted({word for phrase in group for word in phrase},
+                                 key=lambda i: len(self.positions(i)))
+            candidates = set(self.positions(group_words[0]))
+
+            for word in group_words[1:]:
+                if not candidates:
+                    break
+
+                candidates.intersection_update(self.positions(word))
+
+            phrases = [i for i in group if len(i) > 1]
+
+            if phrases and candidates:
+                if get_text is None:
+                    raise ValueError("Can't search for phrases here.")
+
+                candidates = {
+                    i for i in candidates
+                    if all(_contains(words(get_text(i)), j) for j in phrases)}
+
+            matches |= candidates
+
+        return sorted(matches)
+
+    def matched_words(self, position, query):
+        ''' Which of query's words does the item at position contain? '''
+        found = []
+
+        for group in parse_query(query):
+            for phrase in group:
+                for word in phrase:
+                    if word not in found and self.contains(position, word):
+                        found.append(word)
+
+        return found
+
+    # Saving and loading. {{{1
+    def save(self, filename, size=None):
+        ''' Write the index to filename, one word per line.
+
+        size is the size of the session file this index belongs to. load()
+        uses it to tell if the index is out of date.
+
+        Like session files, the index is written to a temporary file that
+        gets moved over the old one at the end, so a crash halfway through
+        never leaves a cut-off index behind.
+        '''
+        header = dict(HEADER, count=self.count, size=size)
+
+        with session_file._replacing(filename) as raw, \
+                io.TextIOWrapper(raw, encoding='utf-8') as file_:
+            file_.write(json.dumps(header) + '\n')
+
+            for word, positions in self.postings.items():
+                # Store the gaps between positions instead of the positions
+                # themselves. They're a lot shorter.
+                gaps = [positions[0]]
+                gaps += [b - a for a, b in zip(positions, positions[1:])]
+
+                file_.write(json.dumps([word, gaps], ensure_ascii=False,
+                                       separators=(',', ':')) + '\n')
+
+    @classmethod
+    def load(cls, filename, size=None):
+        ''' Load an index saved with save(). Returns None if there isn't one,
+        or if it was saved for a session file of a different size.
+        '''
+        try:
+            file_ = open(filename, encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+        with file_:
+            try:
+                header = json.loads(file_.readline())
+            except ValueError:
+                return None
+
+            if (header.get('format') != HEADER['format']
+                    or header.get('version') != HEADER['version']
+                    or header.get('size') != size):
+                return None
+
+            index = cls()
+            index.count = header['count']
+
+            for line in file_:
+                word, gaps = json.loads(line)
+                positions = array.array('L', gaps)
+
+                for i in range(1, len(positions)):
+                    positions[i] += positions[i - 1]
+
+                index.postings[word] = positions
+
+        return index